@@ -70,6 +70,7 @@ class CVDocument(models.Model):
         if parsed_data.get('professional_summary'):
             ProfessionalSummary.objects.update_or_create(
                 user=user,
+                bucket=None,
                 defaults={'summary': parsed_data['professional_summary']}
             )
 
@@ -10,7 +10,12 @@ from .models import (
     SocialMedia,
     ProfessionalSummary,
     Interest,
-    CVImprovement
+    CVImprovement,
+    CVRewriteJob,
+    SectionBucket,
+    CvSection,
+    LLMUsage,
+    LLMDailyUsage
 )
 
 # Register your models here.
@@ -25,4 +30,9 @@ admin.site.register(SocialMedia)
 admin.site.register(ProfessionalSummary)
 admin.site.register(Interest)
 admin.site.register(CVImprovement)
+admin.site.register(CVRewriteJob)
+admin.site.register(SectionBucket)
+admin.site.register(CvSection)
+admin.site.register(LLMUsage)
+admin.site.register(LLMDailyUsage)
 # Compare this snippet from cv_writer/models.py:
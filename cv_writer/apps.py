@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CvWriterConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "cv_writer"
+
+    def ready(self):
+        from . import signals  # noqa: F401
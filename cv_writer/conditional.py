@@ -0,0 +1,138 @@
+"""
+Conditional requests for the CV endpoints.
+
+Every response of these endpoints is derived from the user's CV data, so one
+per-user stamp (``snapshot.get_user_stamp``), bumped on each write, validates
+all of them. The stamp is a database row, so every process hands out and
+checks the same validators. ``If-None-Match``/``If-Modified-Since`` are
+answered with 304 after that one lookup, before the view runs any other
+query, and ``If-Match`` on writes rejects clients that edit data they have
+not seen the latest version of.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .snapshot import get_user_stamp
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The CV has changed since you last loaded it. Reload and try again.'
+    default_code = 'precondition_failed'
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        super().__init__('Not modified')
+        self.response = response
+
+
+def _etag(request, version):
+    # Same data rendered as JSON or the browsable API must not share a tag
+    media_type = getattr(request, 'accepted_media_type', '') or ''
+    digest = hashlib.sha1(f'{request.user.pk}:{version}:{media_type}'.encode('utf-8')).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def _parse_etags(header):
+    return [tag.strip() for tag in header.split(',') if tag.strip()]
+
+
+def check_preconditions(request):
+    """
+    Evaluate the request's conditional headers against the user's stamp.
+
+    :return: the stamp as (etag, modified), or None for anonymous requests
+    :raises NotModified: for a safe request whose copy is still current
+    :raises PreconditionFailed: for a write whose If-Match is stale
+    """
+    if not request.user or not request.user.is_authenticated:
+        return None
+
+    version, modified = get_user_stamp(request.user.pk)
+    # Lets the view key its snapshot cache without reading the stamp again
+    request.snapshot_version = version
+    etag = _etag(request, version)
+
+    if request.method in SAFE_METHODS:
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = _parse_etags(if_none_match)
+            if '*' in tags or etag in tags:
+                raise NotModified(_not_modified_response(etag, modified))
+        else:
+            if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            if if_modified_since is not None and int(modified) <= if_modified_since:
+                raise NotModified(_not_modified_response(etag, modified))
+    else:
+        if_match = request.headers.get('If-Match')
+        if if_match is not None:
+            tags = _parse_etags(if_match)
+            if '*' not in tags and etag not in tags:
+                raise PreconditionFailed()
+
+    return etag, modified
+
+
+def _not_modified_response(etag, modified):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, (etag, modified))
+    return response
+
+
+def set_validators(response, stamp):
+    if stamp is None:
+        return
+    etag, modified = stamp
+    response['ETag'] = etag
+    # Last-Modified has one-second resolution; leave it off until the second
+    # of the last write has passed so a later write in that same second
+    # cannot be hidden behind If-Modified-Since
+    if int(time.time()) > int(modified):
+        response['Last-Modified'] = http_date(modified)
+    response['Cache-Control'] = 'private, no-cache'
+
+
+def conditional(view):
+    """Decorator for function views, applied inside ``@api_view``."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        try:
+            stamp = check_preconditions(request)
+        except NotModified as e:
+            return e.response
+        response = view(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and response.status_code == status.HTTP_200_OK:
+            set_validators(response, stamp)
+        return response
+    return wrapped
+
+
+class ConditionalRequestMixin:
+    """Conditional request handling for class-based views."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.stamp = check_preconditions(request)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # Only reads carry validators: after a write the stamp read before
+        # it no longer matches the data, and a fresh read could include
+        # someone else's concurrent write the client has not seen
+        if request.method in SAFE_METHODS and response.status_code == status.HTTP_200_OK:
+            set_validators(response, getattr(self, 'stamp', None))
+        return response
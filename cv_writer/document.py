@@ -0,0 +1,209 @@
+"""
+Whole-CV document writes.
+
+``apply_cv_document`` takes a CV in the shape ``get_cv`` returns, diffs every
+section against the rows the version shows and writes the differences with
+one ``bulk_create``, ``bulk_update`` and delete per section, all in a single
+transaction. Sections missing from the document are left untouched; rows
+missing from a section that is present are deleted. A changed section that
+other versions share is copied first (see ``sections.py``).
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ProfessionalSummary
+from .serializers import (
+    CvWriterSerializer,
+    ExperienceSerializer,
+    EducationSerializer,
+    SkillSerializer,
+    LanguageSerializer,
+    CertificationSerializer,
+    InterestSummarySerializer,
+    SocialMediaSerializer,
+    ReferenceSerializer,
+)
+from .sections import bucket_rows, copy_on_write, is_shared, section_buckets
+from .snapshot import bump_snapshot_version, visible_skills
+
+# Document key -> (serializer, rows the document shows, input aliases)
+SECTIONS = {
+    'experiences': (ExperienceSerializer, None, {}),
+    'education': (EducationSerializer, None, {}),
+    # SkillSerializer writes skill_name/skill_level but reads name/proficiency
+    'skills': (SkillSerializer, visible_skills, {'name': 'skill_name', 'proficiency': 'skill_level'}),
+    'languages': (LanguageSerializer, None, {}),
+    'certifications': (CertificationSerializer, None, {}),
+    'interests': (InterestSummarySerializer, None, {}),
+    'social_media': (SocialMediaSerializer, None, {}),
+    'references': (ReferenceSerializer, None, {}),
+}
+
+# Header fields managed by their own endpoints
+PROTECTED_HEADER_FIELDS = ('is_primary',)
+
+
+class CVDocumentError(Exception):
+    def __init__(self, errors):
+        super().__init__('Invalid CV document')
+        self.errors = errors
+
+
+class _SectionPlan:
+    def __init__(self, model, kind, bucket_id):
+        self.model = model
+        self.kind = kind
+        self.bucket_id = bucket_id
+        self.create = []
+        self.update = []
+        self.update_fields = set()
+        self.delete_ids = []
+
+    @property
+    def has_changes(self):
+        return bool(self.create or self.update or self.delete_ids)
+
+    def move_to(self, bucket, id_map):
+        """Retarget the plan at a copy of the section made by copy_on_write."""
+        for row in self.update:
+            row.pk = id_map[row.pk]
+            row.bucket = bucket
+        for row in self.create:
+            row.bucket = bucket
+        self.delete_ids = [id_map[row_id] for row_id in self.delete_ids]
+        self.bucket_id = bucket.pk
+
+
+def _plan_section(cv, section, items, errors, bucket_id):
+    serializer_class, visible_rows, aliases = SECTIONS[section]
+    model = serializer_class.Meta.model
+    queryset = bucket_rows(cv, section, bucket_id)
+    if visible_rows:
+        queryset = visible_rows(queryset)
+    existing = {row.id: row for row in queryset}
+    plan = _SectionPlan(model, section, bucket_id)
+
+    if not isinstance(items, list):
+        errors[section] = 'Expected a list'
+        return plan
+
+    seen_ids = set()
+    now = timezone.now()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.setdefault(section, {})[index] = 'Expected an object'
+            continue
+        row_id = item.get('id')
+        if row_id is not None and (row_id not in existing or row_id in seen_ids):
+            errors.setdefault(section, {})[index] = {'id': f'Unknown {section} item {row_id}'}
+            continue
+
+        row = existing.get(row_id)
+        if row is not None:
+            current = serializer_class(row).data
+            item = {key: value for key, value in item.items() if current.get(key) != value}
+        data = {aliases.get(key, key): value for key, value in item.items() if key != 'id'}
+        serializer = serializer_class(row, data=data, partial=row is not None)
+        if not serializer.is_valid():
+            errors.setdefault(section, {})[index] = serializer.errors
+            continue
+
+        if row is None:
+            plan.create.append(model(user_id=cv.user_id, bucket_id=bucket_id, **serializer.validated_data))
+            continue
+
+        seen_ids.add(row_id)
+        changed = [
+            field for field, value in serializer.validated_data.items()
+            if getattr(row, field) != value
+        ]
+        if changed:
+            for field in changed:
+                setattr(row, field, serializer.validated_data[field])
+            row.updated_at = now
+            plan.update.append(row)
+            plan.update_fields.update(changed)
+
+    plan.delete_ids = [row_id for row_id in existing if row_id not in seen_ids]
+    if plan.update:
+        plan.update_fields.add('updated_at')
+    return plan
+
+
+def apply_cv_document(cv, document):
+    """
+    Write ``document`` to ``cv`` and the sections it shows.
+
+    :raises CVDocumentError: with per-section, per-item errors; nothing is written
+    """
+    if not isinstance(document, dict):
+        raise CVDocumentError({'document': 'Expected an object'})
+
+    with transaction.atomic():
+        errors = {}
+        # Only changed header fields are validated and written, so values
+        # stored before the serializer's rules existed still round-trip
+        current_header = CvWriterSerializer(cv).data
+        header = {
+            key: value for key, value in document.items()
+            if key in current_header and key not in PROTECTED_HEADER_FIELDS
+            and current_header[key] != value
+        }
+        header_serializer = CvWriterSerializer(cv, data=header, partial=True)
+        if not header_serializer.is_valid():
+            errors['cv'] = header_serializer.errors
+
+        buckets = section_buckets(cv)
+        plans = [
+            _plan_section(cv, section, document[section], errors, buckets.get(section))
+            for section in SECTIONS if section in document
+        ]
+
+        summary = document.get('professional_summary')
+        if summary is not None and not isinstance(summary, str):
+            errors['professional_summary'] = 'Expected a string'
+
+        if errors:
+            raise CVDocumentError(errors)
+
+        header_serializer.save()
+
+        if 'professional_summary' in document:
+            _write_summary(cv, summary, buckets.get('professional_summary'))
+
+        for plan in plans:
+            if not plan.has_changes:
+                continue
+            if is_shared(cv, plan.kind, plan.bucket_id):
+                plan.move_to(*copy_on_write(cv, plan.kind, plan.bucket_id))
+            if plan.delete_ids:
+                plan.model.objects.filter(id__in=plan.delete_ids).delete()
+            if plan.update:
+                plan.model.objects.bulk_update(plan.update, sorted(plan.update_fields))
+            if plan.create:
+                plan.model.objects.bulk_create(plan.create)
+
+        # bulk_create and bulk_update do not send the signals that
+        # invalidate the cached snapshot. Bumped after commit, or a
+        # concurrent read could cache the old rows under the new version
+        user_id = cv.user_id
+        transaction.on_commit(lambda: bump_snapshot_version(user_id))
+
+
+def _write_summary(cv, summary, bucket_id):
+    current = bucket_rows(cv, 'professional_summary', bucket_id).first()
+    if (summary or '') == (current.summary if current else ''):
+        return
+
+    if is_shared(cv, 'professional_summary', bucket_id):
+        bucket, id_map = copy_on_write(cv, 'professional_summary', bucket_id)
+        bucket_id = bucket.pk
+        current = ProfessionalSummary.objects.get(pk=id_map[current.pk]) if current else None
+
+    if not summary:
+        current.delete()
+    elif current is None:
+        ProfessionalSummary.objects.create(user_id=cv.user_id, bucket_id=bucket_id, summary=summary)
+    else:
+        current.summary = summary
+        current.save(update_fields=['summary', 'updated_at'])
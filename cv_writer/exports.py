@@ -0,0 +1,330 @@
+"""
+Server-side CV exports.
+
+A CV snapshot (see ``snapshot.py``) is rendered to HTML, PDF or DOCX and the
+file is kept in ``CV_EXPORT_CACHE_DIR`` under a hash of the snapshot, the
+format and ``TEMPLATE_VERSION``. Downloading an unchanged CV again streams the
+stored file without rendering. Renders run on a small shared thread pool,
+and concurrent requests for the same file wait on a single render.
+
+Every edit makes a new file, so the directory is pruned: files not
+downloaded for ``CV_EXPORT_MAX_AGE_DAYS`` go, then the least recently used
+until it fits in ``CV_EXPORT_MAX_BYTES``. Each process prunes at most once
+every ``PRUNE_INTERVAL`` seconds after a render, and the ``prune_cv_exports``
+command does the same on demand.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils.text import slugify
+from docx import Document
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+logger = logging.getLogger(__name__)
+
+# Bump when the templates or renderers change so cached files are not reused
+TEMPLATE_VERSION = '1'
+
+PRUNE_INTERVAL = 60 * 60
+
+CONTENT_TYPES = {
+    'html': 'text/html; charset=utf-8',
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CV_EXPORT_WORKERS,
+                thread_name_prefix='cv-export',
+            )
+        return _executor
+
+
+def export_key(snapshot, export_format):
+    payload = json.dumps(snapshot, sort_keys=True, default=str)
+    return hashlib.sha256(
+        f'{TEMPLATE_VERSION}:{export_format}:{payload}'.encode('utf-8')
+    ).hexdigest()
+
+
+def export_path(key, export_format):
+    return os.path.join(settings.CV_EXPORT_CACHE_DIR, key[:2], f'{key}.{export_format}')
+
+
+def export_filename(snapshot, export_format):
+    name = slugify(f"{snapshot.get('first_name', '')} {snapshot.get('last_name', '')}") or 'cv'
+    return f'{name}-cv.{export_format}'
+
+
+def get_export(snapshot, export_format):
+    """
+    Return the path of the rendered export, rendering it only if no file for
+    this content exists yet.
+
+    :raises ValueError: for an unsupported format
+    :raises concurrent.futures.TimeoutError: if the render takes longer than
+        ``CV_EXPORT_TIMEOUT`` seconds
+    """
+    if export_format not in RENDERERS:
+        raise ValueError(f'Unsupported export format: {export_format}')
+
+    key = export_key(snapshot, export_format)
+    path = export_path(key, export_format)
+    try:
+        # The modification time records the last download, for pruning
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is None:
+            future = _get_executor().submit(_render_to_file, snapshot, export_format, path)
+            _inflight[key] = future
+            future.add_done_callback(lambda _: _forget(key))
+
+    future.result(timeout=settings.CV_EXPORT_TIMEOUT)
+    _schedule_prune()
+    return path
+
+
+def _forget(key):
+    with _inflight_lock:
+        _inflight.pop(key, None)
+
+
+def _schedule_prune():
+    global _last_prune
+    with _prune_lock:
+        if _last_prune and time.monotonic() - _last_prune < PRUNE_INTERVAL:
+            return
+        _last_prune = time.monotonic()
+    _get_executor().submit(prune_exports)
+
+
+def prune_exports(max_age_days=None, max_bytes=None):
+    """
+    Delete exports not downloaded for ``max_age_days``, then the least
+    recently downloaded until the rest fit in ``max_bytes``.
+
+    :return: (number of files deleted, bytes freed)
+    """
+    if max_age_days is None:
+        max_age_days = settings.CV_EXPORT_MAX_AGE_DAYS
+    if max_bytes is None:
+        max_bytes = settings.CV_EXPORT_MAX_BYTES
+    cutoff = time.time() - max_age_days * 24 * 60 * 60
+
+    files = []
+    for directory, _, names in os.walk(settings.CV_EXPORT_CACHE_DIR):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    total = sum(size for _, size, _ in files)
+    deleted = freed = 0
+    for mtime, size, path in files:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        # A render still writing its temporary file is left alone
+        if path.endswith('.tmp') and mtime >= cutoff:
+            continue
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        deleted += 1
+        freed += size
+
+    if deleted:
+        logger.info(f"Pruned {deleted} CV exports ({freed} bytes)")
+    return deleted, freed
+
+
+def _render_to_file(snapshot, export_format, path):
+    content = RENDERERS[export_format](snapshot)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so a reader never sees a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(content)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    logger.info(f"Rendered {export_format} export {os.path.basename(path)} ({len(content)} bytes)")
+
+
+def _contact_line(snapshot):
+    location = ', '.join(part for part in (snapshot.get('city'), snapshot.get('country')) if part)
+    return [
+        part for part in (
+            snapshot.get('user_email'), snapshot.get('contact_number'), location
+        ) if part
+    ]
+
+
+def _date_range(entry):
+    end = 'Present' if entry.get('current') else (entry.get('end_date') or '')
+    start = entry.get('start_date') or ''
+    return f'{start} - {end}' if start or end else ''
+
+
+def _sections(snapshot):
+    """
+    The CV body as (heading, entries) pairs, where each entry is a title, a
+    meta line and paragraphs. Shared by the PDF and DOCX renderers.
+    """
+    sections = []
+    if snapshot.get('professional_summary'):
+        sections.append(('Profile', [('', '', [snapshot['professional_summary']])]))
+    if snapshot.get('experiences'):
+        sections.append(('Experience', [
+            (
+                f"{job['job_title']}, {job['company_name']}",
+                ' | '.join(part for part in (_date_range(job), job.get('employment_type')) if part),
+                [text for text in (job.get('job_description'), job.get('achievements')) if text],
+            ) for job in snapshot['experiences']
+        ]))
+    if snapshot.get('education'):
+        sections.append(('Education', [
+            (
+                f"{school['degree']}" + (f" in {school['field_of_study']}" if school.get('field_of_study') else '')
+                + f", {school['school_name']}",
+                _date_range(school),
+                [],
+            ) for school in snapshot['education']
+        ]))
+    if snapshot.get('skills'):
+        sections.append(('Skills', [('', '', [
+            ', '.join(f"{skill['name']} ({skill['proficiency']})" for skill in snapshot['skills'])
+        ])]))
+    if snapshot.get('languages'):
+        sections.append(('Languages', [('', '', [
+            ', '.join(f"{language['language']} ({language['proficiency']})" for language in snapshot['languages'])
+        ])]))
+    if snapshot.get('certifications'):
+        sections.append(('Certifications', [
+            (certification['name'], str(certification.get('date_obtained') or ''), [])
+            for certification in snapshot['certifications']
+        ]))
+    if snapshot.get('interests'):
+        sections.append(('Interests', [('', '', [
+            ', '.join(interest['name'] for interest in snapshot['interests'])
+        ])]))
+    if snapshot.get('references'):
+        sections.append(('References', [
+            (
+                reference['name'],
+                ' | '.join(part for part in (
+                    f"{reference['position']}, {reference['company']}", reference.get('email'), reference.get('phone')
+                ) if part),
+                [],
+            ) for reference in snapshot['references']
+        ]))
+    return sections
+
+
+def render_html(snapshot):
+    # get_template keeps the compiled template, so only rendering runs per export
+    return get_template('cv_writer/export/cv.html').render({
+        'cv': snapshot,
+        'contact': _contact_line(snapshot),
+    }).encode('utf-8')
+
+
+_base_styles = getSampleStyleSheet()
+PDF_STYLES = {
+    'name': ParagraphStyle('CvName', parent=_base_styles['Title'], alignment=0, spaceAfter=2),
+    'meta': ParagraphStyle('CvMeta', parent=_base_styles['Normal'], textColor='#555555', fontSize=9),
+    'heading': ParagraphStyle('CvHeading', parent=_base_styles['Heading2'], fontSize=12, spaceBefore=10),
+    'entry': ParagraphStyle('CvEntry', parent=_base_styles['Heading4'], spaceBefore=4, spaceAfter=0),
+    'body': _base_styles['Normal'],
+}
+
+
+def render_pdf(snapshot):
+    def paragraph(text, style):
+        return Paragraph(escape(str(text)).replace('\n', '<br/>'), PDF_STYLES[style])
+
+    story = [paragraph(f"{snapshot.get('first_name', '')} {snapshot.get('last_name', '')}", 'name')]
+    if snapshot.get('title'):
+        story.append(paragraph(snapshot['title'], 'meta'))
+    story.append(paragraph(' | '.join(_contact_line(snapshot)), 'meta'))
+
+    for heading, entries in _sections(snapshot):
+        story.append(paragraph(heading, 'heading'))
+        for title, meta, paragraphs in entries:
+            if title:
+                story.append(paragraph(title, 'entry'))
+            if meta:
+                story.append(paragraph(meta, 'meta'))
+            story.extend(paragraph(text, 'body') for text in paragraphs)
+
+    buffer = io.BytesIO()
+    SimpleDocTemplate(
+        buffer, pagesize=A4,
+        title=f"{snapshot.get('first_name', '')} {snapshot.get('last_name', '')} CV",
+    ).build(story)
+    return buffer.getvalue()
+
+
+def render_docx(snapshot):
+    document = Document()
+    document.add_heading(f"{snapshot.get('first_name', '')} {snapshot.get('last_name', '')}", level=0)
+    if snapshot.get('title'):
+        document.add_paragraph(snapshot['title'])
+    document.add_paragraph(' | '.join(_contact_line(snapshot)))
+
+    for heading, entries in _sections(snapshot):
+        document.add_heading(heading, level=1)
+        for title, meta, paragraphs in entries:
+            if title:
+                document.add_heading(title, level=2)
+            if meta:
+                document.add_paragraph().add_run(meta).italic = True
+            for text in paragraphs:
+                document.add_paragraph(text)
+
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'html': render_html,
+    'pdf': render_pdf,
+    'docx': render_docx,
+}
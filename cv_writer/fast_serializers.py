@@ -0,0 +1,214 @@
+"""
+Fast read path for the CV and section endpoints.
+
+Reading a list through a ``ModelSerializer`` builds a model instance per row
+and then runs every field's ``get_attribute``/``to_representation``. For
+reads we instead fetch a ``.values()`` projection of just the serialized
+columns and apply a precomputed list of (key, column, converter) mappers, one
+per field. Converters come from the serializer's own fields, so the output is
+the same as the serializer's. Rows are rendered with orjson when it is
+installed, and with the same ``json.dumps`` call as ``JSONRenderer`` when it
+is not. Writes, and serializers this module cannot map, still go through DRF.
+"""
+import datetime
+import json
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.permissions import BasePermission
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializers import CvWriterSerializer, SkillSerializer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Fields whose to_representation leaves database values as they are
+PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+)
+
+# What JSONRenderer makes of a value a serializer returned unconverted
+encode_value = JSONEncoder().default
+
+
+class DateTimeConverter:
+    """
+    ``DateTimeField.to_representation`` with the current timezone looked up
+    once per serialization instead of once per value.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    @staticmethod
+    def applies_to(field):
+        return (
+            isinstance(field, serializers.DateTimeField)
+            and not hasattr(field, 'timezone')
+            and str(getattr(field, 'format', api_settings.DATETIME_FORMAT)).lower() == ISO_8601
+        )
+
+    def bind(self, tz):
+        fallback = self.field.to_representation
+        if tz is None:
+            return fallback
+
+        def convert(value):
+            if not isinstance(value, datetime.datetime) or not timezone.is_aware(value):
+                return fallback(value)
+            value = value.astimezone(tz).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+
+
+class FastReader:
+    """
+    Serializes ``.values()`` rows as ``serializer_class`` would serialize the
+    model instances.
+
+    :param fields: (key, column, converter) triples in output order; the
+        converter is None for values that need no conversion
+    :param optional: (key, column) pairs added only when the value is truthy
+    """
+
+    def __init__(self, fields, optional=()):
+        self.fields = list(fields)
+        self.optional = list(optional)
+        self.columns = list(dict.fromkeys(
+            [column for _, column, _ in self.fields] + [column for _, column in self.optional]
+        ))
+
+    @classmethod
+    def from_serializer(cls, serializer_class, optional=()):
+        """
+        Build the mappers from the serializer's declared fields.
+
+        :raises ValueError: for a field that does not read a single column
+        """
+        fields = []
+        for field in serializer_class().fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)) \
+                    or field.source == '*' or '.' in field.source:
+                raise ValueError(f'{serializer_class.__name__}.{field.field_name} has no single source column')
+            if isinstance(field, PASSTHROUGH_FIELDS):
+                converter = None
+            elif DateTimeConverter.applies_to(field):
+                converter = DateTimeConverter(field)
+            else:
+                converter = field.to_representation
+            fields.append((field.field_name, field.source, converter))
+        return cls(fields, optional)
+
+    def bound_fields(self):
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        return [
+            (key, column, converter.bind(tz) if isinstance(converter, DateTimeConverter) else converter)
+            for key, column, converter in self.fields
+        ]
+
+    def row(self, values, fields):
+        data = {}
+        for key, column, converter in fields:
+            value = values[column]
+            data[key] = value if converter is None or value is None else converter(value)
+        for key, column in self.optional:
+            if values[column]:
+                data[key] = values[column]
+        return data
+
+    def serialize(self, queryset):
+        fields = self.bound_fields()
+        return [self.row(values, fields) for values in queryset.values(*self.columns)]
+
+
+READERS = {
+    # to_representation adds the owner's email, read here through a join
+    # rather than a query per CV
+    CvWriterSerializer: FastReader.from_serializer(
+        CvWriterSerializer, optional=[('user_email', 'user__email')]
+    ),
+    # to_representation is hand-written and returns the timestamps as they
+    # are, leaving them to the renderer's encoder
+    SkillSerializer: FastReader([
+        ('id', 'id', None),
+        ('name', 'skill_name', None),
+        ('proficiency', 'skill_level', None),
+        ('created_at', 'created_at', encode_value),
+        ('updated_at', 'updated_at', encode_value),
+    ]),
+}
+
+
+def get_reader(serializer_class):
+    """The reader for ``serializer_class``, or None if it cannot be mapped."""
+    reader = READERS.get(serializer_class)
+    if reader is None and serializer_class.to_representation is serializers.ModelSerializer.to_representation:
+        try:
+            reader = READERS[serializer_class] = FastReader.from_serializer(serializer_class)
+        except ValueError:
+            return None
+    return reader
+
+
+def render_json(data):
+    """Render ``data`` byte for byte as a non-indented ``JSONRenderer``."""
+    if orjson is not None and api_settings.COMPACT_JSON and api_settings.UNICODE_JSON:
+        # orjson writes the two line separators raw; JSONRenderer escapes them
+        return orjson.dumps(data).replace(
+            b'\xe2\x80\xa8', b'\\u2028'
+        ).replace(b'\xe2\x80\xa9', b'\\u2029')
+    ret = json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=not api_settings.UNICODE_JSON,
+        allow_nan=not api_settings.STRICT_JSON,
+        separators=(',', ':') if api_settings.COMPACT_JSON else (', ', ': '),
+    )
+    return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+class FastReadMixin:
+    """
+    Serve JSON list and detail reads of a generic view through ``FastReader``,
+    falling back to the serializer for anything it does not cover.
+    """
+
+    def get_fast_reader(self, request):
+        renderer = getattr(request, 'accepted_renderer', None)
+        if getattr(renderer, 'format', None) != 'json' or 'indent' in (request.accepted_media_type or ''):
+            return None
+        return get_reader(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        reader = self.get_fast_reader(request)
+        if reader is None or self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        data = reader.serialize(self.filter_queryset(self.get_queryset()))
+        return HttpResponse(render_json(data), content_type=request.accepted_renderer.media_type)
+
+    def retrieve(self, request, *args, **kwargs):
+        reader = self.get_fast_reader(request)
+        # Object-level permissions need the instance
+        if reader is None or any(
+            type(permission).has_object_permission is not BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        ):
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        rows = reader.serialize(queryset)
+        if not rows:
+            raise Http404
+        return HttpResponse(render_json(rows[0]), content_type=request.accepted_renderer.media_type)
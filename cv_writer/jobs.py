@@ -0,0 +1,141 @@
+"""
+Database-backed queue for whole-CV rewrites.
+
+Jobs are rows in ``CVRewriteJob``. The ``run_rewrite_worker`` management
+command claims queued jobs with a conditional update, so several workers can
+share the table, and rewrites one section at a time while recording progress.
+Cancellation is cooperative: the worker checks ``cancel_requested`` between
+sections and before every provider attempt.
+"""
+import json
+import logging
+
+from django.utils import timezone
+
+from .local_llm import LLMCallCancelled, ResilientLLMService
+from .models import CVRewriteJob
+from .usage import TokenBudgetExceeded
+
+logger = logging.getLogger(__name__)
+
+REWRITE_SECTIONS = ('professional_summary', 'experience', 'skills')
+
+
+def enqueue_rewrite(user, cv_data):
+    """Queue a rewrite of the sections of ``cv_data`` that can be rewritten."""
+    return CVRewriteJob.objects.create(
+        user=user,
+        cv_data=cv_data,
+        progress={section: 'pending' for section in REWRITE_SECTIONS if cv_data.get(section)},
+    )
+
+
+def request_cancel(job):
+    """
+    Ask for a job to stop. Queued jobs are cancelled straight away, running
+    jobs stop at the worker's next check.
+    """
+    if CVRewriteJob.objects.filter(pk=job.pk, status='queued').update(
+        status='cancelled', cancel_requested=True, finished_at=timezone.now()
+    ):
+        return
+    CVRewriteJob.objects.filter(pk=job.pk, status='running').update(cancel_requested=True)
+
+
+def is_cancel_requested(job_id):
+    return CVRewriteJob.objects.filter(pk=job_id, cancel_requested=True).exists()
+
+
+def claim_next_job():
+    """Move the oldest queued job to running, or return None if there is none."""
+    while True:
+        job = CVRewriteJob.objects.filter(status='queued').order_by('created_at').first()
+        if job is None:
+            return None
+        # Only one worker can win the queued -> running transition
+        claimed = CVRewriteJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def requeue_stale_jobs(max_runtime):
+    """
+    Put back jobs whose worker died mid-run so another worker picks them up.
+    Those cancelled before their worker died are finished as cancelled.
+    """
+    cutoff = timezone.now() - max_runtime
+    stale = CVRewriteJob.objects.filter(status='running', updated_at__lt=cutoff)
+    for job in stale.filter(cancel_requested=True):
+        _mark_unfinished_sections(job, 'pending')
+        _save_progress(job, status='cancelled', finished_at=timezone.now())
+    return stale.filter(cancel_requested=False).update(status='queued', started_at=None)
+
+
+def _save_progress(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=list(fields) + ['progress', 'updated_at'])
+
+
+def run_rewrite_job(job):
+    """Rewrite every pending section of a claimed job."""
+    rewritten = dict((job.result or {}).get('rewritten', {}))
+
+    try:
+        # Inside the try so a misconfigured service fails the job, not the worker
+        llm_service = ResilientLLMService(
+            user=job.user,
+            cancel_check=lambda: is_cancel_requested(job.pk)
+        )
+
+        for section, section_status in job.progress.items():
+            if section_status == 'completed':
+                continue
+            if is_cancel_requested(job.pk):
+                raise LLMCallCancelled("Rewrite cancelled")
+
+            job.progress[section] = 'running'
+            _save_progress(job)
+
+            rewritten[section] = llm_service.improve_section(section, _section_text(job.cv_data[section]))
+
+            job.progress[section] = 'completed'
+            _save_progress(job, result={'original': job.cv_data, 'rewritten': rewritten})
+
+        _save_progress(job, status='completed', finished_at=timezone.now())
+
+    except LLMCallCancelled:
+        logger.info(f"Rewrite job {job.pk} cancelled")
+        _mark_unfinished_sections(job, 'pending')
+        _save_progress(job, status='cancelled', finished_at=timezone.now())
+
+    except TokenBudgetExceeded as e:
+        _mark_unfinished_sections(job, 'failed')
+        _save_progress(job, status='failed', error_message=str(e), finished_at=timezone.now())
+
+    except Exception as e:
+        logger.error(f"Rewrite job {job.pk} failed: {str(e)}", exc_info=True)
+        _mark_unfinished_sections(job, 'failed')
+        _save_progress(job, status='failed', error_message=str(e), finished_at=timezone.now())
+
+    return job
+
+
+def _section_text(value):
+    """Flatten list sections (experience entries, skills) into prompt text."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(
+            item if isinstance(item, str) else json.dumps(item) for item in value
+        )
+    return json.dumps(value)
+
+
+def _mark_unfinished_sections(job, section_status):
+    for section, current in job.progress.items():
+        if current != 'completed':
+            job.progress[section] = section_status
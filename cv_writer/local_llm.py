@@ -6,8 +6,12 @@ import time
 from typing import Dict, Optional, List, Any
 from pathlib import Path
 import json
+import threading
+from collections import OrderedDict
 from django.conf import settings
 
+from .usage import enforce_token_budget, parse_usage, record_llm_usage
+
 logger = logging.getLogger(__name__)
 
 class BaseLLMService:
@@ -18,15 +22,143 @@ class BaseLLMService:
     def improve_text(self, section, content):
         raise NotImplementedError()
 
+class PromptPrefixCache:
+    """
+    LRU cache of llama.cpp states for evaluated prompt prefixes.
+
+    The section prompts share long fixed instructions. Each prefix is
+    evaluated once and its state saved; restoring it before a completion lets
+    llama.cpp's prefix matching skip straight to the user content.
+    """
+
+    def __init__(self, model, max_bytes: int):
+        self.model = model
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._states = OrderedDict()
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def _state_nbytes(state) -> int:
+        return state.llama_state_size + state.scores.nbytes + state.input_ids.nbytes
+
+    def restore(self, prefix: str):
+        """Load the saved state for ``prefix``, evaluating and saving it on a miss."""
+        with self.lock:
+            state = self._states.get(prefix)
+            if state is not None:
+                self._states.move_to_end(prefix)
+                self.hits += 1
+                self.model.load_state(state)
+                return
+
+            self.misses += 1
+            self.model.reset()
+            self.model.eval(self.model.tokenize(prefix.encode('utf-8')))
+            state = self.model.save_state()
+
+            size = self._state_nbytes(state)
+            if size > self.max_bytes:
+                # Too big to keep, but the model is already primed for this call
+                return
+
+            self._states[prefix] = state
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._states.popitem(last=False)
+                self.current_bytes -= self._state_nbytes(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self._states.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._states),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
 class LocalLLMService(BaseLLMService):
-    def __init__(self, force_init=False):
+    # Static instructions per section, split from the user content so the
+    # evaluated prefix can be reused across calls
+    SECTION_PROMPTS = {
+        'professional_summary': (
+            """As an expert CV writer, improve this professional summary while maintaining complete accuracy of experience and qualifications. Never add years of experience or specific technologies unless they are explicitly mentioned in the original text. Focus on strengthening the language and impact while keeping the facts unchanged.
+
+                    Guidelines:
+                    1. Keep all facts and experience levels exactly as stated
+                    2. Improve the language and structure
+                    3. Focus on potential and eagerness to learn for graduate profiles
+                    4. Don't add specific technologies unless mentioned
+                    5. Keep it concise and professional
+
+                    """,
+            """Original summary: {content}
+                    
+                    Improved summary:""",
+        ),
+        'job_description': (
+            """As an expert CV writer, enhance this job description to be more impactful and achievement-oriented. Focus on quantifiable results and specific contributions while maintaining complete accuracy.
+
+                    Guidelines:
+                    1. Start each bullet point with a strong action verb
+                    2. Include metrics and specific achievements where present
+                    3. Focus on impact and results, not just responsibilities
+                    4. Highlight technical skills and tools actually used
+                    5. Keep descriptions concise and achievement-focused
+                    6. Never fabricate numbers or achievements
+                    7. Maintain all factual information exactly as provided
+
+                    """,
+            """Original description: {content}
+                    
+                    Improved description:""",
+        ),
+        'achievement': (
+            """As an expert CV writer, enhance this achievement to be more impactful and results-oriented. Focus on the specific impact and value delivered while maintaining complete accuracy.
+
+                    Guidelines:
+                    1. Start with a powerful action verb
+                    2. Emphasize quantifiable results where present
+                    3. Highlight the specific impact on the business/project
+                    4. Include relevant technical skills actually used
+                    5. Structure as: Action → Task → Result
+                    6. Never fabricate metrics or outcomes
+                    7. Keep the achievement concise but detailed
+
+                    """,
+            """Original achievement: {content}
+                    
+                    Improved achievement:""",
+        ),
+    }
+
+    def __init__(self, force_init=False, use_prefix_cache=True, user=None):
         super().__init__(settings.CURRENT_LLM_CONFIG)
         self.model = None
+        self.prefix_cache = None
+        self.user = user
         
         # Only initialize in development or if force_init is True
         is_development = not os.environ.get('DJANGO_SETTINGS_MODULE', '').endswith('production')
         if is_development or force_init:
             self._initialize_model()
+
+        if self.model and use_prefix_cache:
+            self.prefix_cache = PromptPrefixCache(
+                self.model,
+                max_bytes=getattr(settings, 'LLM_PREFIX_CACHE_BYTES', 1024 * 1024 * 1024)
+            )
         
         self.prompts = {
             'professional_summary': """[INST] You are an expert CV writer. Improve this professional summary to be more impactful. Focus on years of experience, key achievements, core skills, and career objectives. Keep it concise (100-150 words). Use active voice and strong verbs. 
@@ -173,6 +305,8 @@ class LocalLLMService(BaseLLMService):
 
     def _local_model_improve(self, formatted_prompt: str, section: str, max_tokens: int) -> str:
         """Improve text using local Llama model"""
+        enforce_token_budget(self.user)
+        started = time.monotonic()
         response = self.model(
             formatted_prompt,
             max_tokens=max_tokens,
@@ -183,6 +317,7 @@ class LocalLLMService(BaseLLMService):
             echo=False,
             stop=["</s>", "[INST]", "Return only", "Original", "I hope", "Let me know"]
         )
+        self._record_usage(response, started, section)
         
         # Extract text and post-process
         if response and 'choices' in response and len(response['choices']) > 0:
@@ -259,65 +394,57 @@ class LocalLLMService(BaseLLMService):
         
         return text
         
+    def _record_usage(self, response, started, section=''):
+        """
+        Store the token counts llama.cpp reports for a completion
+
+        :param response: Completion response, with an OpenAI-style ``usage`` block
+        :param started: ``time.monotonic()`` reading taken before the call
+        :param section: Type of section that was improved
+        """
+        record_llm_usage(
+            user=self.user,
+            provider='local',
+            model=os.path.basename(self.config.get('model_path') or ''),
+            usage=parse_usage(response),
+            latency_ms=(time.monotonic() - started) * 1000,
+            section=section
+        )
+
+    def _create_completion(self, prefix, prompt, section='', **kwargs):
+        """Run a completion, restoring the cached state for ``prefix`` first."""
+        started = time.monotonic()
+        if not self.prefix_cache:
+            response = self.model.create_completion(prompt, **kwargs)
+        else:
+            # The restored state must not be clobbered by another call before
+            # this completion has consumed it
+            with self.prefix_cache.lock:
+                self.prefix_cache.restore(prefix)
+                response = self.model.create_completion(prompt, **kwargs)
+        self._record_usage(response, started, section)
+        return response
+
     def improve_section(self, section_type, content):
             """Improve a section of the CV with optimized prompting."""
             if not self.model:
                 raise ValueError("Model not initialized")
+            # Local calls count against the same daily budget as provider calls
+            enforce_token_budget(self.user)
 
             try:
                 # Select appropriate prompt based on section type
-                if section_type == 'professional_summary':
-                    prompt = f"""As an expert CV writer, improve this professional summary while maintaining complete accuracy of experience and qualifications. Never add years of experience or specific technologies unless they are explicitly mentioned in the original text. Focus on strengthening the language and impact while keeping the facts unchanged.
-
-                    Guidelines:
-                    1. Keep all facts and experience levels exactly as stated
-                    2. Improve the language and structure
-                    3. Focus on potential and eagerness to learn for graduate profiles
-                    4. Don't add specific technologies unless mentioned
-                    5. Keep it concise and professional
-
-                    Original summary: {content}
-                    
-                    Improved summary:"""
-                    
-                elif section_type == 'job_description':
-                    prompt = f"""As an expert CV writer, enhance this job description to be more impactful and achievement-oriented. Focus on quantifiable results and specific contributions while maintaining complete accuracy.
-
-                    Guidelines:
-                    1. Start each bullet point with a strong action verb
-                    2. Include metrics and specific achievements where present
-                    3. Focus on impact and results, not just responsibilities
-                    4. Highlight technical skills and tools actually used
-                    5. Keep descriptions concise and achievement-focused
-                    6. Never fabricate numbers or achievements
-                    7. Maintain all factual information exactly as provided
-
-                    Original description: {content}
-                    
-                    Improved description:"""
-                    
-                elif section_type == 'achievement':
-                    prompt = f"""As an expert CV writer, enhance this achievement to be more impactful and results-oriented. Focus on the specific impact and value delivered while maintaining complete accuracy.
-
-                    Guidelines:
-                    1. Start with a powerful action verb
-                    2. Emphasize quantifiable results where present
-                    3. Highlight the specific impact on the business/project
-                    4. Include relevant technical skills actually used
-                    5. Structure as: Action → Task → Result
-                    6. Never fabricate metrics or outcomes
-                    7. Keep the achievement concise but detailed
-
-                    Original achievement: {content}
-                    
-                    Improved achievement:"""
-                else:
+                if section_type not in self.SECTION_PROMPTS:
                     raise ValueError(f"Unsupported section type: {section_type}")
+                prefix, suffix = self.SECTION_PROMPTS[section_type]
+                prompt = prefix + suffix.format(content=content)
 
                 # Generate with optimized parameters
                 logger.info("Generating improvement")
-                response = self.model.create_completion(
+                response = self._create_completion(
+                    prefix,
                     prompt,
+                    section=section_type,
                     max_tokens=300,        # Limit output length
                     temperature=0.7,       # Balanced creativity
                     top_p=0.9,            # Focused sampling
@@ -518,14 +645,24 @@ class LocalLLMService(BaseLLMService):
                 
         return edu if edu else None
 
+class LLMCallCancelled(Exception):
+    """Raised when the caller cancelled the work before a provider call was made."""
+
+
 class ResilientLLMService:
-    def __init__(self, config: Dict[str, Any] = None, force_init: bool = False):
+    def __init__(self, config: Dict[str, Any] = None, force_init: bool = False, user=None, cancel_check=None):
         """
         Initialize a resilient LLM service with multiple providers
         
         :param config: Optional configuration dictionary for LLM providers
         :param force_init: Force initialization even without API keys
+        :param user: User the calls are made for, used for token accounting and budgets
+        :param cancel_check: Optional callable returning True once the work has been cancelled
         """
+        self.user = user
+        self.cancel_check = cancel_check
+        self.last_usage = None
+        
         # Default configuration
         self.config = {
             'providers': {
@@ -566,29 +703,35 @@ class ResilientLLMService:
             if missing_keys:
                 raise ValueError(f"Missing API keys for providers: {', '.join(missing_keys)}")
 
-    def _call_mistral_api(self, prompt: str, max_tokens: int = 500) -> Dict[str, Any]:
+    def _call_mistral_api(self, prompt: str, max_tokens: int = 500, response_format: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
         """
         Call Mistral API with robust error handling
         
         :param prompt: Input text prompt
         :param max_tokens: Maximum tokens to generate
+        :param response_format: Optional response format, e.g. {'type': 'json_object'}
         :return: API response dictionary
         """
         provider_config = self.config['providers']['mistral']
+        payload = {
+            'model': provider_config['model'],
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': max_tokens
+        }
+        if response_format:
+            payload['response_format'] = response_format
         
         for attempt in range(self.config['max_retries']):
+            self._raise_if_cancelled()
             try:
+                started = time.monotonic()
                 response = requests.post(
                     provider_config['url'],
                     headers={
                         'Authorization': f'Bearer {provider_config["api_key"]}',
                         'Content-Type': 'application/json'
                     },
-                    json={
-                        'model': provider_config['model'],
-                        'messages': [{'role': 'user', 'content': prompt}],
-                        'max_tokens': max_tokens
-                    },
+                    json=payload,
                     timeout=self.config['timeout']
                 )
                 
@@ -598,8 +741,10 @@ class ResilientLLMService:
                 return {
                     'status': 'success',
                     'provider': 'mistral',
-                    'model': provider_config['model'],
-                    'response': result['choices'][0]['message']['content']
+                    'model': result.get('model', provider_config['model']),
+                    'response': result['choices'][0]['message']['content'],
+                    'usage': parse_usage(result),
+                    'latency_ms': (time.monotonic() - started) * 1000
                 }
             
             except requests.exceptions.RequestException as e:
@@ -612,30 +757,37 @@ class ResilientLLMService:
                     }
                 time.sleep(2 ** attempt)  # Exponential backoff
     
-    def _call_groq_api(self, prompt: str, max_tokens: int = 500) -> Dict[str, Any]:
+    def _call_groq_api(self, prompt: str, max_tokens: int = 500, response_format: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
         """
         Call Groq API with model fallback and robust error handling
         
         :param prompt: Input text prompt
         :param max_tokens: Maximum tokens to generate
+        :param response_format: Optional response format, e.g. {'type': 'json_object'}
         :return: API response dictionary
         """
         provider_config = self.config['providers']['groq']
         
         for model in provider_config['models']:
+            payload = {
+                'model': model,
+                'messages': [{'role': 'user', 'content': prompt}],
+                'max_tokens': max_tokens
+            }
+            if response_format:
+                payload['response_format'] = response_format
+
             for attempt in range(self.config['max_retries']):
+                self._raise_if_cancelled()
                 try:
+                    started = time.monotonic()
                     response = requests.post(
                         provider_config['url'],
                         headers={
                             'Authorization': f'Bearer {provider_config["api_key"]}',
                             'Content-Type': 'application/json'
                         },
-                        json={
-                            'model': model,
-                            'messages': [{'role': 'user', 'content': prompt}],
-                            'max_tokens': max_tokens
-                        },
+                        json=payload,
                         timeout=self.config['timeout']
                     )
                     
@@ -646,7 +798,9 @@ class ResilientLLMService:
                         'status': 'success',
                         'provider': 'groq',
                         'model': model,
-                        'response': result['choices'][0]['message']['content']
+                        'response': result['choices'][0]['message']['content'],
+                        'usage': parse_usage(result),
+                        'latency_ms': (time.monotonic() - started) * 1000
                     }
                 
                 except requests.exceptions.RequestException as e:
@@ -681,23 +835,72 @@ class ResilientLLMService:
         # Select appropriate prompt template
         prompt = prompt_templates.get(section, prompt_templates['default'])
         
+        result = self._complete(prompt, max_tokens, section)
+        if result['status'] == 'success':
+            return result
+        
+        # If all providers fail
+        return {
+            'status': 'error',
+            'message': 'All LLM providers failed to improve text',
+            'original_content': content
+        }
+
+    def _complete(self, prompt: str, max_tokens: int, section: str, response_format: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Send a prompt to the providers in fallback order, recording token usage
+        
+        :param prompt: Full prompt text
+        :param max_tokens: Maximum tokens to generate
+        :param section: Section name the usage is recorded against
+        :param response_format: Optional response format passed to the providers
+        :return: Result dictionary of the first provider that succeeded, or an error
+        """
+        # Refuse before spending provider quota if the user is over budget
+        enforce_token_budget(self.user)
+        self.last_usage = None
+        
         # Try Mistral first
-        mistral_result = self._call_mistral_api(prompt, max_tokens)
+        mistral_result = self._call_mistral_api(prompt, max_tokens, response_format)
         if mistral_result['status'] == 'success':
+            self._record_usage(mistral_result, section)
             return mistral_result
         
         # Fallback to Groq
-        groq_result = self._call_groq_api(prompt, max_tokens)
+        groq_result = self._call_groq_api(prompt, max_tokens, response_format)
         if groq_result['status'] == 'success':
+            self._record_usage(groq_result, section)
             return groq_result
-        
-        # If all providers fail
+
         return {
             'status': 'error',
-            'message': 'All LLM providers failed to improve text',
-            'original_content': content
+            'message': 'All LLM providers failed'
         }
 
+    def _raise_if_cancelled(self):
+        """
+        Stop before the next provider call if the caller has cancelled
+        """
+        if self.cancel_check and self.cancel_check():
+            raise LLMCallCancelled("LLM call cancelled")
+
+    def _record_usage(self, result: Dict[str, Any], section: str):
+        """
+        Store the token usage reported by a successful provider call
+        
+        :param result: Provider result dictionary
+        :param section: Type of section that was improved
+        """
+        self.last_usage = result['usage']
+        record_llm_usage(
+            user=self.user,
+            provider=result['provider'],
+            model=result['model'],
+            usage=result['usage'],
+            latency_ms=result['latency_ms'],
+            section=section
+        )
+
     def improve_section(self, section: str, content: str, max_tokens: int = 500) -> str:
         """
         Improve a specific section of text, maintaining compatibility with previous implementation
@@ -713,17 +916,7 @@ class ResilientLLMService:
         result = self.improve_text(section, content, max_tokens)
         
         if result['status'] == 'success':
-            # Clean and validate the response
-            improved_text = result['response'].strip()
-            
-            # Remove any leading/trailing quotes or unnecessary prefixes
-            if improved_text.startswith('"') and improved_text.endswith('"'):
-                improved_text = improved_text[1:-1].strip()
-            
-            # Remove any "Improved Summary:" or similar prefixes
-            for prefix in ['Improved Summary:', 'Improved:', 'Summary:', 'Result:']:
-                if improved_text.startswith(prefix):
-                    improved_text = improved_text[len(prefix):].strip()
+            improved_text = self._clean_improved_text(result['response'])
             
             # Validate the improved text
             if len(improved_text) > 10:
@@ -734,6 +927,142 @@ class ResilientLLMService:
         self.logger.warning(f"Failed to improve {section} section: {result.get('message', 'Unknown error')}")
         return content
 
+    @staticmethod
+    def _clean_improved_text(text: str) -> str:
+        """
+        Strip quotes and label prefixes that models tend to wrap answers in
+        
+        :param text: Raw model output for one section
+        :return: Cleaned text
+        """
+        improved_text = text.strip()
+        
+        # Remove any leading/trailing quotes or unnecessary prefixes
+        if improved_text.startswith('"') and improved_text.endswith('"'):
+            improved_text = improved_text[1:-1].strip()
+        
+        # Remove any "Improved Summary:" or similar prefixes
+        for prefix in ['Improved Summary:', 'Improved:', 'Summary:', 'Result:']:
+            if improved_text.startswith(prefix):
+                improved_text = improved_text[len(prefix):].strip()
+        
+        return improved_text
+
+    def improve_sections_batch(self, items: List[Dict[str, Any]], max_tokens_per_item: int = 400, batch_size: int = 8) -> Dict[str, Dict[str, Any]]:
+        """
+        Improve several sections or experience entries with one provider call per batch
+        
+        Items are packed into a single prompt that asks for a JSON object keyed
+        by item id. Items missing from the response or failing validation are
+        retried individually through improve_section.
+        
+        :param items: List of {'id', 'section', 'content'} dictionaries
+        :param max_tokens_per_item: Output token allowance per item in a batch
+        :param batch_size: Maximum number of items sent in one prompt
+        :return: Mapping of item id to {'original', 'improved', 'batched', 'tokens_used'}
+        """
+        results = {}
+        
+        for start in range(0, len(items), batch_size):
+            chunk = items[start:start + batch_size]
+            improved = self._improve_batch_chunk(chunk, max_tokens_per_item)
+            batch_tokens = self.last_usage['total_tokens'] if improved and self.last_usage else 0
+            # The call's tokens go to the items it improved, the remainder to
+            # the first of them, so the items add up to the call's usage
+            share, remainder = divmod(batch_tokens, len(improved) or 1)
+            
+            for item in chunk:
+                item_id = str(item['id'])
+                if item_id in improved:
+                    results[item_id] = {
+                        'original': item['content'],
+                        'improved': improved[item_id],
+                        'batched': True,
+                        'tokens_used': share + (1 if remainder > 0 else 0)
+                    }
+                    remainder -= 1
+                    continue
+                
+                self.logger.info(f"Retrying batch item {item_id} individually")
+                results[item_id] = {
+                    'original': item['content'],
+                    'improved': self.improve_section(item['section'], item['content'], max_tokens_per_item),
+                    'batched': False,
+                    'tokens_used': self.last_usage['total_tokens'] if self.last_usage else 0
+                }
+        
+        return results
+
+    def _improve_batch_chunk(self, chunk: List[Dict[str, Any]], max_tokens_per_item: int) -> Dict[str, str]:
+        """
+        Send one batch prompt and return the improved text of every valid item
+        
+        :param chunk: Items to improve together
+        :param max_tokens_per_item: Output token allowance per item
+        :return: Mapping of item id to improved text, only for items that passed validation
+        """
+        guidance = {
+            'professional_summary': 'Improve this professional summary.',
+            'experience': 'Transform this job description into achievement-focused wording.',
+            'skills': 'Categorize and enhance these skills.',
+        }
+        payload = [
+            {
+                'id': str(item['id']),
+                'section': item['section'],
+                'instruction': guidance.get(item['section'], 'Improve this CV text.'),
+                'content': item['content']
+            }
+            for item in chunk
+        ]
+        prompt = (
+            "You are an expert CV writer. Improve each CV item below following its instruction. "
+            "Keep every fact, date and number exactly as given and never invent achievements or metrics.\n\n"
+            'Respond with only a JSON object of the form {"items": {"<id>": "<improved text>"}} '
+            "with one entry for every item id.\n\n"
+            f"Items:\n{json.dumps(payload, ensure_ascii=False)}"
+        )
+        
+        result = self._complete(
+            prompt,
+            max_tokens_per_item * len(chunk),
+            section='batch',
+            response_format={'type': 'json_object'}
+        )
+        if result['status'] != 'success':
+            self.logger.warning(f"Batch improvement failed: {result.get('message', 'Unknown error')}")
+            return {}
+        
+        text = result['response'].strip()
+        # Some models still wrap JSON in a markdown code fence
+        if text.startswith('```'):
+            text = text.strip('`')
+            if text.startswith('json'):
+                text = text[len('json'):]
+        
+        try:
+            data = json.loads(text)
+        except ValueError:
+            self.logger.warning("Batch improvement returned invalid JSON")
+            return {}
+        
+        if isinstance(data, dict) and isinstance(data.get('items'), dict):
+            data = data['items']
+        if not isinstance(data, dict):
+            return {}
+        
+        expected_ids = {entry['id'] for entry in payload}
+        improved = {}
+        for item_id, value in data.items():
+            item_id = str(item_id)
+            if item_id not in expected_ids or not isinstance(value, str):
+                continue
+            value = self._clean_improved_text(value)
+            if len(value) > 10:
+                improved[item_id] = value
+        
+        return improved
+
 # Optional: Configure logging
 logging.basicConfig(
     level=logging.INFO,
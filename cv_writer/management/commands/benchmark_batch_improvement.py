@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cv_writer.local_llm import ResilientLLMService
+
+SAMPLE_ITEMS = [
+    {
+        'id': 'summary',
+        'section': 'professional_summary',
+        'content': 'Accountant with four years of experience in practice, preparing statutory accounts and tax returns for small businesses.',
+    },
+    {
+        'id': 'experience-1',
+        'section': 'experience',
+        'content': 'Prepared monthly management accounts for 30 clients and handled VAT returns.',
+    },
+    {
+        'id': 'experience-2',
+        'section': 'experience',
+        'content': 'Reconciled bank accounts and supported the audit team during year end.',
+    },
+    {
+        'id': 'experience-3',
+        'section': 'experience',
+        'content': 'Answered client queries about payroll and bookkeeping software.',
+    },
+    {
+        'id': 'skills',
+        'section': 'skills',
+        'content': 'Xero, Sage, Excel, VAT, payroll, communication, attention to detail',
+    },
+]
+
+
+class Command(BaseCommand):
+    """
+    Compare total latency and tokens of improving a CV one section per call
+    against the batched structured call. Uses the configured providers.
+    """
+    help = 'Benchmark per-section against batched CV improvement'
+
+    def handle(self, *args, **options):
+        try:
+            service = ResilientLLMService()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        per_section_tokens = 0
+        for item in SAMPLE_ITEMS:
+            service.improve_section(item['section'], item['content'])
+            per_section_tokens += service.last_usage['total_tokens'] if service.last_usage else 0
+        per_section_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        results = service.improve_sections_batch(SAMPLE_ITEMS)
+        batch_ms = (time.perf_counter() - started) * 1000
+        batch_tokens = sum(result['tokens_used'] for result in results.values())
+        retried = sum(1 for result in results.values() if not result['batched'])
+
+        self.stdout.write(f"{len(SAMPLE_ITEMS)} items")
+        self.stdout.write(f"per-section: {per_section_ms:8.0f} ms, {per_section_tokens} tokens, {len(SAMPLE_ITEMS)} calls")
+        self.stdout.write(f"    batched: {batch_ms:8.0f} ms, {batch_tokens} tokens, {retried} items retried individually")
@@ -0,0 +1,68 @@
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.text import slugify
+from django.core.management.base import BaseCommand
+
+from cv_writer.models import CvWriter
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_slug(cv):
+    # The probing loop CvWriter.save used before the set-based allocator
+    base_slug = slugify(f"{cv.first_name}-{cv.last_name}-cv")
+    unique_slug = base_slug
+    counter = 1
+    while CvWriter.objects.filter(slug=unique_slug).exclude(id=cv.id).exists():
+        unique_slug = f"{base_slug}-{counter}"
+        counter += 1
+    return unique_slug
+
+
+class Command(BaseCommand):
+    """
+    Create thousands of users who all share a name, then compare the queries
+    and time needed to save one more CV with the old probing loop and with
+    the allocator in CvWriter.save. Everything is rolled back afterwards.
+    """
+    help = 'Benchmark slug allocation for CVs with a common name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help='Number of same-name users to create')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['users'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _run(self, user_count):
+        users = User.objects.bulk_create([
+            User(username=f'naming-benchmark-{i}') for i in range(user_count + 1)
+        ])
+        for user in users[:-1]:
+            CvWriter.objects.create(user=user, first_name='John', last_name='Smith')
+
+        cv = CvWriter(user=users[-1], first_name='John', last_name='Smith')
+        # The setup above fills the bounded query log, which would hide the counts
+        connection.queries_log.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            slug = legacy_slug(cv)
+            legacy_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"probing loop: {legacy_ms:8.1f} ms, {len(queries)} queries -> {slug}")
+        connection.queries_log.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            cv.save()
+            allocator_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"   allocator: {allocator_ms:8.1f} ms, {len(queries)} queries (whole save) -> {cv.slug}")
@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cv_writer.local_llm import LocalLLMService
+
+SAMPLE_CONTENT = {
+    'professional_summary': [
+        "Graduate software developer with a strong interest in web applications and cloud services.",
+        "Accountant with experience preparing management accounts and supporting year-end audits.",
+        "Customer service advisor who enjoys solving problems and working in busy teams.",
+    ],
+    'job_description': [
+        "Built internal dashboards in Django and maintained the reporting database.",
+        "Processed supplier invoices and reconciled the purchase ledger each month.",
+        "Answered customer calls and emails and logged issues in the CRM.",
+    ],
+    'achievement': [
+        "Reduced report generation time by moving queries to a read replica.",
+        "Cleared a backlog of unreconciled invoices before the audit deadline.",
+        "Trained three new starters on the complaints process.",
+    ],
+}
+
+
+class Command(BaseCommand):
+    """
+    Benchmark time-to-first-token for LocalLLMService.improve_section prompts
+    with and without the prompt-prefix state cache, on CPU.
+    """
+    help = 'Benchmark time-to-first-token with and without the prompt-prefix cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=3,
+            help='Number of passes over the sample prompts',
+        )
+
+    def _time_to_first_token(self, service, prefix, prompt, use_cache):
+        model = service.model
+        started = time.perf_counter()
+        if use_cache:
+            with service.prefix_cache.lock:
+                service.prefix_cache.restore(prefix)
+                stream = model.create_completion(prompt, max_tokens=1, stream=True)
+                next(iter(stream), None)
+        else:
+            # Drop whatever is in the context so llama.cpp's own prefix
+            # matching does not carry over from the previous call
+            model.reset()
+            stream = model.create_completion(prompt, max_tokens=1, stream=True)
+            next(iter(stream), None)
+        return (time.perf_counter() - started) * 1000
+
+    def handle(self, *args, **options):
+        try:
+            service = LocalLLMService(force_init=True)
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+
+        if not service.model:
+            raise CommandError('The benchmark needs the local llama.cpp provider to be configured')
+
+        results = {'without cache': [], 'with cache': []}
+        for _ in range(options['rounds']):
+            for section, contents in SAMPLE_CONTENT.items():
+                prefix, suffix = service.SECTION_PROMPTS[section]
+                for content in contents:
+                    prompt = prefix + suffix.format(content=content)
+                    results['without cache'].append(
+                        self._time_to_first_token(service, prefix, prompt, use_cache=False)
+                    )
+                    results['with cache'].append(
+                        self._time_to_first_token(service, prefix, prompt, use_cache=True)
+                    )
+
+        for label, timings in results.items():
+            self.stdout.write(
+                f"{label:>14}: median {statistics.median(timings):8.1f} ms, "
+                f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.1f} ms, "
+                f"n={len(timings)}"
+            )
+        self.stdout.write(f"Prefix cache: {service.prefix_cache.stats()}")
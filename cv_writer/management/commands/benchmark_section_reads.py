@@ -0,0 +1,77 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from cv_writer.fast_serializers import get_reader, render_json
+from cv_writer.models import Experience, Skill
+from cv_writer.serializers import ExperienceSerializer, SkillSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Fill one user's experience and skill sections with N rows each, then time
+    rendering the list through the DRF serializer and through the fast read
+    path, checking both give the same bytes. Everything is rolled back
+    afterwards.
+    """
+    help = 'Benchmark the serializer and fast read paths of the section list endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000], help='Row counts to benchmark')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path; the best is reported')
+
+    def handle(self, *args, **options):
+        for rows in options['rows']:
+            try:
+                with transaction.atomic():
+                    self._run(rows, options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def _run(self, row_count, repeat):
+        user = User.objects.create(username=f'section-read-benchmark-{row_count}')
+        Experience.objects.bulk_create([
+            Experience(
+                user=user, company_name=f'Company {i}', job_title='Engineer',
+                job_description='Built things ' * 20, achievements='Shipped them',
+            ) for i in range(row_count)
+        ])
+        Skill.objects.bulk_create([
+            Skill(user=user, skill_name=f'Skill {i}', skill_level='Advanced') for i in range(row_count)
+        ])
+
+        for model, serializer_class in ((Experience, ExperienceSerializer), (Skill, SkillSerializer)):
+            queryset = model.objects.filter(user=user).shared()
+            reader = get_reader(serializer_class)
+
+            def serializer_path():
+                return JSONRenderer().render(serializer_class(queryset.all(), many=True).data)
+
+            def fast_path():
+                return render_json(reader.serialize(queryset.all()))
+
+            slow_ms, slow = self._best(serializer_path, repeat)
+            fast_ms, fast = self._best(fast_path, repeat)
+            if slow != fast:
+                raise AssertionError(f'{model.__name__}: fast read output differs from the serializer')
+            self.stdout.write(
+                f"{model.__name__:>10} x {row_count:>6}: serializer {slow_ms:8.1f} ms, "
+                f"fast read {fast_ms:8.1f} ms ({slow_ms / fast_ms:.1f}x), {len(fast)} bytes"
+            )
+
+    def _best(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
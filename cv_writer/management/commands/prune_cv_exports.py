@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cv_writer.exports import prune_exports
+
+
+class Command(BaseCommand):
+    """
+    Delete cached CV exports that have not been downloaded recently. The web
+    process prunes on its own after renders; this is for cron or a manual
+    clean-up.
+    """
+    help = 'Prune the CV export cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age-days', type=int, default=settings.CV_EXPORT_MAX_AGE_DAYS,
+            help='Delete exports not downloaded for this many days',
+        )
+        parser.add_argument(
+            '--max-bytes', type=int, default=settings.CV_EXPORT_MAX_BYTES,
+            help='Then delete the least recently downloaded until the cache fits in this size',
+        )
+
+    def handle(self, *args, **options):
+        deleted, freed = prune_exports(max_age_days=options['max_age_days'], max_bytes=options['max_bytes'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} exports, freeing {freed} bytes'))
@@ -0,0 +1,58 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from cv_writer.jobs import claim_next_job, requeue_stale_jobs, run_rewrite_job
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Worker for queued whole-CV rewrites. Run one or more alongside the web
+    process; each claims jobs from the CVRewriteJob table.
+    """
+    help = 'Process queued CV rewrite jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the jobs that are queued now and exit',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=15,
+            help='Minutes without progress after which a running job is requeued',
+        )
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['stale_after'])
+        self.stdout.write('Starting CV rewrite worker...')
+
+        while True:
+            requeued = requeue_stale_jobs(stale_after)
+            if requeued:
+                logger.warning(f"Requeued {requeued} stale rewrite job(s)")
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Running rewrite job {job.pk}')
+            job = run_rewrite_job(job)
+            self.stdout.write(f'Rewrite job {job.pk} finished with status {job.status}')
+
+        self.stdout.write(self.style.SUCCESS('CV rewrite worker stopped'))
@@ -0,0 +1,109 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cv_writer', '0019_cvrewritejob'),
+    ]
+
+    # Existing section rows keep a NULL bucket, which makes them the shared
+    # sections every existing version already shows. No rows need moving.
+    operations = [
+        migrations.CreateModel(
+            name='CvSection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=30)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SectionBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=30)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sectionbucket',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='section_buckets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='cvsection',
+            name='bucket',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cv_sections', to='cv_writer.sectionbucket'),
+        ),
+        migrations.AddField(
+            model_name='cvsection',
+            name='cv',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sections', to='cv_writer.cvwriter'),
+        ),
+        migrations.AddField(
+            model_name='certification',
+            name='bucket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cv_writer.sectionbucket'),
+        ),
+        migrations.AddField(
+            model_name='education',
+            name='bucket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cv_writer.sectionbucket'),
+        ),
+        migrations.AddField(
+            model_name='experience',
+            name='bucket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cv_writer.sectionbucket'),
+        ),
+        migrations.AddField(
+            model_name='interest',
+            name='bucket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cv_writer.sectionbucket'),
+        ),
+        migrations.AddField(
+            model_name='language',
+            name='bucket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cv_writer.sectionbucket'),
+        ),
+        migrations.AddField(
+            model_name='professionalsummary',
+            name='bucket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cv_writer.sectionbucket'),
+        ),
+        migrations.AddField(
+            model_name='reference',
+            name='bucket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cv_writer.sectionbucket'),
+        ),
+        migrations.AddField(
+            model_name='skill',
+            name='bucket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cv_writer.sectionbucket'),
+        ),
+        migrations.AddField(
+            model_name='socialmedia',
+            name='bucket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cv_writer.sectionbucket'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='socialmedia',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='socialmedia',
+            constraint=models.UniqueConstraint(condition=models.Q(('bucket__isnull', True)), fields=('user', 'platform'), name='unique_shared_social_media_platform'),
+        ),
+        migrations.AddConstraint(
+            model_name='socialmedia',
+            constraint=models.UniqueConstraint(condition=models.Q(('bucket__isnull', False)), fields=('bucket', 'platform'), name='unique_bucket_social_media_platform'),
+        ),
+        migrations.AddConstraint(
+            model_name='cvsection',
+            constraint=models.UniqueConstraint(fields=('cv', 'kind'), name='unique_cv_section_kind'),
+        ),
+    ]
@@ -1,7 +1,39 @@
-from django.db import models
+import re
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Cast, Substr
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 
+SLUG_ALLOCATION_ATTEMPTS = 5
+
+
+def _max_numeric_suffix(field, prefix):
+    """Aggregate for the largest N over values of ``field`` equal to prefix + N."""
+    return Max(
+        Cast(Substr(field, len(prefix) + 1), models.IntegerField()),
+        filter=Q(**{f'{field}__regex': rf'^{re.escape(prefix)}[0-9]{{1,9}}$'}),
+    )
+
+
+def _allocate_name(queryset, field, base, separator):
+    """
+    Return ``base`` if no row in ``queryset`` uses it, otherwise ``base``
+    followed by ``separator`` and one more than the highest numeric suffix
+    already taken. Runs a single query whatever the number of existing names,
+    over only the rows whose ``field`` starts with ``base``, which an index
+    on ``field`` can find without scanning the table.
+    """
+    taken = queryset.filter(**{f'{field}__startswith': base}).aggregate(
+        base_taken=Count('pk', filter=Q(**{field: base})),
+        max_suffix=_max_numeric_suffix(field, base + separator),
+    )
+    if not taken['base_taken']:
+        return base
+    return f"{base}{separator}{(taken['max_suffix'] or 0) + 1}"
+
+
 
 class CvWriter(models.Model):
     STATUS_CHOICES = (
@@ -51,59 +83,69 @@ class CvWriter(models.Model):
     def save(self, *args, **kwargs):
         # If this is the first version for the user, set as primary
         if not self.pk:  # Only on first save
-            existing_versions = CvWriter.objects.filter(user=self.user).count()
-            if existing_versions == 0:
+            versions = CvWriter.objects.filter(user=self.user).aggregate(
+                count=Count('pk'),
+                max_suffix=_max_numeric_suffix('version_name', 'Version '),
+            )
+            if versions['count'] == 0:
                 self.is_primary = True
                 self.version_name = 'Version 1'
             else:
-                # Ensure unique version name
-                base_name = 'Version'
-                counter = 2  # Start from 2 since first version is already 'Version 1'
-                while CvWriter.objects.filter(user=self.user, version_name=f'{base_name} {counter}').exists():
-                    counter += 1
-                self.version_name = f'{base_name} {counter}'
-
-        # Generate slug if not provided
-        if not self.slug:
-            base_slug = slugify(f"{self.first_name}-{self.last_name}-cv")
-            unique_slug = base_slug
-            counter = 1
-            # Ensure unique slug
-            while CvWriter.objects.filter(slug=unique_slug).exclude(id=self.id).exists():
-                unique_slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = unique_slug
-
-        super().save(*args, **kwargs)
+                # Start from 2 since first version is already 'Version 1'
+                self.version_name = f"Version {max((versions['max_suffix'] or 0) + 1, 2)}"
+
+        if self.slug:
+            super().save(*args, **kwargs)
+            return
+
+        # Generate slug if not provided. The unique constraint settles races
+        # between concurrent saves: the loser allocates again and retries.
+        base_slug = slugify(f"{self.first_name}-{self.last_name}-cv")
+        for attempt in range(SLUG_ALLOCATION_ATTEMPTS):
+            self.slug = _allocate_name(CvWriter.objects.exclude(id=self.id), 'slug', base_slug, '-')
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                slug_taken = CvWriter.objects.filter(slug=self.slug).exclude(id=self.id).exists()
+                if not slug_taken or attempt == SLUG_ALLOCATION_ATTEMPTS - 1:
+                    raise
 
     def clone(self):
         # Create a new version based on this CV
         base_name = f"{self.version_name} - Copy" if self.version_name else "New Version"
-        counter = 1
-        unique_name = base_name
-        while CvWriter.objects.filter(user=self.user, version_name=unique_name).exists():
-            unique_name = f"{base_name} {counter}"
-            counter += 1
-
-        return CvWriter.objects.create(
-            user=self.user,
-            first_name=self.first_name,
-            last_name=self.last_name,
-            address=self.address,
-            city=self.city,
-            country=self.country,
-            contact_number=self.contact_number,
-            additional_information=self.additional_information,
-            title=f"{self.title} - Copy",
-            description=self.description,
-            status=self.status,
-            visibility=self.visibility,
-            parent_version=self,
-            version_name=unique_name,
-            version_purpose=self.version_purpose,
-            is_primary=False
+        unique_name = _allocate_name(
+            CvWriter.objects.filter(user=self.user), 'version_name', base_name, ' '
         )
 
+        with transaction.atomic():
+            clone = CvWriter.objects.create(
+                user=self.user,
+                first_name=self.first_name,
+                last_name=self.last_name,
+                address=self.address,
+                city=self.city,
+                country=self.country,
+                contact_number=self.contact_number,
+                additional_information=self.additional_information,
+                title=f"{self.title} - Copy",
+                description=self.description,
+                status=self.status,
+                visibility=self.visibility,
+                parent_version=self,
+                version_name=unique_name,
+                version_purpose=self.version_purpose,
+                is_primary=False
+            )
+            # Share the parent's own sections; rows are copied only when the
+            # clone edits one of them
+            CvSection.objects.bulk_create([
+                CvSection(cv=clone, kind=section.kind, bucket_id=section.bucket_id)
+                for section in self.sections.all()
+            ])
+        return clone
+
     class Meta:
         verbose_name_plural = 'CV Writers'
         ordering = ['-created_at']
@@ -144,7 +186,136 @@ class CVImprovement(models.Model):
         return f"{self.cv.user.email} - {self.section} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
 
-class Education(models.Model):
+class CVRewriteJob(models.Model):
+    """A whole-CV rewrite queued for the rewrite worker."""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rewrite_jobs')
+    cv_data = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    # Section name -> pending/running/completed/failed
+    progress = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def __str__(self):
+        return f"Rewrite job {self.pk} for {self.user.username} ({self.status})"
+
+
+class LLMUsage(models.Model):
+    """A single LLM provider call with the token counts it reported."""
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='llm_usage')
+    provider = models.CharField(max_length=50)
+    model = models.CharField(max_length=100, blank=True)
+    section = models.CharField(max_length=50, blank=True)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    total_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}/{self.model} - {self.total_tokens} tokens"
+
+
+class LLMDailyUsage(models.Model):
+    """
+    Daily token totals. Rows with a user are per-user aggregates, the row
+    without a user is the global aggregate for that day.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='llm_daily_usage')
+    day = models.DateField()
+    calls = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    total_tokens = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_llm_daily_usage_per_user'),
+            models.UniqueConstraint(
+                fields=['day'],
+                condition=models.Q(user__isnull=True),
+                name='unique_llm_daily_usage_global',
+            ),
+        ]
+
+    def __str__(self):
+        owner = self.user.username if self.user else 'global'
+        return f"{owner} - {self.day} - {self.total_tokens} tokens"
+
+
+class CVSnapshotVersion(models.Model):
+    """
+    Version of a user's CV data, bumped after every committed write to it.
+    Kept in the database so every process sees the same value.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='cv_snapshot_version')
+    version = models.PositiveBigIntegerField(default=0)
+    modified_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"CV snapshot version {self.version} for {self.user.username}"
+
+
+class SectionBucket(models.Model):
+    """
+    A set of rows of one CV section that a version has diverged to. Rows
+    with no bucket are the user's shared sections, used by every version
+    that has not edited that section on its own.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='section_buckets')
+    kind = models.CharField(max_length=30)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} bucket {self.pk} for {self.user.username}"
+
+
+class SectionQuerySet(models.QuerySet):
+    def shared(self):
+        """Rows of the user's shared sections, not of any version's own copy."""
+        return self.filter(bucket__isnull=True)
+
+
+class SectionRow(models.Model):
+    bucket = models.ForeignKey(SectionBucket, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+
+    objects = SectionQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+
+class Education(SectionRow):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="education")
     school_name = models.CharField(max_length=100)
     degree = models.CharField(max_length=100)
@@ -159,7 +330,7 @@ class Education(models.Model):
         return f"{self.school_name} - {self.degree}"
 
 
-class ProfessionalSummary(models.Model):
+class ProfessionalSummary(SectionRow):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="professional_summary")
     summary = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
@@ -169,7 +340,7 @@ class ProfessionalSummary(models.Model):
         return f"Professional summary for {self.user.username}"
 
 
-class Interest(models.Model):
+class Interest(SectionRow):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="interest")
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -179,7 +350,7 @@ class Interest(models.Model):
         return f"{self.name} - {self.user.username}"
 
 
-class Experience(models.Model):
+class Experience(SectionRow):
     EMPLOYMENT_TYPE = (
         ("Full-time", "Full-time"),
         ("Part-time", "Part-time"),
@@ -203,7 +374,7 @@ class Experience(models.Model):
         return f"{self.company_name} - {self.job_title}"
 
 
-class Skill(models.Model):
+class Skill(SectionRow):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="skill")
     skill_name = models.CharField(max_length=100)
     skill_level = models.CharField(max_length=100)
@@ -214,7 +385,7 @@ class Skill(models.Model):
         return self.skill_name
 
 
-class Language(models.Model):
+class Language(SectionRow):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="language")
     language_name = models.CharField(max_length=100)
     language_level = models.CharField(max_length=100)
@@ -226,7 +397,7 @@ class Language(models.Model):
         return self.language_name
 
 
-class Certification(models.Model):
+class Certification(SectionRow):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="certification"
     )
@@ -240,7 +411,7 @@ class Certification(models.Model):
         return f"{self.certificate_name}"
 
 
-class Reference(models.Model):
+class Reference(SectionRow):
     REFERENCE_TYPES = (
         ("Professional", "Professional"),
         ("Academic", "Academic"),
@@ -262,7 +433,7 @@ class Reference(models.Model):
         return f"{self.name} - {self.company}"
 
 
-class SocialMedia(models.Model):
+class SocialMedia(SectionRow):
     PLATFORM_CHOICES = (
         ("LinkedIn", "LinkedIn"),
         ("GitHub", "GitHub"),
@@ -279,7 +450,47 @@ class SocialMedia(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('user', 'platform')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'platform'],
+                condition=Q(bucket__isnull=True),
+                name='unique_shared_social_media_platform',
+            ),
+            models.UniqueConstraint(
+                fields=['bucket', 'platform'],
+                condition=Q(bucket__isnull=False),
+                name='unique_bucket_social_media_platform',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.platform}"
+
+
+class CvSection(models.Model):
+    """Points one section of a CV version at its own bucket of rows."""
+    cv = models.ForeignKey(CvWriter, on_delete=models.CASCADE, related_name='sections')
+    kind = models.CharField(max_length=30)
+    bucket = models.ForeignKey(SectionBucket, on_delete=models.CASCADE, related_name='cv_sections')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cv', 'kind'], name='unique_cv_section_kind'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} of CV {self.cv_id}"
+
+
+# Section kind, as named in the CV document, -> model
+SECTION_MODELS = {
+    'professional_summary': ProfessionalSummary,
+    'experiences': Experience,
+    'education': Education,
+    'skills': Skill,
+    'languages': Language,
+    'certifications': Certification,
+    'interests': Interest,
+    'social_media': SocialMedia,
+    'references': Reference,
+}
@@ -0,0 +1,86 @@
+"""
+Copy-on-write section storage for CV versions.
+
+Section rows with no bucket are the user's shared sections. A version reads
+a section from the shared rows until it edits that section while another
+version is still reading the same rows; the rows are then copied into a
+bucket of its own (``copy_on_write``) and a ``CvSection`` points the version
+at it. Cloning copies the handful of ``CvSection`` pointers, not the rows.
+"""
+from .models import CvSection, CvWriter, SectionBucket, SECTION_MODELS
+
+
+def primary_cv(user):
+    """
+    The version a user's CV is read from outside the editor (job matching,
+    recommendations): the primary one, or the newest if none is primary.
+    """
+    return CvWriter.objects.filter(user=user).order_by('-is_primary', '-created_at').first()
+
+
+def section_buckets(cv):
+    """Map each section kind the version has its own copy of to the bucket id."""
+    return dict(cv.sections.values_list('kind', 'bucket_id'))
+
+
+def bucket_rows(cv, kind, bucket_id):
+    """Rows of ``kind`` in ``bucket_id``, or in the shared rows if it is None."""
+    model = SECTION_MODELS[kind]
+    if bucket_id is None:
+        return model.objects.filter(user_id=cv.user_id).shared()
+    return model.objects.filter(bucket_id=bucket_id)
+
+
+def section_rows(cv, kind, buckets=None):
+    """
+    Rows of ``kind`` that ``cv`` shows. Pass the ``section_buckets`` map when
+    reading several sections to look the buckets up once.
+    """
+    if buckets is None:
+        buckets = section_buckets(cv)
+    return bucket_rows(cv, kind, buckets.get(kind))
+
+
+def is_shared(cv, kind, bucket_id):
+    """Whether another version reads the same rows of ``kind`` as ``cv``."""
+    if bucket_id is None:
+        return CvWriter.objects.filter(user_id=cv.user_id).exclude(pk=cv.pk).exclude(
+            sections__kind=kind
+        ).exists()
+    return CvSection.objects.filter(bucket_id=bucket_id).exclude(cv=cv).exists()
+
+
+def copy_on_write(cv, kind, bucket_id):
+    """
+    Give ``cv`` its own copy of the rows of ``kind`` it currently shows.
+
+    :return: the new bucket and a map from the old row ids to the copies
+    """
+    model = SECTION_MODELS[kind]
+    bucket = SectionBucket.objects.create(user_id=cv.user_id, kind=kind)
+    rows = list(bucket_rows(cv, kind, bucket_id).order_by('id'))
+    old_ids = [row.pk for row in rows]
+    for row in rows:
+        row.pk = None
+        row.bucket = bucket
+    model.objects.bulk_create(rows)
+
+    CvSection.objects.update_or_create(cv=cv, kind=kind, defaults={'bucket': bucket})
+    return bucket, dict(zip(old_ids, (row.pk for row in rows)))
+
+
+def writable_bucket(cv, kind):
+    """
+    Bucket id new rows of ``kind`` for ``cv`` belong to (None for the shared
+    rows), copying the section first if another version shares it.
+    """
+    bucket_id = cv.sections.filter(kind=kind).values_list('bucket_id', flat=True).first()
+    if is_shared(cv, kind, bucket_id):
+        bucket, _ = copy_on_write(cv, kind, bucket_id)
+        return bucket.pk
+    return bucket_id
+
+
+def delete_orphan_buckets(user_id):
+    """Drop buckets no version points at any more, with their rows."""
+    SectionBucket.objects.filter(user_id=user_id, cv_sections__isnull=True).delete()
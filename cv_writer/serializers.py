@@ -11,8 +11,10 @@ from .models import (
     Reference,
     SocialMedia,
     CVImprovement,
+    CVRewriteJob,
 )
 from django.utils import timezone
+from .versions import variant_summary
 
 class CvWriterSerializer(serializers.ModelSerializer):
     class Meta:
@@ -77,8 +79,8 @@ class LanguageSerializer(serializers.ModelSerializer):
 
 class CertificationSerializer(serializers.ModelSerializer):
     name = serializers.CharField(source='certificate_name')
-    date_obtained = serializers.DateField(source='certificate_date')
-    issuing_organization = serializers.URLField(source='certificate_link')
+    date_obtained = serializers.DateField(source='certificate_date', required=False, allow_null=True)
+    issuing_organization = serializers.URLField(source='certificate_link', required=False, allow_null=True, allow_blank=True)
 
     class Meta:
         model = Certification
@@ -113,6 +115,15 @@ class CVImprovementSerializer(serializers.ModelSerializer):
             'created_at'
         ]
 
+class CVRewriteJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CVRewriteJob
+        fields = [
+            'id', 'status', 'progress', 'result', 'error_message',
+            'cancel_requested', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
 class CVVersionSerializer(serializers.ModelSerializer):
     variants = serializers.SerializerMethodField()
     is_primary = serializers.BooleanField(required=False)
@@ -148,18 +159,14 @@ class CVVersionSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'created_at', 'updated_at', 'first_name', 'last_name']
 
     def get_variants(self, obj):
-        # Get all variants of this CV version
-        variants = CvWriter.objects.filter(parent_version=obj)
-        return [
-            {
-                'id': variant.id,
-                'title': variant.title,
-                'version_name': variant.version_name,
-                'version_purpose': variant.version_purpose,
-                'created_at': variant.created_at,
-                'is_primary': variant.is_primary
-            } for variant in variants
-        ]
+        # List views pass every version of the user, grouped by parent, so
+        # this does not run a query per version
+        variants_by_parent = self.context.get('variants_by_parent')
+        if variants_by_parent is not None:
+            variants = variants_by_parent.get(obj.id, [])
+        else:
+            variants = CvWriter.objects.filter(parent_version=obj)
+        return [variant_summary(variant) for variant in variants]
 
     def validate(self, attrs):
         # Ensure only one primary version exists per user
@@ -17,6 +17,7 @@ from .models import (
     CVImprovement,
 )
 from .local_llm import ResilientLLMService  # Corrected import
+from .sections import bucket_rows, writable_bucket
 
 logger = logging.getLogger(__name__)
 
@@ -185,8 +186,11 @@ class CVImprovementService:
             # Retrieve the CV
             cv = CvWriter.objects.get(id=cv_id)
             
-            # Find the professional summary for this user, handling multiple summaries
-            professional_summaries = ProfessionalSummary.objects.filter(user=cv.user)
+            # Find the professional summary this version shows, handling multiple
+            # summaries. The improved text is saved to the version's own copy if
+            # other versions share the section.
+            bucket_id = writable_bucket(cv, 'professional_summary')
+            professional_summaries = bucket_rows(cv, 'professional_summary', bucket_id)
             
             # If multiple summaries exist, use the most recently created one
             if professional_summaries.count() > 1:
@@ -197,13 +201,14 @@ class CVImprovementService:
                 # If no professional summary exists, create a default
                 professional_summary_obj = ProfessionalSummary.objects.create(
                     user=cv.user,
+                    bucket_id=bucket_id,
                     summary="Professional summary not found."
                 )
             
             original_summary = professional_summary_obj.summary
             
             # Use ResilientLLMService to improve the summary
-            llm_service = ResilientLLMService()
+            llm_service = ResilientLLMService(user=cv.user)
             
             # Improve professional summary
             improved_summary = llm_service.improve_section(
@@ -222,7 +227,7 @@ class CVImprovementService:
                 original_content=original_summary,
                 improved_content=improved_summary,
                 improvement_type='full',
-                tokens_used=0,  # You might want to track actual tokens used
+                tokens_used=llm_service.last_usage['total_tokens'] if llm_service.last_usage else 0,
                 status='completed'
             )
             
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import CvWriter
+from .sections import delete_orphan_buckets
+from .snapshot import SNAPSHOT_MODELS, bump_snapshot_version
+
+
+def invalidate_cv_snapshot(sender, instance, **kwargs):
+    # After commit, or a concurrent read could cache the uncommitted rows
+    # under the new version
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_snapshot_version(user_id))
+
+
+# User fields the snapshot shows
+SNAPSHOT_USER_FIELDS = frozenset({'email'})
+
+
+def invalidate_cv_snapshot_for_user(sender, instance, created=False, update_fields=None, **kwargs):
+    # A new user has no snapshot yet, and a login only saves last_login
+    if created or (update_fields is not None and not SNAPSHOT_USER_FIELDS & set(update_fields)):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: bump_snapshot_version(user_id))
+
+
+for model in SNAPSHOT_MODELS:
+    post_save.connect(invalidate_cv_snapshot, sender=model, dispatch_uid=f'cv_snapshot_save_{model.__name__}')
+    post_delete.connect(invalidate_cv_snapshot, sender=model, dispatch_uid=f'cv_snapshot_delete_{model.__name__}')
+
+post_save.connect(invalidate_cv_snapshot_for_user, sender=get_user_model(), dispatch_uid='cv_snapshot_save_user')
+
+
+def delete_unused_section_buckets(sender, instance, **kwargs):
+    # Sections a deleted version had edited on its own go with it
+    delete_orphan_buckets(instance.user_id)
+
+
+post_delete.connect(delete_unused_section_buckets, sender=CvWriter, dispatch_uid='cv_section_buckets_delete')
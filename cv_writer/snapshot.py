@@ -0,0 +1,153 @@
+"""
+Cached, fully assembled CV documents.
+
+``get_cv`` is called on every front-end page load. The assembled document is
+cached under a key made from the user, a per-user version counter and the CV
+id. Saving or deleting any CV or section row bumps the counter once the
+transaction commits (see ``signals.py``), so stale snapshots are never read
+and simply expire. The counter is a ``CVSnapshotVersion`` row rather than a
+cache entry: the cache is per process, and a write handled by one worker,
+the admin or a management command must retire the snapshots of all of them.
+The counter also backs the ETag and Last-Modified headers (see
+``conditional.py``).
+"""
+import time
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import (
+    CvWriter,
+    CVSnapshotVersion,
+    Education,
+    Experience,
+    ProfessionalSummary,
+    Interest,
+    Skill,
+    Language,
+    Certification,
+    Reference,
+    SocialMedia,
+)
+from .sections import section_buckets, section_rows
+from .serializers import (
+    CvWriterSerializer,
+    ExperienceSerializer,
+    EducationSerializer,
+    SkillSerializer,
+    LanguageSerializer,
+    CertificationSerializer,
+    InterestSummarySerializer,
+    SocialMediaSerializer,
+    ReferenceSerializer,
+)
+
+# Models whose rows are part of a user's CV snapshot
+SNAPSHOT_MODELS = (
+    CvWriter,
+    Education,
+    Experience,
+    ProfessionalSummary,
+    Interest,
+    Skill,
+    Language,
+    Certification,
+    Reference,
+    SocialMedia,
+)
+
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+def get_user_stamp(user_id):
+    """
+    The snapshot version and last-modified Unix time of a user's CV data,
+    read from the database in one primary key lookup so every process
+    agrees on them.
+    """
+    stamp = CVSnapshotVersion.objects.filter(user_id=user_id).values_list('version', 'modified_at').first()
+    if stamp is None:
+        # Never written since versions were kept: claim "now", which only
+        # ever costs a refetch
+        return 0, time.time()
+    version, modified_at = stamp
+    return version, modified_at.timestamp()
+
+
+def get_snapshot_version(user_id):
+    return get_user_stamp(user_id)[0]
+
+
+def bump_snapshot_version(user_id):
+    """
+    Move the user's version on. Call it once the write has committed (see
+    ``signals.py``) so no reader can cache uncommitted data under the new
+    version.
+    """
+    now = timezone.now()
+    stamps = CVSnapshotVersion.objects.filter(user_id=user_id)
+    if stamps.update(version=F('version') + 1, modified_at=now):
+        return
+    try:
+        with transaction.atomic():
+            CVSnapshotVersion.objects.create(user_id=user_id, version=1, modified_at=now)
+    except IntegrityError:
+        # Created by a concurrent bump, or the user has just been deleted
+        stamps.update(version=F('version') + 1, modified_at=now)
+
+
+def visible_skills(queryset):
+    """Skills with both a name and a level; blank rows are not shown on the CV."""
+    return queryset.exclude(
+        Q(skill_name__isnull=True) | Q(skill_name='') |
+        Q(skill_level__isnull=True) | Q(skill_level='')
+    )
+
+
+def build_cv_snapshot(cv):
+    """
+    Assemble the full CV document. Runs one query for the CV and user, one
+    for the version's own section buckets and one per section, regardless of
+    how many rows each section has.
+    """
+    buckets = section_buckets(cv)
+
+    def rows(kind):
+        return section_rows(cv, kind, buckets)
+
+    professional_summary = rows('professional_summary').first()
+
+    data = CvWriterSerializer(cv).data
+    data.update({
+        'professional_summary': professional_summary.summary if professional_summary else None,
+        'experiences': ExperienceSerializer(rows('experiences').order_by('-start_date'), many=True).data,
+        'education': EducationSerializer(rows('education').order_by('-start_date'), many=True).data,
+        'skills': SkillSerializer(visible_skills(rows('skills')), many=True).data,
+        'languages': LanguageSerializer(rows('languages'), many=True).data,
+        'certifications': CertificationSerializer(rows('certifications'), many=True).data,
+        'interests': InterestSummarySerializer(rows('interests'), many=True).data,
+        'social_media': SocialMediaSerializer(rows('social_media'), many=True).data,
+        'references': ReferenceSerializer(rows('references'), many=True).data,
+    })
+    return data
+
+
+def get_cv_snapshot(user, cv_id, version=None):
+    """
+    Return the assembled CV ``cv_id`` owned by ``user``, from the cache when
+    the user's data has not changed since it was built.
+
+    :param version: the user's snapshot version, when the caller has read it
+    :raises CvWriter.DoesNotExist: if the user has no such CV
+    """
+    if version is None:
+        version = get_snapshot_version(user.pk)
+    key = f'cv_snapshot:{user.pk}:{version}:{cv_id}'
+    data = cache.get(key)
+    if data is None:
+        cv = CvWriter.objects.select_related('user').get(id=cv_id, user=user)
+        data = build_cv_snapshot(cv)
+        cache.set(key, data, SNAPSHOT_TIMEOUT)
+    return data
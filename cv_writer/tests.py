@@ -1,8 +1,29 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import CvWriter, ProfessionalSummary
+from rest_framework.renderers import JSONRenderer
+from django.core.cache import cache
+from . import models as cv_models
+from .models import (
+    CvWriter, ProfessionalSummary, Experience, Skill, SectionBucket, CVRewriteJob, CVSnapshotVersion, LLMUsage,
+    LLMDailyUsage,
+)
+from .usage import TokenBudgetExceeded, record_llm_usage
+from .jobs import claim_next_job, request_cancel, requeue_stale_jobs, run_rewrite_job
+from . import exports
+from .local_llm import LocalLLMService, PromptPrefixCache, ResilientLLMService
+from .snapshot import bump_snapshot_version, get_snapshot_version
+from .serializers import CertificationSerializer, CvWriterSerializer, ExperienceSerializer, SkillSerializer
 
 User = get_user_model()
 
@@ -102,3 +123,874 @@ class ImproveSummaryViewTestCase(TestCase):
         
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertIn('error', response.data)
+
+
+class LLMUsageTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='usageuser',
+            password='testpassword'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_record_usage_updates_user_and_global_totals(self):
+        """
+        Test that each recorded call is added to the daily aggregates
+        """
+        usage = {'prompt_tokens': 120, 'completion_tokens': 30, 'total_tokens': 150}
+        record_llm_usage(self.user, 'mistral', 'mistral-medium', usage, latency_ms=250)
+        record_llm_usage(self.user, 'groq', 'llama3-8b-8192', usage, latency_ms=100)
+
+        today = timezone.localdate()
+        user_row = LLMDailyUsage.objects.get(user=self.user, day=today)
+        global_row = LLMDailyUsage.objects.get(user__isnull=True, day=today)
+
+        self.assertEqual(LLMUsage.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(user_row.calls, 2)
+        self.assertEqual(user_row.total_tokens, 300)
+        self.assertEqual(global_row.prompt_tokens, 240)
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=100)
+    def test_improve_section_over_budget_returns_429(self):
+        """
+        Test that a user over their daily budget is refused before any provider call
+        """
+        LLMDailyUsage.objects.create(user=self.user, day=timezone.localdate(), total_tokens=150)
+
+        with mock.patch.dict(os.environ, {'MISTRAL_API_KEY': 'key', 'GROQ_API_KEY': 'key'}), \
+                mock.patch('cv_writer.local_llm.requests.post') as post:
+            response = self.client.post(
+                '/api/cv_writer/cv/improve/section/',
+                {'section': 'professional_summary', 'content': 'Some summary'},
+                format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.data['budget'], 100)
+        self.assertIn('Retry-After', response)
+        post.assert_not_called()
+
+    def test_usage_endpoint(self):
+        """
+        Test that the usage endpoint reports today's usage and budget
+        """
+        usage = {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}
+        record_llm_usage(self.user, 'mistral', 'mistral-medium', usage, latency_ms=50)
+
+        response = self.client.get('/api/cv_writer/cv/usage/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['usage']['today']['used'], 15)
+        self.assertNotIn('global', response.data['usage'])
+
+
+class FakeLlamaState:
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.llama_state_size = 100
+        self.scores = np.zeros(10, dtype=np.single)
+        self.input_ids = np.zeros(10, dtype=np.intc)
+
+
+class FakeLlama:
+    """Minimal stand-in exposing the llama.cpp state API used by the cache."""
+
+    def __init__(self):
+        self.evaluated = []
+        self.loaded = []
+
+    def reset(self):
+        self.current = None
+
+    def tokenize(self, text):
+        return list(text)
+
+    def eval(self, tokens):
+        self.current = bytes(tokens).decode('utf-8')
+        self.evaluated.append(self.current)
+
+    def save_state(self):
+        return FakeLlamaState(self.current)
+
+    def load_state(self, state):
+        self.loaded.append(state.prefix)
+
+
+class PromptPrefixCacheTestCase(TestCase):
+    def test_prefix_is_evaluated_once_and_restored(self):
+        """
+        Test that a cached prefix is restored instead of re-evaluated
+        """
+        model = FakeLlama()
+        cache = PromptPrefixCache(model, max_bytes=1000)
+
+        cache.restore('prefix a')
+        cache.restore('prefix a')
+
+        self.assertEqual(model.evaluated, ['prefix a'])
+        self.assertEqual(model.loaded, ['prefix a'])
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_least_recently_used_prefix_is_evicted(self):
+        """
+        Test that the memory budget evicts the least recently used state
+        """
+        model = FakeLlama()
+        # Each fake state is 100 + 40 + 40 bytes, so two fit in the budget
+        cache = PromptPrefixCache(model, max_bytes=400)
+
+        cache.restore('a')
+        cache.restore('b')
+        cache.restore('a')
+        cache.restore('c')
+
+        self.assertEqual(list(cache._states), ['a', 'c'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertLessEqual(cache.stats()['bytes'], 400)
+
+
+class LocalLLMUsageTestCase(TestCase):
+    def _service(self, user):
+        """A LocalLLMService on a mocked Llama, so no model file is needed."""
+        llama = mock.Mock()
+        llama.create_completion.return_value = {
+            'choices': [{'text': 'A motivated graduate eager to learn and grow.'}],
+            'usage': {'prompt_tokens': 90, 'completion_tokens': 12, 'total_tokens': 102},
+        }
+        with mock.patch.object(
+            LocalLLMService, '_initialize_model', autospec=True,
+            side_effect=lambda service: setattr(service, 'model', llama),
+        ):
+            return LocalLLMService(force_init=True, use_prefix_cache=False, user=user)
+
+    def test_local_completion_is_recorded(self):
+        """
+        Test that the token counts llama.cpp reports are metered like provider calls
+        """
+        user = User.objects.create_user(username='localuser', password='testpassword')
+        service = self._service(user)
+
+        service.improve_section('professional_summary', 'Graduate looking for a role')
+
+        record = LLMUsage.objects.get(user=user)
+        self.assertEqual(record.provider, 'local')
+        self.assertEqual(record.section, 'professional_summary')
+        self.assertEqual(record.prompt_tokens, 90)
+        self.assertEqual(record.completion_tokens, 12)
+        self.assertEqual(LLMDailyUsage.objects.get(user=user, day=timezone.localdate()).total_tokens, 102)
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=100)
+    def test_local_completion_respects_budget(self):
+        """
+        Test that a user over their daily budget is refused before the local model runs
+        """
+        user = User.objects.create_user(username='localuser', password='testpassword')
+        LLMDailyUsage.objects.create(user=user, day=timezone.localdate(), total_tokens=150)
+        service = self._service(user)
+
+        with self.assertRaises(TokenBudgetExceeded):
+            service.improve_section('professional_summary', 'Graduate looking for a role')
+        service.model.create_completion.assert_not_called()
+
+
+def provider_response(content, total_tokens=100):
+    response = mock.Mock()
+    response.raise_for_status.return_value = None
+    response.json.return_value = {
+        'model': 'mistral-medium',
+        'choices': [{'message': {'content': content}}],
+        'usage': {'prompt_tokens': total_tokens - 20, 'completion_tokens': 20, 'total_tokens': total_tokens},
+    }
+    return response
+
+
+class BatchImprovementTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='batchuser',
+            password='testpassword'
+        )
+        self.service = ResilientLLMService(force_init=True, user=self.user)
+        self.items = [
+            {'id': 'summary', 'section': 'professional_summary', 'content': 'Accountant with four years of experience.'},
+            {'id': 'exp-1', 'section': 'experience', 'content': 'Prepared monthly management accounts.'},
+        ]
+
+    def test_batch_splits_response_and_retries_missing_items(self):
+        """
+        Test that valid items come from one call and invalid ones are retried alone
+        """
+        batch_reply = json.dumps({'items': {'summary': 'Qualified accountant with four years of practice experience.'}})
+        single_reply = 'Prepared monthly management accounts for a portfolio of clients.'
+
+        with mock.patch('cv_writer.local_llm.requests.post', side_effect=[
+            provider_response(batch_reply, total_tokens=300),
+            provider_response(single_reply, total_tokens=120),
+        ]) as post:
+            results = self.service.improve_sections_batch(self.items)
+
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(post.call_args_list[0].kwargs['json']['response_format'], {'type': 'json_object'})
+        self.assertTrue(results['summary']['batched'])
+        self.assertEqual(results['summary']['tokens_used'], 300)
+        self.assertFalse(results['exp-1']['batched'])
+        self.assertEqual(results['exp-1']['improved'], single_reply)
+        self.assertEqual(LLMDailyUsage.objects.get(user=self.user).total_tokens, 420)
+        self.assertEqual(sum(result['tokens_used'] for result in results.values()), 420)
+
+    def test_batch_tokens_add_up_to_the_call(self):
+        """
+        Test that an uneven split gives the remainder to the first items
+        """
+        batch_reply = json.dumps({'items': {
+            'summary': 'Qualified accountant with four years of practice experience.',
+            'exp-1': 'Prepared monthly management accounts for a portfolio of clients.',
+        }})
+
+        with mock.patch('cv_writer.local_llm.requests.post', return_value=provider_response(batch_reply, total_tokens=301)):
+            results = self.service.improve_sections_batch(self.items)
+
+        self.assertEqual(results['summary']['tokens_used'], 151)
+        self.assertEqual(results['exp-1']['tokens_used'], 150)
+
+
+class RewriteJobTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='rewriteuser',
+            password='testpassword'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.cv_data = {
+            'professional_summary': 'Accountant with four years of experience.',
+            'experience': ['Prepared monthly management accounts.'],
+        }
+
+    def _submit(self):
+        response = self.client.post('/api/cv_writer/cv/rewrite/', {'cv_data': self.cv_data}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return response.data['id']
+
+    def test_queued_job_runs_to_completion(self):
+        """
+        Test that a submitted job is picked up by the worker and records per-section progress
+        """
+        job_id = self._submit()
+        self.assertEqual(CVRewriteJob.objects.get(id=job_id).status, 'queued')
+
+        with mock.patch('cv_writer.local_llm.requests.post', side_effect=[
+            provider_response('Qualified accountant with four years of practice experience.'),
+            provider_response('Prepared monthly management accounts for a portfolio of clients.'),
+        ]):
+            run_rewrite_job(claim_next_job())
+
+        response = self.client.get(f'/api/cv_writer/cv/rewrite/{job_id}/')
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['progress'], {'professional_summary': 'completed', 'experience': 'completed'})
+        self.assertIn('portfolio of clients', response.data['result']['rewritten']['experience'])
+
+    def test_cancel_queued_job(self):
+        """
+        Test that cancelling a queued job stops it from being claimed
+        """
+        job_id = self._submit()
+        response = self.client.post(f'/api/cv_writer/cv/rewrite/{job_id}/cancel/')
+
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.assertIsNone(claim_next_job())
+
+    def test_cancel_running_job_stops_before_next_call(self):
+        """
+        Test that a running job stops before calling the provider once cancellation is requested
+        """
+        self._submit()
+        job = claim_next_job()
+        request_cancel(job)
+
+        with mock.patch('cv_writer.local_llm.requests.post') as post:
+            run_rewrite_job(job)
+
+        post.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'cancelled')
+        self.assertEqual(job.progress['professional_summary'], 'pending')
+
+    def test_service_error_fails_job(self):
+        """
+        Test that a service that cannot be built fails the job instead of the worker
+        """
+        self._submit()
+        job = claim_next_job()
+
+        with mock.patch('cv_writer.jobs.ResilientLLMService', side_effect=ValueError('No API keys configured')):
+            run_rewrite_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('No API keys', job.error_message)
+
+    def test_stale_sweep_finishes_cancelled_jobs(self):
+        """
+        Test that a stale running job is requeued unless it was cancelled, which finishes it
+        """
+        self._submit()
+        self._submit()
+        cancelled = claim_next_job()
+        request_cancel(cancelled)
+        orphaned = claim_next_job()
+        long_ago = timezone.now() - timedelta(hours=1)
+        CVRewriteJob.objects.filter(pk__in=[cancelled.pk, orphaned.pk]).update(updated_at=long_ago)
+
+        requeued = requeue_stale_jobs(timedelta(minutes=15))
+
+        self.assertEqual(requeued, 1)
+        self.assertEqual(CVRewriteJob.objects.get(pk=cancelled.pk).status, 'cancelled')
+        self.assertEqual(CVRewriteJob.objects.get(pk=orphaned.pk).status, 'queued')
+
+
+class CVSnapshotTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='snapshotuser',
+            email='snapshot@example.com',
+            password='testpassword'
+        )
+        self.cv = CvWriter.objects.create(user=self.user, first_name='Snap', last_name='Shot')
+        ProfessionalSummary.objects.create(user=self.user, summary='Experienced accountant.')
+        Skill.objects.create(user=self.user, skill_name='Excel', skill_level='Advanced')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = f'/api/cv_writer/cv/{self.cv.id}/detail/'
+
+    def _add_experience(self, count):
+        for i in range(count):
+            Experience.objects.create(
+                user=self.user, company_name=f'Company {i}', job_title='Accountant',
+                job_description='Accounts', achievements='Audits', employment_type='Full-time'
+            )
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """
+        Test that building the snapshot runs a fixed number of queries
+        """
+        self._add_experience(1)
+        cache.clear()
+        # 1 for the snapshot version, 1 for the CV and user, 1 for the
+        # version's own sections, 1 per section
+        with self.assertNumQueries(12):
+            self.client.get(self.url)
+
+        self._add_experience(20)
+        cache.clear()
+        with self.assertNumQueries(12):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['experiences']), 21)
+
+    def test_version_is_bumped_in_the_database_after_commit(self):
+        """
+        Test that the version moves only once the write commits, and not through the cache
+        """
+        before = get_snapshot_version(self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Skill.objects.create(user=self.user, skill_name='Sage', skill_level='Intermediate')
+            self.assertEqual(get_snapshot_version(self.user.pk), before)
+        for callback in callbacks:
+            callback()
+
+        # Another process has its own cache, but reads the same row
+        cache.clear()
+        self.assertEqual(get_snapshot_version(self.user.pk), before + 1)
+        self.assertEqual(CVSnapshotVersion.objects.get(user=self.user).version, before + 1)
+
+    def test_cached_snapshot_is_invalidated_on_section_change(self):
+        """
+        Test that repeat reads hit the cache and section writes invalidate it
+        """
+        first = self.client.get(self.url)
+        self.assertEqual(first.data['user_email'], 'snapshot@example.com')
+        self.assertEqual(first.data['skills'][0]['name'], 'Excel')
+
+        # Only the snapshot version is read
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).data, first.data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Skill.objects.create(user=self.user, skill_name='Sage', skill_level='Intermediate')
+        self.assertEqual(len(self.client.get(self.url).data['skills']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cv.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_login_does_not_invalidate_snapshot(self):
+        """
+        Test that only user saves touching a shown field move the version
+        """
+        before = get_snapshot_version(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.client.login(username='snapshotuser', password='testpassword'))
+        self.assertEqual(get_snapshot_version(self.user.pk), before)
+
+        self.user.email = 'moved@example.com'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['email'])
+        self.assertEqual(get_snapshot_version(self.user.pk), before + 1)
+
+
+class CVVersionTreeTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='versionuser',
+            password='testpassword'
+        )
+        self.root = CvWriter.objects.create(user=self.user, first_name='Version', last_name='User')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _clone_chain(self, count):
+        parent = self.root
+        for _ in range(count):
+            parent = parent.clone()
+            parent.clone()
+
+    def test_version_list_query_count_is_constant(self):
+        """
+        Test that listing versions with variants does not query per version
+        """
+        self._clone_chain(2)
+        # 1 for the ETag stamp, 1 for the versions
+        with self.assertNumQueries(2):
+            small = self.client.get('/api/cv_writer/cv/versions/')
+
+        self._clone_chain(10)
+        with self.assertNumQueries(2):
+            large = self.client.get('/api/cv_writer/cv/versions/')
+
+        self.assertEqual(len(small.data), 5)
+        self.assertEqual(len(large.data), 25)
+        root = next(version for version in large.data if version['id'] == self.root.id)
+        self.assertEqual(len(root['variants']), 2)
+
+    def test_version_tree(self):
+        """
+        Test that the tree nests every version under its parent
+        """
+        self._clone_chain(3)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cv_writer/cv/versions/tree/')
+
+        self.assertEqual(len(response.data), 1)
+
+        def walk(node, depth=0):
+            yield node, depth
+            for child in node['children']:
+                yield from walk(child, depth + 1)
+
+        nodes = list(walk(response.data[0]))
+        self.assertEqual(len(nodes), 7)
+        self.assertEqual(max(depth for _, depth in nodes), 4)
+
+
+class CVNameAllocationTestCase(TestCase):
+    def _create_cv(self, username):
+        user = User.objects.create_user(username=username, password='testpassword')
+        return CvWriter.objects.create(user=user, first_name='John', last_name='Smith')
+
+    def test_slug_suffix_found_without_probing(self):
+        """
+        Test that the next slug comes from one lookup however many names are taken
+        """
+        slugs = [self._create_cv(f'john{i}').slug for i in range(3)]
+        self.assertEqual(slugs, ['john-smith-cv', 'john-smith-cv-1', 'john-smith-cv-2'])
+
+        for i in range(3, 30):
+            self._create_cv(f'john{i}')
+        user = User.objects.create_user(username='john-last', password='testpassword')
+        # version count, slug lookup, savepoint, insert, savepoint release
+        with self.assertNumQueries(5) as queries:
+            cv = CvWriter.objects.create(user=user, first_name='John', last_name='Smith')
+        self.assertEqual(cv.slug, 'john-smith-cv-30')
+        # The lookup is narrowed to the base slug's prefix
+        self.assertIn('LIKE', queries.captured_queries[1]['sql'])
+
+    def test_slug_race_is_retried(self):
+        """
+        Test that losing a race for a slug re-allocates instead of failing
+        """
+        self._create_cv('john0')
+        user = User.objects.create_user(username='john1', password='testpassword')
+        with mock.patch.object(cv_models, '_allocate_name', side_effect=['john-smith-cv', 'john-smith-cv-1']):
+            cv = CvWriter.objects.create(user=user, first_name='John', last_name='Smith')
+        self.assertEqual(cv.slug, 'john-smith-cv-1')
+
+    def test_version_and_clone_names(self):
+        """
+        Test that new versions get the next number and taken names a suffix
+        """
+        first = self._create_cv('john0')
+        second = CvWriter.objects.create(user=first.user, first_name='John', last_name='Smith')
+        self.assertEqual((first.version_name, second.version_name), ('Version 1', 'Version 2'))
+
+        versions = CvWriter.objects.filter(user=first.user)
+        self.assertEqual(cv_models._allocate_name(versions, 'version_name', 'Version 3', ' '), 'Version 3')
+        self.assertEqual(cv_models._allocate_name(versions, 'version_name', 'Version 2', ' '), 'Version 2 1')
+
+
+class CVDocumentTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='documentuser',
+            password='testpassword'
+        )
+        self.cv = CvWriter.objects.create(user=self.user, first_name='Doc', last_name='User')
+        self.kept = Skill.objects.create(user=self.user, skill_name='Excel', skill_level='Advanced')
+        self.removed = Skill.objects.create(user=self.user, skill_name='Lotus', skill_level='Basic')
+        Experience.objects.create(
+            user=self.user, company_name='Acme', job_title='Clerk',
+            job_description='Filing', achievements='None', employment_type='Full-time'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = f'/api/cv_writer/cv/{self.cv.id}/document/'
+
+    def test_document_round_trip_applies_diff(self):
+        """
+        Test that one request creates, updates and deletes section rows
+        """
+        document = self.client.get(f'/api/cv_writer/cv/{self.cv.id}/detail/').data
+        document['title'] = 'Finance CV'
+        document['professional_summary'] = 'Accountant.'
+        document['skills'] = [
+            {'id': self.kept.id, 'name': 'Excel', 'proficiency': 'Expert'},
+            {'name': 'Xero', 'proficiency': 'Intermediate'},
+        ]
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.put(self.url, document, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        # The cached snapshot is retired only once the write has committed
+        detail_url = f'/api/cv_writer/cv/{self.cv.id}/detail/'
+        self.assertNotEqual(self.client.get(detail_url).data['title'], 'Finance CV')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(detail_url).data['title'], 'Finance CV')
+        self.assertEqual(response.data['title'], 'Finance CV')
+        self.assertEqual(response.data['professional_summary'], 'Accountant.')
+        self.assertEqual(
+            sorted((s['name'], s['proficiency']) for s in response.data['skills']),
+            [('Excel', 'Expert'), ('Xero', 'Intermediate')]
+        )
+        self.assertFalse(Skill.objects.filter(id=self.removed.id).exists())
+        self.assertEqual(Experience.objects.filter(user=self.user).count(), 1)
+
+    def test_invalid_document_writes_nothing(self):
+        """
+        Test that an invalid item rejects the whole document
+        """
+        response = self.client.put(self.url, {
+            'title': 'Changed',
+            'skills': [{'name': 'Xero', 'proficiency': 'Intermediate'}],
+            'experiences': [{'company_name': 'Missing fields'}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('experiences', response.data['details'])
+        self.assertEqual(Skill.objects.filter(user=self.user).count(), 2)
+        self.cv.refresh_from_db()
+        self.assertNotEqual(self.cv.title, 'Changed')
+
+    def test_other_users_rows_are_rejected(self):
+        """
+        Test that ids belonging to another user cannot be updated
+        """
+        other = User.objects.create_user(username='otheruser', password='testpassword')
+        foreign = Skill.objects.create(user=other, skill_name='SQL', skill_level='Advanced')
+
+        response = self.client.put(self.url, {
+            'skills': [{'id': foreign.id, 'name': 'SQL', 'proficiency': 'Basic'}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.skill_level, 'Advanced')
+
+
+class CopyOnWriteSectionsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='cowuser',
+            password='testpassword'
+        )
+        self.parent = CvWriter.objects.create(user=self.user, first_name='Cow', last_name='User')
+        Skill.objects.create(user=self.user, skill_name='Excel', skill_level='Advanced')
+        Skill.objects.create(user=self.user, skill_name='Sage', skill_level='Basic')
+        ProfessionalSummary.objects.create(user=self.user, summary='Accountant.')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _get(self, cv):
+        return self.client.get(f'/api/cv_writer/cv/{cv.id}/detail/').data
+
+    def test_clone_shares_rows_until_edited(self):
+        """
+        Test that cloning copies no rows and an edit copies only the edited section
+        """
+        clone = self.parent.clone()
+        self.assertEqual(Skill.objects.count(), 2)
+        self.assertEqual(self._get(clone)['skills'], self._get(self.parent)['skills'])
+
+        document = self._get(clone)
+        document['skills'] = document['skills'][:1]
+        response = self.client.put(f'/api/cv_writer/cv/{clone.id}/document/', document, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([s['name'] for s in response.data['skills']], ['Excel'])
+        self.assertEqual(len(self._get(self.parent)['skills']), 2)
+        # Skills were copied for the clone then one deleted; the summary is still shared
+        self.assertEqual(Skill.objects.count(), 3)
+        self.assertEqual(ProfessionalSummary.objects.count(), 1)
+
+        # A clone of the clone shares the clone's copy
+        grandchild = clone.clone()
+        self.assertEqual([s['name'] for s in self._get(grandchild)['skills']], ['Excel'])
+        self.assertEqual(Skill.objects.count(), 3)
+
+    def test_only_version_edits_shared_rows_in_place(self):
+        """
+        Test that a version that is the only reader of the shared rows does not copy them
+        """
+        document = self._get(self.parent)
+        document['professional_summary'] = 'Chartered accountant.'
+        self.client.put(f'/api/cv_writer/cv/{self.parent.id}/document/', document, format='json')
+
+        self.assertEqual(ProfessionalSummary.objects.get().summary, 'Chartered accountant.')
+        self.assertFalse(SectionBucket.objects.exists())
+
+    def test_deleting_version_drops_its_copies(self):
+        """
+        Test that sections a deleted version had copied are removed with it
+        """
+        clone = self.parent.clone()
+        document = self._get(clone)
+        document['professional_summary'] = 'Finance focused.'
+        self.client.put(f'/api/cv_writer/cv/{clone.id}/document/', document, format='json')
+        self.assertEqual(ProfessionalSummary.objects.count(), 2)
+        self.assertEqual(self._get(self.parent)['professional_summary'], 'Accountant.')
+
+        clone.delete()
+
+        self.assertEqual(ProfessionalSummary.objects.count(), 1)
+        self.assertFalse(SectionBucket.objects.exists())
+        # The per-item endpoints keep working on the shared rows
+        response = self.client.get('/api/cv_writer/professional-summary/')
+        self.assertEqual(len(response.json()), 1)
+
+
+class CVExportTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.export_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(CV_EXPORT_CACHE_DIR=self.export_dir.name)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username='exportuser',
+            email='export@example.com',
+            password='testpassword'
+        )
+        self.cv = CvWriter.objects.create(user=self.user, first_name='Ada', last_name='Lovelace')
+        ProfessionalSummary.objects.create(user=self.user, summary='Analyst & mathematician.')
+        Skill.objects.create(user=self.user, skill_name='Analysis', skill_level='Expert')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.export_dir.cleanup()
+
+    def _download(self, export_format):
+        response = self.client.get(f'/api/cv_writer/cv/{self.cv.id}/export/{export_format}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content)
+
+    def test_formats_render(self):
+        """
+        Test that each format produces a file of the right type
+        """
+        self.assertIn(b'Analyst &amp; mathematician.', self._download('html'))
+        self.assertTrue(self._download('pdf').startswith(b'%PDF'))
+        self.assertTrue(self._download('docx').startswith(b'PK'))
+
+    def test_unchanged_cv_is_not_rendered_again(self):
+        """
+        Test that repeat downloads stream the cached file and edits render a new one
+        """
+        with mock.patch.object(exports, '_render_to_file', wraps=exports._render_to_file) as render:
+            first = self._download('pdf')
+            self.assertEqual(self._download('pdf'), first)
+            self.assertEqual(render.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Skill.objects.create(user=self.user, skill_name='Writing', skill_level='Advanced')
+            self._download('pdf')
+            self.assertEqual(render.call_count, 2)
+
+    def test_old_exports_are_pruned(self):
+        """
+        Test that exports not downloaded recently go, then the oldest until the cache fits
+        """
+        def write(name, size, days_ago):
+            path = os.path.join(self.export_dir.name, 'ab', name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'x' * size)
+            used = time.time() - days_ago * 24 * 60 * 60
+            os.utime(path, (used, used))
+            return path
+
+        stale = write('stale.pdf', 10, days_ago=30)
+        older = write('older.pdf', 100, days_ago=2)
+        newer = write('newer.pdf', 100, days_ago=1)
+
+        self.assertEqual(exports.prune_exports(max_age_days=7, max_bytes=150), (2, 110))
+        self.assertFalse(os.path.exists(stale))
+        self.assertFalse(os.path.exists(older))
+        self.assertTrue(os.path.exists(newer))
+
+    def test_unknown_format(self):
+        response = self.client.get(f'/api/cv_writer/cv/{self.cv.id}/export/odt/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConditionalRequestTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='etaguser',
+            password='testpassword'
+        )
+        self.cv = CvWriter.objects.create(user=self.user, first_name='Etag', last_name='User')
+        self.skill = Skill.objects.create(user=self.user, skill_name='Excel', skill_level='Advanced')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = f'/api/cv_writer/cv/{self.cv.id}/detail/'
+
+    def test_if_none_match_returns_304_from_the_stamp(self):
+        """
+        Test that a poll with the current ETag is answered from the version stamp alone
+        """
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/cv_writer/skill/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Skill.objects.create(user=self.user, skill_name='Sage', skill_level='Basic')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_match_rejects_stale_writes(self):
+        """
+        Test that a write based on an old ETag fails with 412
+        """
+        etag = self.client.get('/api/cv_writer/skill/')['ETag']
+        skill_url = f'/api/cv_writer/skill/{self.skill.id}/'
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(skill_url, {'skill_level': 'Expert'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # The same tag is now stale
+        response = self.client.patch(skill_url, {'skill_level': 'Basic'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.skill.refresh_from_db()
+        self.assertEqual(self.skill.skill_level, 'Expert')
+
+    def test_write_in_another_process_changes_validators(self):
+        """
+        Test that validators follow writes this process's cache never saw
+        """
+        etag = self.client.get(self.url)['ETag']
+        # Another worker's write: the version row moves, this cache is untouched
+        bump_snapshot_version(self.user.pk)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.patch(
+            f'/api/cv_writer/skill/{self.skill.id}/', {'skill_level': 'Expert'}, format='json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+
+class FastReadTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='fastreader',
+            email='fast@example.com',
+            password='testpassword'
+        )
+        self.cv = CvWriter.objects.create(user=self.user, first_name='Zoë', last_name='Reader')
+        Experience.objects.create(
+            user=self.user, company_name='Acme Ltd', job_title='Analyst',
+            job_description='Line one\nLine "two"', achievements='', start_date=date(2020, 1, 1),
+        )
+        Experience.objects.create(
+            user=self.user, company_name='Café', job_title='Barista',
+            job_description='Coffee', achievements='Latte art',
+        )
+        self.skill = Skill.objects.create(user=self.user, skill_name='Excel', skill_level='Advanced')
+        cv_models.Certification.objects.create(user=self.user, certificate_name='CPA')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assertSameAsSerializer(self, url, serializer_class, data):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, JSONRenderer().render(serializer_class(data, **(
+            {'many': True} if not hasattr(data, 'pk') else {}
+        )).data))
+
+    def test_lists_match_serializers(self):
+        """
+        Test that the fast list path renders the same bytes as the serializers
+        """
+        self.assertSameAsSerializer('/api/cv_writer/cv/', CvWriterSerializer, CvWriter.objects.filter(user=self.user))
+        self.assertSameAsSerializer('/api/cv_writer/experience/', ExperienceSerializer, Experience.objects.filter(user=self.user))
+        self.assertSameAsSerializer('/api/cv_writer/skill/', SkillSerializer, Skill.objects.filter(user=self.user))
+        self.assertSameAsSerializer(
+            '/api/cv_writer/certification/', CertificationSerializer,
+            cv_models.Certification.objects.filter(user=self.user)
+        )
+
+    def test_detail_matches_serializer(self):
+        """
+        Test that the fast detail path matches the serializer and 404s
+        """
+        self.assertSameAsSerializer(f'/api/cv_writer/skill/{self.skill.id}/', SkillSerializer, self.skill)
+        response = self.client.get(f'/api/cv_writer/skill/{self.skill.id + 100}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cv_list_joins_user_email(self):
+        """
+        Test that listing CVs does not load each owner separately
+        """
+        CvWriter.objects.create(user=self.user, first_name='Zoë', last_name='Reader')
+        cache.clear()
+        # 1 for the ETag stamp, 1 for the CVs and their owners
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cv_writer/cv/')
+        self.assertEqual([cv['user_email'] for cv in response.json()], ['fast@example.com'] * 2)
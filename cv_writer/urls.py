@@ -4,13 +4,19 @@ from . import views
 urlpatterns = [
     # CV Improvement endpoints
     path('cv/improve/section/', views.improve_section, name='improve-section'),
+    path('cv/improve/batch/', views.improve_sections_batch, name='improve-sections-batch'),
     path('cv/improve_summary/', views.improve_summary, name='improve_summary'),
     path('cv/rewrite/', views.rewrite_cv, name='rewrite_cv'),
+    path('cv/rewrite/<int:job_id>/', views.get_rewrite_job, name='rewrite-job'),
+    path('cv/rewrite/<int:job_id>/cancel/', views.cancel_rewrite_job, name='cancel-rewrite-job'),
     path('cv/improvements/<int:cv_id>/', views.get_cv_improvements, name='cv-improvements'),
+    path('cv/usage/', views.get_llm_usage, name='llm-usage'),
 
     # Base CV endpoints
     path('cv/', views.CvWriterListCreate.as_view(), name='cv-list-create'),
     path('cv/<int:cv_id>/detail/', views.get_cv, name='get_cv'),
+    path('cv/<int:cv_id>/document/', views.save_cv_document, name='save-cv-document'),
+    path('cv/<int:cv_id>/export/<str:export_format>/', views.export_cv, name='export-cv'),
     path('cv/<int:cv_id>/improve/', views.improve_cv, name='improve-cv'),  
 
     # Section endpoints
@@ -43,6 +49,7 @@ urlpatterns = [
 
     # CV Versioning Endpoints
     path('cv/versions/', views.CVVersionListCreateView.as_view(), name='cv-version-list-create'),
+    path('cv/versions/tree/', views.CVVersionTreeView.as_view(), name='cv-version-tree'),
     path('cv/versions/<int:pk>/', views.CVVersionDetailView.as_view(), name='cv-version-detail'),
     path('cv/versions/<int:pk>/set-primary/', views.SetPrimaryVersionView.as_view(), name='set-primary-version'),
     path('cv/versions/<int:pk>/clone/', views.CloneCVVersionView.as_view(), name='clone-cv-version'),
@@ -0,0 +1,144 @@
+"""
+Token accounting for LLM calls.
+
+Every successful provider call is stored as an ``LLMUsage`` row and folded
+into the per-user and global ``LLMDailyUsage`` aggregates. The per-user daily
+budget is checked before a call is made so heavy users get a 429 instead of
+starving everyone else of provider throughput.
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import LLMUsage, LLMDailyUsage
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBudgetExceeded(Exception):
+    """Raised when a user has used up their daily LLM token budget."""
+
+    def __init__(self, used, budget, resets_at):
+        self.used = used
+        self.budget = budget
+        self.resets_at = resets_at
+        super().__init__(f"Daily token budget of {budget} exhausted ({used} used)")
+
+
+def get_daily_budget():
+    return getattr(settings, 'LLM_DAILY_TOKEN_BUDGET', 100000)
+
+
+def _next_reset():
+    tomorrow = timezone.localdate() + timedelta(days=1)
+    return timezone.make_aware(datetime.combine(tomorrow, time.min))
+
+
+def tokens_used_today(user):
+    row = LLMDailyUsage.objects.filter(user=user, day=timezone.localdate()).only('total_tokens').first()
+    return row.total_tokens if row else 0
+
+
+def enforce_token_budget(user):
+    """Raise TokenBudgetExceeded if the user has no budget left for today."""
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return
+    budget = get_daily_budget()
+    if not budget:
+        return
+    used = tokens_used_today(user)
+    if used >= budget:
+        raise TokenBudgetExceeded(used=used, budget=budget, resets_at=_next_reset())
+
+
+def parse_usage(response_json):
+    """Pull the OpenAI-style ``usage`` block out of a provider response."""
+    usage = (response_json or {}).get('usage') or {}
+    prompt_tokens = int(usage.get('prompt_tokens') or 0)
+    completion_tokens = int(usage.get('completion_tokens') or 0)
+    total_tokens = int(usage.get('total_tokens') or prompt_tokens + completion_tokens)
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': total_tokens,
+    }
+
+
+def record_llm_usage(user, provider, model, usage, latency_ms, section=''):
+    """Store a provider call and add it to today's per-user and global totals."""
+    if user is not None and not getattr(user, 'is_authenticated', False):
+        user = None
+
+    try:
+        with transaction.atomic():
+            record = LLMUsage.objects.create(
+                user=user,
+                provider=provider,
+                model=model or '',
+                section=section or '',
+                prompt_tokens=usage['prompt_tokens'],
+                completion_tokens=usage['completion_tokens'],
+                total_tokens=usage['total_tokens'],
+                latency_ms=int(latency_ms),
+            )
+
+            today = timezone.localdate()
+            owners = [None] if user is None else [user, None]
+            for owner in owners:
+                daily, _ = LLMDailyUsage.objects.get_or_create(user=owner, day=today)
+                LLMDailyUsage.objects.filter(pk=daily.pk).update(
+                    calls=F('calls') + 1,
+                    prompt_tokens=F('prompt_tokens') + usage['prompt_tokens'],
+                    completion_tokens=F('completion_tokens') + usage['completion_tokens'],
+                    total_tokens=F('total_tokens') + usage['total_tokens'],
+                )
+            return record
+    except Exception as e:
+        # Accounting must never break the request that made the call
+        logger.error(f"Failed to record LLM usage: {str(e)}")
+        return None
+
+
+def _daily_rows(queryset):
+    return [
+        {
+            'day': row.day,
+            'calls': row.calls,
+            'prompt_tokens': row.prompt_tokens,
+            'completion_tokens': row.completion_tokens,
+            'total_tokens': row.total_tokens,
+        }
+        for row in queryset
+    ]
+
+
+def usage_summary(user, days=7, include_global=False):
+    """Usage for the last ``days`` days plus the remaining budget for today."""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    budget = get_daily_budget()
+    used = tokens_used_today(user)
+
+    summary = {
+        'today': {
+            'used': used,
+            'budget': budget,
+            'remaining': max(budget - used, 0) if budget else None,
+            'resets_at': _next_reset(),
+        },
+        'daily': _daily_rows(LLMDailyUsage.objects.filter(user=user, day__gte=since)),
+        'by_provider': list(
+            LLMUsage.objects.filter(user=user, created_at__date__gte=since)
+            .values('provider', 'model')
+            .annotate(total_tokens=Sum('total_tokens'))
+            .order_by('-total_tokens')
+        ),
+    }
+
+    if include_global:
+        summary['global'] = _daily_rows(LLMDailyUsage.objects.filter(user__isnull=True, day__gte=since))
+
+    return summary
@@ -0,0 +1,62 @@
+"""
+CV version tree helpers.
+
+All of a user's versions are loaded in one query and linked in memory
+through ``parent_version_id``, instead of querying for the variants of each
+version separately.
+"""
+from .models import CvWriter
+
+
+def variant_summary(version):
+    return {
+        'id': version.id,
+        'title': version.title,
+        'version_name': version.version_name,
+        'version_purpose': version.version_purpose,
+        'created_at': version.created_at,
+        'is_primary': version.is_primary
+    }
+
+
+def group_variants(versions):
+    """Map each version id to its direct variants, newest first."""
+    variants_by_parent = {}
+    for version in sorted(versions, key=lambda v: v.created_at, reverse=True):
+        if version.parent_version_id is not None:
+            variants_by_parent.setdefault(version.parent_version_id, []).append(version)
+    return variants_by_parent
+
+
+def build_version_tree(user):
+    """
+    Return the user's versions as nested nodes with a ``children`` list.
+    Versions whose parent was deleted or belongs to someone else are roots.
+    """
+    versions = list(
+        CvWriter.objects.filter(user=user).order_by('-is_primary', '-created_at')
+    )
+    ids = {version.id for version in versions}
+    variants_by_parent = group_variants(versions)
+
+    nodes = {}
+    for version in versions:
+        node = variant_summary(version)
+        node['parent_version'] = version.parent_version_id
+        node['children'] = []
+        nodes[version.id] = node
+
+    # Walk down from the roots so a corrupt parent cycle cannot loop forever
+    roots = [v for v in versions if v.parent_version_id not in ids]
+    seen = {root.id for root in roots}
+    stack = list(roots)
+    while stack:
+        parent = stack.pop()
+        for child in variants_by_parent.get(parent.id, []):
+            if child.id in seen:
+                continue
+            seen.add(child.id)
+            nodes[parent.id]['children'].append(nodes[child.id])
+            stack.append(child)
+
+    return [nodes[root.id] for root in roots]
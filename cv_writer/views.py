@@ -29,6 +29,7 @@ from .models import (
     Reference,
     SocialMedia,
     CVImprovement,
+    CVRewriteJob,
 )
 from .serializers import (
     CvWriterSerializer,
@@ -42,11 +43,25 @@ from .serializers import (
     ReferenceSerializer,
     SocialMediaSerializer,
     CVImprovementSerializer,
+    CVRewriteJobSerializer,
     CVVersionSerializer
 )
 from .services import CVImprovementService
 from .local_llm import ResilientLLMService  # Updated import
+from .usage import TokenBudgetExceeded, enforce_token_budget, usage_summary
+from .jobs import REWRITE_SECTIONS, enqueue_rewrite, request_cancel
+from .snapshot import build_cv_snapshot, get_cv_snapshot
+from .document import CVDocumentError, apply_cv_document
+from .versions import build_version_tree, group_variants
+from .sections import section_rows
+from .exports import CONTENT_TYPES, export_filename, get_export
+from .conditional import ConditionalRequestMixin, conditional
+from .fast_serializers import FastReadMixin
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from django.db import IntegrityError
+from django.http import FileResponse
 from django.db.models import Q
+from django.utils import timezone
 import logging
 logger = logging.getLogger(__name__)
 
@@ -57,7 +72,7 @@ I created a BaseListCreateAPIView class that inherits from generics.ListCreateAP
 """
 
 
-class BaseListCreateAPIView(ListCreateAPIView):
+class BaseListCreateAPIView(ConditionalRequestMixin, FastReadMixin, ListCreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -68,7 +83,7 @@ class BaseListCreateAPIView(ListCreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class BaseRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
+class BaseRetrieveUpdateDestroyAPIView(ConditionalRequestMixin, FastReadMixin, RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     lookup_field = "id"
 
@@ -77,6 +92,18 @@ class BaseRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
         return self.model.objects.filter(user=user)
 
 
+class SectionListCreateAPIView(BaseListCreateAPIView):
+    """Section rows shared by every CV version that has not edited its own copy."""
+
+    def get_queryset(self):
+        return super().get_queryset().shared()
+
+
+class SectionRetrieveUpdateDestroyAPIView(BaseRetrieveUpdateDestroyAPIView):
+    def get_queryset(self):
+        return super().get_queryset().shared()
+
+
 class CvWriterListCreate(BaseListCreateAPIView):
     """Endpoints for listing and creating CVs for the authenticated user."""
     serializer_class = CvWriterSerializer
@@ -101,99 +128,99 @@ class CvWriterDetailView(BaseRetrieveUpdateDestroyAPIView):
     model = CvWriter
 
 
-class ProfessionalSummaryListCreate(BaseListCreateAPIView):
+class ProfessionalSummaryListCreate(SectionListCreateAPIView):
     serializer_class = ProfessionalSummarySerializer
     queryset = ProfessionalSummary.objects.all()
     model = ProfessionalSummary
 
-class ProfessionalSummaryDetailView(BaseRetrieveUpdateDestroyAPIView):
+class ProfessionalSummaryDetailView(SectionRetrieveUpdateDestroyAPIView):
     serializer_class = ProfessionalSummarySerializer
     model = ProfessionalSummary
 
-class InterestListCreate(BaseListCreateAPIView):
+class InterestListCreate(SectionListCreateAPIView):
     serializer_class = InterestSummarySerializer
     queryset = Interest.objects.all()
     model = Interest
 
 
-class InterestDetailView(BaseRetrieveUpdateDestroyAPIView):
+class InterestDetailView(SectionRetrieveUpdateDestroyAPIView):
     serializer_class = InterestSummarySerializer
     model = Interest
 
 
-class EducationListCreate(BaseListCreateAPIView):
+class EducationListCreate(SectionListCreateAPIView):
     serializer_class = EducationSerializer
     queryset = Education.objects.all()
     model = Education
 
 
-class EducationDetailView(BaseRetrieveUpdateDestroyAPIView):
+class EducationDetailView(SectionRetrieveUpdateDestroyAPIView):
     serializer_class = EducationSerializer
     model = Education
 
 
-class ExperienceListCreate(BaseListCreateAPIView):
+class ExperienceListCreate(SectionListCreateAPIView):
     serializer_class = ExperienceSerializer
     queryset = Experience.objects.all()
     model = Experience
 
 
-class ExperienceDetailView(BaseRetrieveUpdateDestroyAPIView):
+class ExperienceDetailView(SectionRetrieveUpdateDestroyAPIView):
     serializer_class = ExperienceSerializer
     model = Experience
 
 
-class CertificationListCreate(BaseListCreateAPIView):
+class CertificationListCreate(SectionListCreateAPIView):
     serializer_class = CertificationSerializer
     queryset = Certification.objects.all()
     model = Certification
 
 
-class CertificationDetailView(BaseRetrieveUpdateDestroyAPIView):
+class CertificationDetailView(SectionRetrieveUpdateDestroyAPIView):
     serializer_class = CertificationSerializer
     model = Certification
 
 
-class SkillListCreate(BaseListCreateAPIView):
+class SkillListCreate(SectionListCreateAPIView):
     serializer_class = SkillSerializer
     queryset = Skill.objects.all()
     model = Skill
 
 
-class SkillDetailView(BaseRetrieveUpdateDestroyAPIView):
+class SkillDetailView(SectionRetrieveUpdateDestroyAPIView):
     serializer_class = SkillSerializer
     model = Skill
 
 
-class LanguageListCreate(BaseListCreateAPIView):
+class LanguageListCreate(SectionListCreateAPIView):
     serializer_class = LanguageSerializer
     queryset = Language.objects.all()
     model = Language
 
 
-class LanguageDetailView(BaseRetrieveUpdateDestroyAPIView):
+class LanguageDetailView(SectionRetrieveUpdateDestroyAPIView):
     serializer_class = LanguageSerializer
     model = Language
 
 
-class ReferenceListCreate(BaseListCreateAPIView):
+class ReferenceListCreate(SectionListCreateAPIView):
     serializer_class = ReferenceSerializer
     queryset = Reference.objects.all()
     model = Reference
 
 
-class ReferenceDetailView(BaseRetrieveUpdateDestroyAPIView):
+class ReferenceDetailView(SectionRetrieveUpdateDestroyAPIView):
     serializer_class = ReferenceSerializer
     model = Reference
 
 
-class SocialMediaListCreate(BaseListCreateAPIView):
+class SocialMediaListCreate(SectionListCreateAPIView):
     serializer_class = SocialMediaSerializer
     queryset = SocialMedia.objects.all()
     model = SocialMedia
 
 
-class SocialMediaDetailView(BaseRetrieveUpdateDestroyAPIView):
+class SocialMediaDetailView(SectionRetrieveUpdateDestroyAPIView):
     serializer_class = SocialMediaSerializer
     model = SocialMedia
 
@@ -239,6 +266,22 @@ class CertificationRetrieveUpdateDestroyView(RetrieveUpdateDestroyAPIView):
     serializer_class = CertificationSerializer
 
 
+def token_budget_exceeded_response(error):
+    """429 response for a user who has used up today's LLM token budget."""
+    response = Response(
+        {
+            'error': 'Daily AI usage limit reached',
+            'details': 'You have used your token budget for today. Please try again after it resets.',
+            'used': error.used,
+            'budget': error.budget,
+            'resets_at': error.resets_at,
+        },
+        status=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+    response['Retry-After'] = str(max(int((error.resets_at - timezone.now()).total_seconds()), 1))
+    return response
+
+
 # Create your views here.
 def cv_list(request):
     return render(request, "cv_list.html")
@@ -283,6 +326,8 @@ def improve_cv(request, cv_id):
             {'error': 'CV not found or access denied'},
             status=status.HTTP_404_NOT_FOUND
         )
+    except TokenBudgetExceeded as e:
+        return token_budget_exceeded_response(e)
     except FileNotFoundError as e:
         return Response(
             {
@@ -331,8 +376,8 @@ def improve_section(request):
         print(f"Content: {content}")
         
         try:
-            llm_service = ResilientLLMService()  # Updated
-            result = llm_service.improve_section(section, content)
+            llm_service = ResilientLLMService(user=request.user)  # Updated
+            improved = llm_service.improve_section(section, content)
             
             # Save improvement to database if cv_id is provided
             if cv_id:
@@ -342,7 +387,8 @@ def improve_section(request):
                         cv=cv,
                         section=section,
                         original_content=content,
-                        improved_content=result['improved'],
+                        improved_content=improved,
+                        tokens_used=llm_service.last_usage['total_tokens'] if llm_service.last_usage else 0,
                         status='completed'
                     )
                 except CvWriter.DoesNotExist:
@@ -351,10 +397,12 @@ def improve_section(request):
             
             return Response({
                 'status': 'success',
-                'improved': result['improved'],
+                'improved': improved,
                 'original': content
             }, status=status.HTTP_200_OK)
             
+        except TokenBudgetExceeded as e:
+            return token_budget_exceeded_response(e)
         except Exception as e:
             print(f"Error in LLM service: {str(e)}")
             return Response(
@@ -370,6 +418,87 @@ def improve_section(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def improve_sections_batch(request):
+    """
+    Improve several CV sections or experience entries in one request.
+    Items are sent to the LLM in batches and returned keyed by item id.
+    """
+    items = request.data.get('items')
+    cv_id = request.data.get('cv_id')
+
+    if not isinstance(items, list) or not items:
+        return Response(
+            {'error': 'Please provide a non-empty list of items.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(items) > 50:
+        return Response(
+            {'error': 'A batch can contain at most 50 items.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    normalized = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('section') or not item.get('content'):
+            return Response(
+                {'error': f'Item {index} is missing section or content.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        normalized.append({
+            'id': str(item.get('id', index)),
+            'section': item['section'],
+            'content': item['content']
+        })
+
+    if len({item['id'] for item in normalized}) != len(normalized):
+        return Response(
+            {'error': 'Item ids must be unique.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    cv = None
+    if cv_id:
+        cv = CvWriter.objects.filter(id=cv_id, user=request.user).first()
+        if not cv:
+            return Response(
+                {'error': 'CV not found or access denied'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+    try:
+        llm_service = ResilientLLMService(user=request.user)
+        results = llm_service.improve_sections_batch(normalized)
+    except TokenBudgetExceeded as e:
+        return token_budget_exceeded_response(e)
+    except Exception as e:
+        logger.error(f"Error in improve_sections_batch: {str(e)}")
+        return Response(
+            {'error': f'Failed to improve sections: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    if cv:
+        CVImprovement.objects.bulk_create([
+            CVImprovement(
+                cv=cv,
+                section=item['section'],
+                original_content=item['content'],
+                improved_content=results[item['id']]['improved'],
+                improvement_type='minimal',
+                tokens_used=results[item['id']]['tokens_used'],
+                status='completed'
+            )
+            for item in normalized
+        ])
+
+    return Response({
+        'status': 'success',
+        'results': results
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def improve_summary(request):
@@ -391,7 +520,7 @@ def improve_summary(request):
                 
                 # Find the professional summary for this user
                 try:
-                    professional_summary = ProfessionalSummary.objects.get(user=request.user)
+                    professional_summary = section_rows(cv, 'professional_summary').get()
                     summary = professional_summary.summary
                 except ProfessionalSummary.DoesNotExist:
                     # If no professional summary exists, use a default
@@ -438,6 +567,8 @@ def improve_summary(request):
             'improved': improvements.get('professional_summary', summary)
         }, status=status.HTTP_200_OK)
     
+    except TokenBudgetExceeded as e:
+        return token_budget_exceeded_response(e)
     except Exception as e:
         logger.error(f"Error in improve_summary: {str(e)}")
         return Response({
@@ -450,98 +581,90 @@ def improve_summary(request):
 @permission_classes([IsAuthenticated])
 def rewrite_cv(request):
     """
-    Rewrite the entire CV to be more professional and impactful.
+    Queue a rewrite of the entire CV to be more professional and impactful.
+    The rewrite runs on the rewrite worker; poll the returned job for progress.
     """
+    cv_data = request.data.get('cv_data')
+    if not cv_data or not isinstance(cv_data, dict):
+        return Response(
+            {'error': 'No CV data provided'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not any(cv_data.get(section) for section in REWRITE_SECTIONS):
+        return Response(
+            {'error': f'CV data must include at least one of: {", ".join(REWRITE_SECTIONS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Fail fast instead of queueing work that cannot run
     try:
-        cv_data = request.data.get('cv_data')
-        if not cv_data:
-            return Response(
-                {'error': 'No CV data provided'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        print("Received CV data for rewriting")
-        
-        try:
-            llm_service = ResilientLLMService()  # Updated
-            print("LLM service initialized successfully")
-        except Exception as e:
-            print(f"Failed to initialize LLM service: {str(e)}")
-            return Response(
-                {'error': f'Failed to initialize LLM service: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-        
-        try:
-            print("Starting CV rewrite...")
-            import threading
-            import queue
-            
-            def rewrite_in_thread(q):
-                try:
-                    result = llm_service.rewrite_cv(cv_data)
-                    q.put(('success', result))
-                except Exception as e:
-                    q.put(('error', str(e)))
-            
-            # Create a queue for the result
-            result_queue = queue.Queue()
-            
-            # Start the rewrite in a separate thread
-            rewrite_thread = threading.Thread(
-                target=rewrite_in_thread, 
-                args=(result_queue,)
-            )
-            rewrite_thread.daemon = True
-            rewrite_thread.start()
-            
-            # Wait for the result with timeout
-            try:
-                status_type, result = result_queue.get(timeout=180)  # 3-minute timeout
-                
-                if status_type == 'error':
-                    raise Exception(result)
-                
-                print("CV rewrite completed successfully")
-                
-                # Save the rewritten CV to the database
-                cv = CvWriter.objects.create(
-                    user=request.user,
-                    title=cv_data.get('title', 'Rewritten CV'),
-                    content=result['rewritten'],
-                    original_content=result['original'],
-                    status='completed'
-                )
-                
-                return Response({
-                    'status': 'success',
-                    'cv_id': cv.id,
-                    'original': result['original'],
-                    'rewritten': result['rewritten'],
-                    'message': 'CV has been rewritten and saved'
-                }, status=status.HTTP_200_OK)
-                
-            except queue.Empty:
-                print("Operation timed out")
-                return Response(
-                    {'error': 'The operation took too long to complete. Please try again.'},
-                    status=status.HTTP_504_GATEWAY_TIMEOUT
-                )
-            
-        except Exception as e:
-            print(f"Error during CV rewrite: {str(e)}")
-            return Response(
-                {'error': f'Failed to rewrite CV: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-            
-    except Exception as e:
-        print(f"Unexpected error in rewrite_cv view: {str(e)}")
+        enforce_token_budget(request.user)
+    except TokenBudgetExceeded as e:
+        return token_budget_exceeded_response(e)
+
+    job = enqueue_rewrite(request.user, cv_data)
+    logger.info(f"Queued rewrite job {job.id} for user {request.user.username}")
+
+    return Response(
+        CVRewriteJobSerializer(job).data,
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_rewrite_job(request, job_id):
+    """
+    Get the status, per-section progress and result of a rewrite job.
+    """
+    job = CVRewriteJob.objects.filter(id=job_id, user=request.user).first()
+    if not job:
+        return Response({'error': 'Rewrite job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response(CVRewriteJobSerializer(job).data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cancel_rewrite_job(request, job_id):
+    """
+    Cancel a rewrite job. A running job stops before its next provider call.
+    """
+    job = CVRewriteJob.objects.filter(id=job_id, user=request.user).first()
+    if not job:
+        return Response({'error': 'Rewrite job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if job.is_finished:
         return Response(
-            {'error': f'Unexpected error: {str(e)}'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            {'error': f'Rewrite job is already {job.status}'},
+            status=status.HTTP_409_CONFLICT
         )
 
+    request_cancel(job)
+    job.refresh_from_db()
+    return Response(CVRewriteJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_llm_usage(request):
+    """
+    Get LLM token usage for the current user, with the global totals for staff.
+    """
+    try:
+        days = min(max(int(request.query_params.get('days', 7)), 1), 90)
+    except ValueError:
+        return Response(
+            {'error': 'days must be an integer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response({
+        'status': 'success',
+        'usage': usage_summary(request.user, days=days, include_global=request.user.is_staff)
+    }, status=status.HTTP_200_OK)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -576,82 +699,89 @@ def get_cv_improvements(request, cv_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional
 def get_cv(request, cv_id):
     """
     Get a CV by ID with all its related data.
     """
     try:
-        # Get CV and check ownership
-        cv = CvWriter.objects.get(id=cv_id, user=request.user)
-        
-        # Get all related data
-        professional_summary = ProfessionalSummary.objects.filter(user=request.user).first()
-        experiences = Experience.objects.filter(user=request.user).order_by('-start_date')
-        education = Education.objects.filter(user=request.user).order_by('-start_date')
-        
-        # Get and log skills data
-        raw_skills = Skill.objects.filter(user=request.user)
-        print("\nSkills Debug:")
-        print("1. Raw skills from DB:")
-        for skill in raw_skills:
-            print(f"  - {skill.skill_name} ({skill.skill_level})")
-        
-        skills = raw_skills.exclude(
-            Q(skill_name__isnull=True) | Q(skill_name='') |
-            Q(skill_level__isnull=True) | Q(skill_level='')
+        return Response(get_cv_snapshot(request.user, cv_id, version=getattr(request, 'snapshot_version', None)))
+    except CvWriter.DoesNotExist:
+        return Response({'error': 'CV not found'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional
+def export_cv(request, cv_id, export_format):
+    """
+    Download a CV as HTML, PDF or DOCX. Files are rendered once per distinct
+    CV content and streamed from the export cache afterwards.
+    """
+    if export_format not in CONTENT_TYPES:
+        return Response(
+            {'error': f'Unsupported export format. Use one of: {", ".join(CONTENT_TYPES)}'},
+            status=status.HTTP_400_BAD_REQUEST
         )
-        print("\n2. Filtered skills:")
-        for skill in skills:
-            print(f"  - {skill.skill_name} ({skill.skill_level})")
-        
-        serialized_skills = SkillSerializer(skills, many=True).data
-        print("\n3. Serialized skills:")
-        for skill in serialized_skills:
-            print(f"  - {skill}")
-        
-        languages = Language.objects.filter(user=request.user)
-        certifications = Certification.objects.filter(user=request.user)
-        interests = Interest.objects.filter(user=request.user)
-        social_media = SocialMedia.objects.filter(user=request.user)
-        references = Reference.objects.filter(user=request.user)
-
-        # Serialize CV data
-        cv_data = CvWriterSerializer(cv).data
-        
-        # Add all related data
-        response_data = {
-            'professional_summary': ProfessionalSummarySerializer(professional_summary).data.get('summary') if professional_summary else None,
-            'experiences': ExperienceSerializer(experiences, many=True).data,
-            'education': EducationSerializer(education, many=True).data,
-            'skills': serialized_skills,
-            'languages': LanguageSerializer(languages, many=True).data,
-            'certifications': CertificationSerializer(certifications, many=True).data,
-            'interests': InterestSummarySerializer(interests, many=True).data,
-            'social_media': SocialMediaSerializer(social_media, many=True).data,
-            'references': ReferenceSerializer(references, many=True).data,
-        }
-        cv_data.update(response_data)
-        
-        print("\n4. Final response skills data:")
-        print(f"  - {cv_data.get('skills')}")
-        
-        return Response(cv_data)
+
+    try:
+        snapshot = get_cv_snapshot(request.user, cv_id, version=getattr(request, 'snapshot_version', None))
+        path = get_export(snapshot, export_format)
+    except CvWriter.DoesNotExist:
+        return Response({'error': 'CV not found'}, status=status.HTTP_404_NOT_FOUND)
+    except FutureTimeoutError:
+        return Response(
+            {'error': 'The export took too long to render. Please try again.'},
+            status=status.HTTP_504_GATEWAY_TIMEOUT
+        )
+    except Exception as e:
+        logger.error(f"Error exporting CV {cv_id} as {export_format}: {str(e)}", exc_info=True)
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=export_format != 'html',
+        filename=export_filename(snapshot, export_format),
+        content_type=CONTENT_TYPES[export_format],
+    )
+
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+@conditional
+def save_cv_document(request, cv_id):
+    """
+    Save a whole CV in one request. Accepts the document get_cv returns; items
+    with an id are updated, items without one are created and rows missing
+    from a submitted section are deleted. Returns the saved CV.
+    """
+    try:
+        cv = CvWriter.objects.select_related('user').get(id=cv_id, user=request.user)
+        apply_cv_document(cv, request.data)
+        # Built rather than read through the cache: the version is only
+        # bumped once the write commits, which may be after this response
+        return Response(build_cv_snapshot(cv))
     except CvWriter.DoesNotExist:
         return Response({'error': 'CV not found'}, status=status.HTTP_404_NOT_FOUND)
+    except CVDocumentError as e:
+        return Response({'error': str(e), 'details': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+    except IntegrityError as e:
+        return Response({'error': f'Conflicting CV data: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
+        logger.error(f"Error saving CV document: {str(e)}", exc_info=True)
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class CVVersionListCreateView(generics.ListCreateAPIView):
+class CVVersionListCreateView(ConditionalRequestMixin, generics.ListCreateAPIView):
     serializer_class = CVVersionSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         try:
             # Return all CV versions for the current user, sorted by primary first
-            queryset = CvWriter.objects.filter(user=self.request.user).order_by('-is_primary', '-created_at')
-            logger.info(f"Fetching CV versions for user {self.request.user.username}. Count: {queryset.count()}")
-            return queryset
+            return CvWriter.objects.filter(user=self.request.user).order_by('-is_primary', '-created_at')
         except Exception as e:
             logger.error(f"Error in get_queryset: {str(e)}", exc_info=True)
             raise
@@ -680,7 +810,13 @@ class CVVersionListCreateView(generics.ListCreateAPIView):
 
     def list(self, request, *args, **kwargs):
         try:
-            return super().list(request, *args, **kwargs)
+            versions = list(self.filter_queryset(self.get_queryset()))
+            logger.info(f"Fetching CV versions for user {request.user.username}. Count: {len(versions)}")
+
+            context = self.get_serializer_context()
+            context['variants_by_parent'] = group_variants(versions)
+            serializer = self.get_serializer(versions, many=True, context=context)
+            return Response(serializer.data)
         except Exception as e:
             logger.error(f"Error in list method: {str(e)}", exc_info=True)
             return Response(
@@ -688,7 +824,23 @@ class CVVersionListCreateView(generics.ListCreateAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class CVVersionDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CVVersionTreeView(ConditionalRequestMixin, APIView):
+    """
+    All CV versions of the user as a tree built from parent_version links.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            return Response(build_version_tree(request.user))
+        except Exception as e:
+            logger.error(f"Error building version tree: {str(e)}", exc_info=True)
+            return Response(
+                {'detail': f'An unexpected error occurred: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class CVVersionDetailView(ConditionalRequestMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CVVersionSerializer
     permission_classes = [IsAuthenticated]
 
@@ -696,7 +848,7 @@ class CVVersionDetailView(generics.RetrieveUpdateDestroyAPIView):
         # Only return CV versions for the current user
         return CvWriter.objects.filter(user=self.request.user).order_by('-is_primary', '-created_at')
 
-class SetPrimaryVersionView(APIView):
+class SetPrimaryVersionView(ConditionalRequestMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, pk):
@@ -722,7 +874,7 @@ class SetPrimaryVersionView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class CloneCVVersionView(APIView):
+class CloneCVVersionView(ConditionalRequestMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
@@ -739,7 +891,7 @@ class CloneCVVersionView(APIView):
         except CvWriter.DoesNotExist:
             return Response({'error': 'Version not found'}, status=status.HTTP_404_NOT_FOUND)
 
-class EditCVVersionView(generics.UpdateAPIView):
+class EditCVVersionView(ConditionalRequestMixin, generics.UpdateAPIView):
     """
     View to edit details of a specific CV version.
     Allows updating version name, purpose, and visibility.
@@ -15,6 +15,7 @@ from datetime import timedelta
 from django.conf.global_settings import CSRF_COOKIE_SECURE, SECURE_SSL_REDIRECT, SESSION_COOKIE_SECURE
 from dotenv import load_dotenv
 import os
+import tempfile
 import dj_database_url
 import base64
 
@@ -402,6 +403,62 @@ LLM_PROVIDERS = {
 # Get current environment configuration
 CURRENT_LLM_CONFIG = LLM_PROVIDERS.get(ENVIRONMENT, LLM_PROVIDERS['development'])
 
+# Per-user daily LLM token budget (0 disables the limit)
+LLM_DAILY_TOKEN_BUDGET = int(os.getenv("LLM_DAILY_TOKEN_BUDGET", 100000))
+
+# Memory budget for saved llama.cpp prompt-prefix states. Each state holds the
+# KV cache plus the (n_ctx x n_vocab) logits buffer, roughly 600MB for a 7B model
+LLM_PREFIX_CACHE_BYTES = int(os.getenv("LLM_PREFIX_CACHE_BYTES", 2 * 1024 ** 3))
+
+# Rendered CV exports (HTML/PDF/DOCX), cached on disk under a hash of the CV
+# content and template version
+CV_EXPORT_CACHE_DIR = os.getenv("CV_EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ella_cv_exports"))
+CV_EXPORT_WORKERS = int(os.getenv("CV_EXPORT_WORKERS", 2))
+CV_EXPORT_TIMEOUT = int(os.getenv("CV_EXPORT_TIMEOUT", 60))
+# Exports not downloaded for this long are deleted, then the least recently
+# downloaded until the directory fits in CV_EXPORT_MAX_BYTES
+CV_EXPORT_MAX_AGE_DAYS = int(os.getenv("CV_EXPORT_MAX_AGE_DAYS", 7))
+CV_EXPORT_MAX_BYTES = int(os.getenv("CV_EXPORT_MAX_BYTES", 512 * 1024 ** 2))
+
+# How often each process pulls newly saved opportunities into its in-memory
+# job matching matrix
+JOB_MATCHING_SYNC_SECONDS = int(os.getenv("JOB_MATCHING_SYNC_SECONDS", 30))
+
+# Upper bound on how long a user's cached recommendations are served; CV
+# edits and opportunity saves, from any process, invalidate them sooner
+JOB_RECOMMENDATION_CACHE_SECONDS = int(os.getenv("JOB_RECOMMENDATION_CACHE_SECONDS", 60 * 60))
+
+# Upper bound on how long opportunity facet counts are cached; any saved or
+# deleted opportunity invalidates them sooner
+JOB_FACETS_CACHE_SECONDS = int(os.getenv("JOB_FACETS_CACHE_SECONDS", 60 * 10))
+
+# Opportunities posted longer ago than this, or past their end date, are
+# moved to the archive table by the archive_opportunities command
+JOB_ARCHIVE_AFTER_DAYS = int(os.getenv("JOB_ARCHIVE_AFTER_DAYS", 60))
+
+# Reed job search API, see jobstract/reed.py. Every request of a run draws
+# from one token bucket of this rate and burst
+REED_API_URL = os.getenv("REED_API_URL", "https://www.reed.co.uk/api/1.0/search")
+REED_REQUESTS_PER_SECOND = float(os.getenv("REED_REQUESTS_PER_SECOND", 2))
+REED_BURST = int(os.getenv("REED_BURST", 5))
+REED_CONCURRENCY = int(os.getenv("REED_CONCURRENCY", 8))
+
+# DWP Find a Job, see the dwp_scraper command. Detail pages are fetched this
+# many at a time, with request starts spaced to this rate
+DWP_SEARCH_URL = os.getenv("DWP_SEARCH_URL", "https://findajob.dwp.gov.uk/search")
+DWP_REQUESTS_PER_SECOND = float(os.getenv("DWP_REQUESTS_PER_SECOND", 4))
+DWP_CONCURRENCY = int(os.getenv("DWP_CONCURRENCY", 4))
+
+# Semantic job matching (needs sentence-transformers). The embedding
+# directory must be shared by the scrapers and the web processes
+JOB_EMBEDDINGS_ENABLED = os.getenv("JOB_EMBEDDINGS_ENABLED", "True") == "True"
+JOB_EMBEDDING_MODEL = os.getenv("JOB_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+JOB_EMBEDDING_DIR = os.getenv("JOB_EMBEDDING_DIR", os.path.join(tempfile.gettempdir(), "ella_job_embeddings"))
+JOB_EMBEDDING_PROBES = int(os.getenv("JOB_EMBEDDING_PROBES", 8))
+# Share of the recommendation score taken by semantic similarity, the rest
+# being keyword (BM25) relevance
+JOB_EMBEDDING_WEIGHT = float(os.getenv("JOB_EMBEDDING_WEIGHT", 0.5))
+
 # LinkedIn OAuth Configuration
 LINKEDIN_CONFIG = {
     "CLIENT_ID": os.getenv("LINKEDIN_CLIENT_ID", ""),
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Opportunity, Employer
+from .models import ArchivedOpportunity, Opportunity, Employer
+from .search import search_opportunities
 
 # Register your models here.
 
@@ -12,8 +13,8 @@ class EmployerAdmin(admin.ModelAdmin):
 @admin.register(Opportunity)
 class OpportunityAdmin(admin.ModelAdmin):
     list_display = ('title', 'employer', 'location', 'mode', 'opportunity_type', 'time_commitment', 'experience_level', 'date_posted')
-    list_filter = ('opportunity_type', 'mode', 'time_commitment', 'experience_level', 'employer__is_nonprofit')
-    search_fields = ('title', 'description', 'location', 'employer__employer_name', 'skills_required')
+    list_filter = ('opportunity_type', 'mode', 'time_commitment', 'experience_level', 'employer__is_nonprofit', 'archived')
+    search_fields = ('location', 'employer__employer_name')
     date_hierarchy = 'date_posted'
     raw_id_fields = ('employer',)
     readonly_fields = ('date_posted',)
@@ -34,3 +35,27 @@ class OpportunityAdmin(admin.ModelAdmin):
             'fields': ('source', 'application_url')
         }),
     )
+
+    def get_search_results(self, request, queryset, search_term):
+        # Title, skills and description go through the full-text index
+        # rather than icontains scans
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            matches = search_opportunities(queryset, search_term).values('pk')
+            results |= queryset.filter(pk__in=matches)
+        return results, may_have_duplicates
+
+
+@admin.register(ArchivedOpportunity)
+class ArchivedOpportunityAdmin(admin.ModelAdmin):
+    # Written only by archive_opportunities
+    list_display = ('title', 'employer', 'location', 'opportunity_type', 'date_posted', 'end_date', 'archived_at')
+    list_filter = ('opportunity_type', 'mode')
+    search_fields = ('title', 'location', 'employer__employer_name')
+    date_hierarchy = 'date_posted'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
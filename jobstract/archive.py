@@ -0,0 +1,87 @@
+"""
+Moving expired opportunities out of the hot table.
+
+Opportunities past their end date, or posted more than
+``JOB_ARCHIVE_AFTER_DAYS`` ago, are copied into ``ArchivedOpportunity``
+under the same id and deleted from ``Opportunity``, ``BATCH_SIZE`` at a
+time with each batch in its own transaction. Their skill terms, LSH bands
+and search index rows go with them, and the matching engine and embedding
+store drop them on their next sync, so listing, search and matching only
+ever see the (much smaller) live set.
+
+Live duplicates of an archived listing are checked again once it has gone:
+the oldest becomes the listing and the rest link to it (see ``dedupe.py``).
+
+``JobApplication`` rows point at ``Opportunity`` and cascade with it, so an
+expired opportunity somebody applied to stays where it is and is only
+flagged ``archived``, which hides it like a near-duplicate (see
+``views.BROWSE_ACTIONS`` and ``matching.py``). It is moved once its last
+application is gone.
+
+A separate table rather than a database partition keeps this working on
+SQLite and needs no partition maintenance; the archive is read through the
+admin only.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .dedupe import deduplicate_opportunities
+from .matching import get_engine
+from .models import ArchivedOpportunity, JobApplication, Opportunity
+
+BATCH_SIZE = 500
+
+# Columns copied into the archive, every one it has but archived_at
+ARCHIVED_FIELDS = [
+    field.attname for field in ArchivedOpportunity._meta.concrete_fields if field.name != 'archived_at'
+]
+
+
+def expired(today=None, days=None):
+    """The condition that makes an opportunity due for the archive."""
+    today = today or timezone.localdate()
+    days = settings.JOB_ARCHIVE_AFTER_DAYS if days is None else days
+    return Q(end_date__lt=today) | Q(date_posted__lt=today - timedelta(days=days))
+
+
+def archive_opportunities(days=None, batch_size=BATCH_SIZE):
+    """
+    Move expired opportunities into the archive and flag those kept back by
+    applications.
+
+    :return: (number moved, number flagged)
+    """
+    due = Opportunity.objects.filter(expired(days=days))
+    movable = due.filter(~Exists(JobApplication.objects.filter(opportunity=OuterRef('pk')))).order_by('pk')
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(movable.values(*ARCHIVED_FIELDS)[:batch_size])
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            ArchivedOpportunity.objects.bulk_create([ArchivedOpportunity(**row) for row in rows])
+            orphans = Opportunity.objects.filter(canonical__in=ids).exclude(pk__in=ids)
+            orphan_ids = list(orphans.values_list('pk', flat=True))
+            # updated_at moves so the matching engine picks them up
+            orphans.update(canonical=None, updated_at=timezone.now())
+            # Signals unindex each row
+            Opportunity.objects.filter(pk__in=ids).delete()
+            # Duplicates of an archived listing are duplicates of each other:
+            # the oldest is promoted and the rest link to it
+            deduplicate_opportunities(orphan_ids)
+        moved += len(ids)
+
+    now = timezone.now()
+    flagged = due.filter(archived=False).update(archived=True, updated_at=now)
+    # An end date pushed back brings an opportunity back to life
+    revived = Opportunity.objects.filter(archived=True).exclude(expired(days=days)).update(
+        archived=False, updated_at=now
+    )
+    if flagged or revived:
+        get_engine().invalidate()
+    return moved, flagged
@@ -0,0 +1,218 @@
+"""
+Cross-source near-duplicate detection.
+
+Reed and DWP often list the same vacancy under different URLs, with the
+description cut short or lightly reworded. Each opportunity is therefore
+reduced to a set of word shingles of its normalized title, employer,
+location and the start of its description, and that set to a MinHash
+signature of ``NUM_PERMUTATIONS`` values, the share of which two signatures
+agree on estimates the Jaccard similarity of the sets.
+
+The signature is cut into ``BANDS`` bands of ``ROWS_PER_BAND`` values and
+each band hashed into an ``OpportunityBand`` row. Opportunities sharing a
+band key are the only candidates compared, so finding the duplicates of a
+listing is one indexed lookup rather than a scan: pairs with a similarity
+of 0.6 share a band with a probability of about 0.9, pairs below 0.3 rarely
+do. Candidates then have to clear ``DUPLICATE_THRESHOLD`` on the full
+signature and share most of their title words.
+
+A duplicate links to its ``canonical`` opportunity, the oldest listing of
+the vacancy, and is left out of listings, search, facets and matching.
+Saves re-check the saved opportunity (see ``signals.py``), bulk writers
+call ``deduplicate_opportunities`` with the ids they wrote and the
+``dedupe_opportunities`` command rebuilds everything.
+"""
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Opportunity, OpportunityBand
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_WORDS = 3
+# Reed's search results carry a truncated description, so only its start is compared
+DESCRIPTION_WORDS = 150
+DUPLICATE_THRESHOLD = 0.5
+TITLE_THRESHOLD = 0.5
+BATCH_SIZE = 500
+
+# Fields a change to which needs the row re-checked
+DEDUPE_FIELDS = {'title', 'description', 'location', 'employer', 'employer_id'}
+
+EMPLOYER_SUFFIXES = {'ltd', 'limited', 'plc', 'llp', 'inc', 'uk', 'the', 'group'}
+
+# (a * x + b) mod p, one universal hash per permutation, with a fixed seed so
+# signatures agree between processes and runs
+# The smallest prime above 2**32, the range of the crc32 feature hashes
+PRIME = np.uint64(4294967311)
+_random = np.random.RandomState(1)
+PERMUTATION_A = _random.randint(1, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+PERMUTATION_B = _random.randint(0, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize_words(text):
+    text = re.sub(r'<[^>]+>', ' ', text or '')
+    return re.sub(r'[^a-z0-9]+', ' ', text.lower()).split()
+
+
+def employer_words(name):
+    return [word for word in normalize_words(name) if word not in EMPLOYER_SUFFIXES]
+
+
+def shingles(title, employer_name, location, description):
+    """The word shingles that describe one listing."""
+    words = (
+        normalize_words(title) + employer_words(employer_name) + normalize_words(location)
+        + normalize_words(description)[:DESCRIPTION_WORDS]
+    )
+    if len(words) < SHINGLE_WORDS:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash(features):
+    """The MinHash signature of a set of strings, or None for an empty set."""
+    if not features:
+        return None
+    hashes = np.fromiter((zlib.crc32(feature.encode()) for feature in features), dtype=np.uint64)
+    # a, b and the hashes are all below 2**32, so a * x + b stays within 64 bits
+    permuted = (PERMUTATION_A[:, None] * hashes[None, :] + PERMUTATION_B[:, None]) % PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def band_keys(signature):
+    """One signed 64-bit key per band of ``signature``."""
+    keys = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(bytes([band]) + chunk.tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return float(np.mean(signature == other))
+
+
+def title_similarity(title, other):
+    words, other_words = set(normalize_words(title)), set(normalize_words(other))
+    if not words or not other_words:
+        return 0.0
+    return len(words & other_words) / len(words | other_words)
+
+
+def _signature(values):
+    return minhash(shingles(
+        values['title'], values['employer__employer_name'], values['location'], values['description']
+    ))
+
+
+def _find_canonical(values, signature, keys, candidates, canonical_of):
+    """
+    The id of the oldest listing ``values`` duplicates, or None.
+
+    :param candidates: band key -> ids of the opportunities that have it
+    :param canonical_of: id -> (title, signature, canonical id) of those opportunities
+    """
+    roots = set()
+    for pk in set().union(*(candidates.get(key, ()) for key in keys)) - {values['id']}:
+        title, other, canonical = canonical_of[pk]
+        if other is not None and similarity(signature, other) >= DUPLICATE_THRESHOLD \
+                and title_similarity(values['title'], title) >= TITLE_THRESHOLD:
+            roots.add(canonical or pk)
+    # The oldest listing stays canonical; a newer match links to this one instead
+    roots = {root for root in roots if root < values['id']}
+    return min(roots) if roots else None
+
+
+def _candidates(keys):
+    """Band key -> opportunity ids, and the candidates' titles, signatures and canonical ids."""
+    candidates = {}
+    keys = list(keys)
+    for start in range(0, len(keys), BATCH_SIZE):
+        for key, pk in OpportunityBand.objects.filter(band_key__in=keys[start:start + BATCH_SIZE]).values_list(
+            'band_key', 'opportunity_id'
+        ):
+            candidates.setdefault(key, set()).add(pk)
+    ids = list(set().union(*candidates.values())) if candidates else []
+    canonical_of = {}
+    for start in range(0, len(ids), BATCH_SIZE):
+        for pk, title, signature, canonical in Opportunity.objects.filter(
+            pk__in=ids[start:start + BATCH_SIZE]
+        ).values_list('id', 'title', 'minhash', 'canonical_id'):
+            signature = np.frombuffer(bytes(signature), dtype=np.uint32) if signature is not None else None
+            canonical_of[pk] = (title, signature, canonical)
+    return candidates, canonical_of
+
+
+def deduplicate_opportunities(ids):
+    """
+    Re-sign the opportunities with primary keys ``ids`` and link each to the
+    listing it duplicates, or unlink it if it no longer duplicates any.
+
+    Each batch costs a fixed number of queries: its bands are replaced in
+    bulk, the candidates of all its rows are fetched at once and the new
+    signatures and links written with two ``bulk_update`` calls.
+
+    :return: the number of opportunities now marked as duplicates
+    """
+    duplicates = 0
+    ids = sorted(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        rows = list(Opportunity.objects.filter(pk__in=ids[start:start + BATCH_SIZE]).order_by('pk').values(
+            'id', 'title', 'description', 'location', 'employer__employer_name', 'canonical_id'
+        ))
+        signatures = {values['id']: _signature(values) for values in rows}
+        keys = {
+            pk: band_keys(signature) if signature is not None else []
+            for pk, signature in signatures.items()
+        }
+        with transaction.atomic():
+            OpportunityBand.objects.filter(opportunity_id__in=signatures).delete()
+            # BANDS rows per opportunity; executemany skips building model instances
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT INTO {OpportunityBand._meta.db_table} (opportunity_id, band_key) VALUES (%s, %s)',
+                    [(pk, key) for pk, row_keys in keys.items() for key in row_keys],
+                )
+            candidates, canonical_of = _candidates(set().union(*keys.values()))
+            signed, relinked = [], []
+            now = timezone.now()
+            for values in rows:
+                pk, signature = values['id'], signatures[values['id']]
+                canonical = _find_canonical(values, signature, keys[pk], candidates, canonical_of) \
+                    if keys[pk] else None
+                if pk in canonical_of:
+                    # Later rows of the batch see this row's new link
+                    canonical_of[pk] = (values['title'], signature, canonical)
+                opportunity = Opportunity(
+                    pk=pk, minhash=signature.tobytes() if signature is not None else None,
+                    canonical_id=canonical, updated_at=now,
+                )
+                signed.append(opportunity)
+                if canonical != values['canonical_id']:
+                    # updated_at moves so the matching engine drops or restores the row
+                    relinked.append(opportunity)
+                duplicates += canonical is not None
+            Opportunity.objects.bulk_update(signed, ['minhash'])
+            Opportunity.objects.bulk_update(relinked, ['canonical', 'updated_at'])
+    return duplicates
+
+
+def rebuild_duplicates():
+    """
+    Re-check every opportunity, oldest first so each vacancy keeps its
+    first listing as the canonical one.
+
+    :return: the number of duplicates found
+    """
+    Opportunity.objects.exclude(canonical=None).update(canonical=None, updated_at=timezone.now())
+    OpportunityBand.objects.all().delete()
+    return deduplicate_opportunities(Opportunity.objects.values_list('pk', flat=True))
@@ -0,0 +1,400 @@
+"""
+Semantic job matching.
+
+Opportunities (title, skills and description) and users' CVs are embedded
+with a small sentence-embedding model, so "bookkeeping" can match "accounts
+payable" without sharing a word. Vectors are unit length and stored as
+float16 in a memory-mapped file under ``JOB_EMBEDDING_DIR``, next to the
+opportunity id of each row and the inverted list it belongs to.
+
+Search uses an IVF index: k-means centroids split the rows into lists, and
+a query only scores the rows of the ``JOB_EMBEDDING_PROBES`` lists whose
+centroids are closest to it. Rows added since the centroids were trained
+are assigned to their nearest list as they are written, and the centroids
+are retrained once the store has doubled. Small stores are searched in
+full.
+
+Writes (``sync_embeddings``, run after each ingest and by the
+``embed_opportunities`` command) happen under a file lock and publish the
+new row count in ``meta.json`` last, so readers in other processes never
+see a half-written row. Readers reopen the files when ``meta.json``
+changes.
+
+sentence-transformers is optional: without it ``embeddings_available``
+is False and recommendations use keyword matching alone.
+"""
+import fcntl
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from cv_writer.snapshot import get_snapshot_version
+from .models import Opportunity
+
+logger = logging.getLogger(__name__)
+
+VECTOR_DTYPE = np.float16
+# Below this many rows a full scan is as fast as the index and exact
+MIN_INDEXED_ROWS = 4096
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 20000
+ENCODE_BATCH_SIZE = 64
+DESCRIPTION_CHARS = 2000
+
+PROFILE_VECTOR_TIMEOUT = 60 * 60 * 24
+
+
+class EmbeddingsUnavailable(Exception):
+    pass
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def embeddings_available():
+    return settings.JOB_EMBEDDINGS_ENABLED and importlib.util.find_spec('sentence_transformers') is not None
+
+
+def get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            if not embeddings_available():
+                raise EmbeddingsUnavailable('sentence-transformers is not installed or embeddings are disabled')
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer(settings.JOB_EMBEDDING_MODEL, device='cpu')
+        return _model
+
+
+def encode(texts):
+    """Unit-length float32 embeddings of ``texts``."""
+    return get_model().encode(
+        list(texts), batch_size=ENCODE_BATCH_SIZE, normalize_embeddings=True,
+        convert_to_numpy=True, show_progress_bar=False,
+    ).astype(np.float32)
+
+
+def opportunity_text(values):
+    return '\n'.join(filter(None, (
+        values['title'], values['skills_required'], (values['description'] or '')[:DESCRIPTION_CHARS],
+    )))
+
+
+def profile_text(user):
+    """The parts of a user's primary CV that describe what they can do."""
+    from cv_writer.sections import primary_cv, section_buckets, section_rows
+
+    cv = primary_cv(user)
+    if cv is None:
+        return ''
+    buckets = section_buckets(cv)
+    parts = list(section_rows(cv, 'professional_summary', buckets).values_list('summary', flat=True)[:1])
+    parts.append(', '.join(
+        name for name in section_rows(cv, 'skills', buckets).values_list('skill_name', flat=True) if name
+    ))
+    experiences = section_rows(cv, 'experiences', buckets).values_list('job_title', 'job_description')
+    for title, description in experiences:
+        parts.append(f'{title}: {description}')
+    return '\n'.join(filter(None, parts))[:DESCRIPTION_CHARS * 2]
+
+
+class VectorStore:
+    """
+    Memory-mapped float16 vectors with an IVF index.
+
+    :param path: directory of the store's files
+    :param dim: vector size; only needed to create a new store
+    """
+
+    def __init__(self, path, dim=None):
+        self.path = path
+        self.dim = dim
+        self.meta_mtime = None
+        self.meta = None
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    # Reading
+
+    def _load(self):
+        try:
+            mtime = os.stat(self._file('meta.json')).st_mtime_ns
+        except FileNotFoundError:
+            self.meta = {'count': 0, 'capacity': 0, 'dim': self.dim, 'watermark': None, 'trained_count': 0}
+            self.vectors = self.ids = self.lists = None
+            self.centroids = None
+            self.row_of = {}
+            self.order = self.bounds = None
+            return
+        if mtime == self.meta_mtime:
+            return
+        with open(self._file('meta.json')) as meta_file:
+            self.meta = json.load(meta_file)
+        self.meta_mtime = mtime
+        self.dim = self.meta['dim']
+        capacity = self.meta['capacity']
+        self.vectors = np.memmap(self._file('vectors.f16'), dtype=VECTOR_DTYPE, mode='r', shape=(capacity, self.dim))
+        self.ids = np.memmap(self._file('ids.i8'), dtype=np.int64, mode='r', shape=(capacity,))
+        self.lists = np.memmap(self._file('lists.i4'), dtype=np.int32, mode='r', shape=(capacity,))
+        self.centroids = np.load(self._file('centroids.npy')) if self.meta['trained_count'] else None
+
+        count = self.meta['count']
+        ids = np.asarray(self.ids[:count])
+        self.row_of = {int(pk): row for row, pk in enumerate(ids) if pk >= 0}
+        # Rows grouped by list; list -1 holds rows written before any training
+        lists = np.asarray(self.lists[:count])
+        self.order = np.argsort(lists, kind='stable')
+        self.bounds = np.searchsorted(lists[self.order], np.arange(-1, self.list_count + 1))
+
+    def refresh(self):
+        """Pick up rows written by other processes."""
+        self._load()
+
+    @property
+    def count(self):
+        return self.meta['count']
+
+    @property
+    def list_count(self):
+        return 0 if self.centroids is None else len(self.centroids)
+
+    def search(self, query, k, probes=None):
+        """
+        The ``k`` rows closest to the unit vector ``query``.
+
+        :return: (opportunity id, cosine similarity) pairs, best first
+        """
+        count = self.count
+        if not count:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        if self.centroids is None:
+            rows = np.arange(count)
+        else:
+            probes = min(probes or settings.JOB_EMBEDDING_PROBES, self.list_count)
+            nearest = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+            # +1 because bounds start at list -1, which is always searched
+            chunks = [self.order[self.bounds[0]:self.bounds[1]]]
+            chunks += [self.order[self.bounds[cell + 1]:self.bounds[cell + 2]] for cell in nearest]
+            # Sorted so the memmap is read front to back
+            rows = np.sort(np.concatenate(chunks))
+        rows = rows[self.ids[rows] >= 0]
+        if not len(rows):
+            return []
+        scores = self.vectors[rows].astype(np.float32) @ query
+        if len(rows) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[best], scores[best]
+        order = np.argsort(-scores)
+        return [(int(self.ids[rows[i]]), float(scores[i])) for i in order]
+
+    # Writing
+
+    def _lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        lock_file = open(self._file('lock'), 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _open_for_write(self, needed):
+        capacity = self.meta['capacity']
+        if needed > capacity:
+            capacity = max(1024, needed, 2 * capacity)
+            for name, itemsize, fill in (
+                ('vectors.f16', self.dim * 2, None), ('ids.i8', 8, -1), ('lists.i4', 4, -1),
+            ):
+                with open(self._file(name), 'ab') as data_file:
+                    old_size = data_file.tell()
+                    data_file.truncate(capacity * itemsize)
+                if fill is not None:
+                    # Mark the new slots as empty rather than id 0 / list 0
+                    grown = np.memmap(self._file(name), dtype=np.int64 if itemsize == 8 else np.int32, mode='r+')
+                    grown[old_size // itemsize:] = fill
+                    grown.flush()
+            self.meta['capacity'] = capacity
+        return (
+            np.memmap(self._file('vectors.f16'), dtype=VECTOR_DTYPE, mode='r+', shape=(capacity, self.dim)),
+            np.memmap(self._file('ids.i8'), dtype=np.int64, mode='r+', shape=(capacity,)),
+            np.memmap(self._file('lists.i4'), dtype=np.int32, mode='r+', shape=(capacity,)),
+        )
+
+    def _publish(self):
+        tmp_path = self._file('meta.json.tmp')
+        with open(tmp_path, 'w') as meta_file:
+            json.dump(self.meta, meta_file)
+        os.replace(tmp_path, self._file('meta.json'))
+        self.meta_mtime = None
+        self._load()
+
+    def _assign(self, vectors):
+        if self.centroids is None:
+            return np.full(len(vectors), -1, dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def upsert(self, ids, vectors, watermark=None, model=None):
+        """Write ``vectors`` for opportunity ``ids``, replacing their old rows."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock():
+            self.meta_mtime = None
+            self._load()
+            if self.dim is None:
+                self.dim = self.meta['dim'] = vectors.shape[1]
+            rows = []
+            count = self.meta['count']
+            for pk in ids:
+                row = self.row_of.get(int(pk))
+                if row is None:
+                    row = count
+                    count += 1
+                rows.append(row)
+            data, stored_ids, lists = self._open_for_write(count)
+            rows = np.asarray(rows, dtype=np.int64)
+            data[rows] = vectors.astype(VECTOR_DTYPE)
+            lists[rows] = self._assign(vectors)
+            stored_ids[rows] = np.asarray(ids, dtype=np.int64)
+            for memmap in (data, lists, stored_ids):
+                memmap.flush()
+            self.meta['count'] = count
+            if watermark is not None:
+                self.meta['watermark'] = watermark
+            if model is not None:
+                self.meta['model'] = model
+            if count >= MIN_INDEXED_ROWS and count >= 2 * self.meta['trained_count']:
+                self._train(data, lists, count)
+            self._publish()
+
+    def delete(self, ids):
+        with self._lock():
+            self.meta_mtime = None
+            self._load()
+            rows = [self.row_of[int(pk)] for pk in ids if int(pk) in self.row_of]
+            if rows:
+                _, stored_ids, _ = self._open_for_write(self.meta['count'])
+                stored_ids[rows] = -1
+                stored_ids.flush()
+                self._publish()
+
+    def _train(self, data, lists, count):
+        """Spherical k-means on a sample of the rows, then reassign every row."""
+        rng = np.random.default_rng(0)
+        list_count = int(min(1024, max(1, np.sqrt(count))))
+        sample = np.sort(rng.choice(count, size=min(count, KMEANS_SAMPLE), replace=False))
+        sample_vectors = np.asarray(data[sample], dtype=np.float32)
+        centroids = sample_vectors[rng.choice(len(sample_vectors), size=list_count, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample_vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample_vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # An empty list keeps its centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        self.centroids = centroids.astype(np.float32)
+        for start in range(0, count, 50000):
+            chunk = np.asarray(data[start:start + 50000], dtype=np.float32)
+            lists[start:start + len(chunk)] = self._assign(chunk)
+        lists.flush()
+        tmp_path = self._file('centroids.tmp.npy')
+        np.save(tmp_path, self.centroids)
+        os.replace(tmp_path, self._file('centroids.npy'))
+        self.meta['trained_count'] = count
+        logger.info(f"Trained job embedding index: {list_count} lists over {count} rows")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VectorStore(settings.JOB_EMBEDDING_DIR)
+        else:
+            _store.refresh()
+        return _store
+
+
+def reset_store():
+    """Delete every stored vector, e.g. after changing the model."""
+    global _store
+    with _store_lock:
+        shutil.rmtree(settings.JOB_EMBEDDING_DIR, ignore_errors=True)
+        _store = None
+
+
+def sync_embeddings(batch_size=500):
+    """
+    Embed opportunities saved since the store's watermark and drop deleted
+    ones.
+
+    :return: the number of opportunities embedded
+    """
+    store = get_store()
+    if store.meta.get('model', settings.JOB_EMBEDDING_MODEL) != settings.JOB_EMBEDDING_MODEL:
+        logger.info(f"Job embedding model changed from {store.meta['model']}, re-embedding every opportunity")
+        reset_store()
+        store = get_store()
+    watermark = store.meta.get('watermark')
+    changed = Opportunity.objects.order_by('updated_at', 'pk').values(
+        'pk', 'title', 'description', 'skills_required', 'updated_at'
+    )
+    if watermark:
+        changed = changed.filter(updated_at__gte=watermark)
+
+    embedded = 0
+    batch = []
+    for values in changed.iterator(chunk_size=batch_size):
+        batch.append(values)
+        if len(batch) == batch_size:
+            embedded += _embed_batch(store, batch)
+            batch = []
+    if batch:
+        embedded += _embed_batch(store, batch)
+
+    live = set(Opportunity.objects.values_list('pk', flat=True))
+    gone = [pk for pk in store.row_of if pk not in live]
+    if gone:
+        store.delete(gone)
+    return embedded
+
+
+def _embed_batch(store, batch):
+    vectors = encode(opportunity_text(values) for values in batch)
+    store.upsert(
+        [values['pk'] for values in batch], vectors,
+        watermark=batch[-1]['updated_at'].isoformat(), model=settings.JOB_EMBEDDING_MODEL,
+    )
+    return len(batch)
+
+
+def profile_vector(user):
+    """A user's CV embedding, cached until their CV data changes."""
+    key = f'job_profile_vector:{user.pk}:{get_snapshot_version(user.pk)}'
+    vector = cache.get(key)
+    if vector is None:
+        vector = encode([profile_text(user)])[0]
+        cache.set(key, vector, PROFILE_VECTOR_TIMEOUT)
+    return vector
+
+
+def semantic_matches(user, k):
+    """
+    The ``k`` opportunities closest to ``user``'s CV as (id, similarity)
+    pairs, or an empty list when semantic matching is unavailable.
+    """
+    if not embeddings_available():
+        return []
+    store = get_store()
+    if not store.count:
+        return []
+    return store.search(profile_vector(user), k)
@@ -0,0 +1,77 @@
+"""
+Counts behind the opportunity filter chips.
+
+Every choice of every facet field is counted in one aggregate query, with a
+conditional ``COUNT`` per choice, and the most common locations in one
+``GROUP BY``, so all the facets of a filter set cost two queries whatever
+the number of choices.
+
+Results are cached under the normalized filter parameters and the ingest
+version (see ``ingest.py``), a watermark read from the database, so any
+opportunity saved or deleted by any process retires every cached set of
+counts.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .ingest import get_ingest_version
+from .models import Opportunity
+
+FACET_FIELDS = ('mode', 'time_commitment', 'experience_level', 'opportunity_type')
+TOP_LOCATIONS = 10
+
+# Query parameters that narrow the listing, and so the counts
+FILTER_PARAMS = (
+    'opportunity_type', 'mode', 'time_commitment', 'experience_level', 'location', 'near', 'radius',
+    'include_duplicates',
+)
+
+
+def facet_counts(queryset):
+    """The total and per-choice counts of ``queryset``, plus its top locations."""
+    choices = {field: Opportunity._meta.get_field(field).choices for field in FACET_FIELDS}
+    aggregates = {'total': Count('pk')}
+    for field, field_choices in choices.items():
+        for index, (value, _) in enumerate(field_choices):
+            aggregates[f'{field}_{index}'] = Count('pk', filter=Q(**{field: value}))
+    # order_by() drops the listing order, which would otherwise join the GROUP BY
+    counts = queryset.order_by().aggregate(**aggregates)
+
+    facets = {'total': counts['total']}
+    for field, field_choices in choices.items():
+        facets[field] = [
+            {'value': value, 'label': label, 'count': counts[f'{field}_{index}']}
+            for index, (value, label) in enumerate(field_choices)
+        ]
+    facets['locations'] = [
+        {'value': row['location'], 'count': row['count']}
+        for row in queryset.order_by().values('location').annotate(count=Count('pk')).order_by('-count', 'location')[:TOP_LOCATIONS]
+    ]
+    return facets
+
+
+def filter_key(params):
+    """A cache key part that is the same for any spelling of the same filters."""
+    normalized = {}
+    for name in FILTER_PARAMS:
+        value = ' '.join(params.get(name, '').split())
+        if value:
+            normalized[name] = value
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+def get_facets(queryset, params):
+    """
+    The facet counts of ``queryset``, the listing narrowed by the filter
+    query ``params``, from the cache when nothing was ingested since.
+    """
+    key = f'opportunity_facets:{get_ingest_version()}:{filter_key(params)}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = facet_counts(queryset)
+        cache.set(key, facets, settings.JOB_FACETS_CACHE_SECONDS)
+    return facets
@@ -0,0 +1,122 @@
+"""
+Offline geocoding and radius search for opportunities.
+
+``data/uk_places.csv`` holds the centroids of UK towns, London districts
+and counties, including every town ``Cleaner.POSTCODE_AREAS`` maps a
+postcode area to. A postcode is therefore located at the main town of its
+area, which is coarse (RG covers Newbury as well as Reading), so a town
+named in the text is preferred to a postcode and a county is the last
+resort. Nothing calls out to a geocoding service.
+
+Opportunities are geocoded from their location as they are saved (see
+``Opportunity.save``). ``within_radius`` narrows a queryset to a bounding
+box first, which the (latitude, longitude) index answers, then applies the
+exact haversine distance to the rows inside it.
+"""
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+
+from django.db.models import F
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+from .utils.cleaner import Cleaner
+
+PLACES_FILE = os.path.join(os.path.dirname(__file__), 'data', 'uk_places.csv')
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LATITUDE = 69.0
+# Longest place name in words, e.g. "kingston upon thames"
+MAX_NAME_WORDS = 4
+
+# A full postcode, or an outward code such as "RG1" standing on its own
+FULL_POSTCODE_PATTERN = re.compile(r'\b([A-Z]{1,2})[0-9][A-Z0-9]? ?[0-9][A-Z]{2}\b')
+OUTWARD_CODE_PATTERN = re.compile(r'^([A-Z]{1,2})[0-9][A-Z0-9]?$')
+
+
+def normalize_place(text):
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower().replace("'", '')).split())
+
+
+@lru_cache(maxsize=None)
+def load_places():
+    """Normalized place name -> (latitude, longitude, kind), kind being "town" or "county"."""
+    with open(PLACES_FILE, newline='') as places_file:
+        return {
+            normalize_place(row['name']): (float(row['latitude']), float(row['longitude']), row['kind'])
+            for row in csv.DictReader(places_file)
+        }
+
+
+@lru_cache(maxsize=None)
+def load_postcode_areas():
+    """Postcode area ("RG") -> the coordinates of the town it is named after."""
+    places = load_places()
+    return {
+        area: places[normalize_place(town)][:2]
+        for area, town in Cleaner().POSTCODE_AREAS.items()
+        if normalize_place(town) in places
+    }
+
+
+def _find_place(words, kind):
+    places = load_places()
+    for start in range(len(words)):
+        # Longest name first, so "sutton coldfield" beats "sutton"
+        for length in range(min(MAX_NAME_WORDS, len(words) - start), 0, -1):
+            place = places.get(' '.join(words[start:start + length]))
+            if place and place[2] == kind:
+                return place[:2]
+    return None
+
+
+def geocode(text):
+    """
+    The (latitude, longitude) of a free-text UK location such as "Reading,
+    Berkshire", "RG1 1AA" or "Leeds LS1", or None if no place is recognised.
+    """
+    if not text:
+        return None
+    words = normalize_place(text).split()
+    location = _find_place(words, 'town')
+    if location:
+        return location
+
+    areas = load_postcode_areas()
+    upper = text.upper()
+    for match in FULL_POSTCODE_PATTERN.finditer(upper):
+        if match.group(1) in areas:
+            return areas[match.group(1)]
+    for part in upper.split(','):
+        match = OUTWARD_CODE_PATTERN.match(part.strip())
+        if match and match.group(1) in areas:
+            return areas[match.group(1)]
+
+    return _find_place(words, 'county')
+
+
+def bounding_box(latitude, longitude, miles):
+    """(min latitude, max latitude, min longitude, max longitude) around a point."""
+    lat_delta = miles / MILES_PER_DEGREE_LATITUDE
+    lon_delta = miles / (MILES_PER_DEGREE_LATITUDE * max(math.cos(math.radians(latitude)), 0.01))
+    return latitude - lat_delta, latitude + lat_delta, longitude - lon_delta, longitude + lon_delta
+
+
+def within_radius(queryset, latitude, longitude, miles):
+    """
+    Narrow ``queryset`` to opportunities within ``miles`` of a point,
+    annotated with their ``distance`` in miles.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, miles)
+    half_chord = (
+        Power(Sin(Radians(F('latitude') - latitude) / 2), 2)
+        + Cos(Radians(F('latitude'))) * math.cos(math.radians(latitude))
+        * Power(Sin(Radians(F('longitude') - longitude) / 2), 2)
+    )
+    return queryset.filter(
+        latitude__range=(min_lat, max_lat),
+        longitude__range=(min_lon, max_lon),
+    ).annotate(
+        distance=2 * EARTH_RADIUS_MILES * ASin(Sqrt(half_chord))
+    ).filter(distance__lte=miles)
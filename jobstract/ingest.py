@@ -0,0 +1,147 @@
+"""
+Writing scraped opportunities, and the ingest version.
+
+``OpportunityWriter`` buffers cleaned jobs and writes them ``BATCH_SIZE`` at
+a time, each batch in one transaction: employers are resolved through a
+name -> id cache (one lookup, and one bulk insert of the new ones, per
+batch) and opportunities are upserted with a single
+``bulk_create(update_conflicts=True)`` keyed on their unique ``source``.
+That is a handful of queries per batch instead of three or four per job.
+Bulk writes send no signals, so the writer does the signals' work itself
+for each batch: geocoding, the skill and search indexes and near-duplicate
+detection.
+
+The ingest version is a watermark read from the database: the latest
+``updated_at`` and the row count of the opportunity and employer tables.
+Every save moves ``updated_at`` (writes through ``update()`` set it
+themselves) and every delete moves the count, whichever process made them,
+so the scrapers and the archive command retire the web process's cached
+results without telling it. Caches of results computed from the opportunity
+table (recommendations, facet counts) put it in their keys, so an ingest
+retires their entries without knowing which ones it affects. A transaction
+that commits long after it stamped its rows can slip under the watermark;
+the caches' timeouts bound that.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .dedupe import deduplicate_opportunities
+from .geo import geocode
+from .matching import get_engine
+from .models import Employer, Opportunity
+from .search import index_opportunities
+from .skills import rebuild_skill_index
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+# Columns a re-scraped opportunity overwrites; created_at, and the archived
+# and duplicate state, are kept
+UPSERT_FIELDS = [
+    'employer', 'title', 'description', 'location', 'latitude', 'longitude', 'opportunity_type', 'mode',
+    'time_commitment', 'experience_level', 'salary_range', 'expenses_paid', 'skills_required',
+    'skills_gained', 'start_date', 'end_date', 'date_posted', 'application_url', 'updated_at',
+]
+
+
+def get_ingest_version():
+    """
+    The watermark of the opportunity and employer tables, as a cache key
+    part. Max(updated_at) is read from ``opportunity_updated_at_idx``.
+    """
+    parts = []
+    for model in (Opportunity, Employer):
+        watermark = model.objects.order_by().aggregate(latest=Max('updated_at'), count=Count('pk'))
+        latest = watermark['latest'].timestamp() if watermark['latest'] else 0
+        parts.append(f"{latest}-{watermark['count']}")
+    return ':'.join(parts)
+
+
+class OpportunityWriter:
+    """
+    Batched upserts of scraped opportunities::
+
+        with OpportunityWriter() as writer:
+            for job in scraped:
+                writer.add(job)
+
+    Jobs are dicts of ``Opportunity`` fields with ``employer_name`` in place
+    of ``employer``. A later job with the same ``source`` replaces an earlier
+    one, in the table as in the buffer.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.pending = {}
+        self.employer_ids = {}
+        self.created = 0
+        self.updated = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.flush()
+
+    def add(self, job):
+        if not job.get('source'):
+            raise ValueError(f"Opportunity {job.get('title')!r} has no source")
+        self.pending[job['source']] = job
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered jobs; returns the ids of the opportunities written."""
+        if not self.pending:
+            return []
+        jobs = list(self.pending.values())
+        self.pending = {}
+        with transaction.atomic():
+            ids = self._write(jobs)
+            self._after_write(ids)
+        return ids
+
+    def _employer_ids(self, names):
+        missing = set(names) - set(self.employer_ids)
+        if missing:
+            # employer_name is not unique; the oldest employer of a name wins
+            for name, pk in Employer.objects.filter(employer_name__in=missing).order_by('-pk').values_list(
+                'employer_name', 'pk'
+            ):
+                self.employer_ids[name] = pk
+            new = [name for name in missing if name not in self.employer_ids]
+            if new:
+                Employer.objects.bulk_create([Employer(employer_name=name) for name in new])
+                self.employer_ids.update(
+                    Employer.objects.filter(employer_name__in=new).values_list('employer_name', 'pk')
+                )
+        return self.employer_ids
+
+    def _write(self, jobs):
+        employer_ids = self._employer_ids({job['employer_name'] for job in jobs})
+        sources = [job['source'] for job in jobs]
+        existing = set(Opportunity.objects.filter(source__in=sources).values_list('source', flat=True))
+        opportunities = []
+        for job in jobs:
+            fields = {key: value for key, value in job.items() if key != 'employer_name'}
+            opportunity = Opportunity(employer_id=employer_ids[job['employer_name']], **fields)
+            # What Opportunity.save() would have done
+            opportunity.latitude, opportunity.longitude = geocode(opportunity.location) or (None, None)
+            opportunities.append(opportunity)
+        Opportunity.objects.bulk_create(
+            opportunities, update_conflicts=True, unique_fields=['source'], update_fields=UPSERT_FIELDS,
+        )
+        self.created += len(jobs) - len(existing)
+        self.updated += len(existing)
+        return list(Opportunity.objects.filter(source__in=sources).values_list('pk', flat=True))
+
+    def _after_write(self, ids):
+        # The work of the post_save signals, batched
+        rebuild_skill_index(Opportunity.objects.filter(pk__in=ids))
+        index_opportunities(ids)
+        deduplicate_opportunities(ids)
+        get_engine().invalidate()
+        logger.info(f"Wrote {len(ids)} opportunities")
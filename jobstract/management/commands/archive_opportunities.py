@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobstract.archive import BATCH_SIZE, archive_opportunities
+
+
+class Command(BaseCommand):
+    """
+    Move opportunities past their end date, or posted more than --days ago,
+    to the archive table. Meant to run daily, after the scrapers.
+    """
+    help = 'Archive expired opportunities'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.JOB_ARCHIVE_AFTER_DAYS,
+            help='Archive opportunities posted more than this many days ago',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Opportunities moved per transaction')
+
+    def handle(self, *args, **options):
+        moved, flagged = archive_opportunities(days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} opportunities; {flagged} more with applications were flagged archived'
+        ))
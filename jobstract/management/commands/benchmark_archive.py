@@ -0,0 +1,85 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from jobstract.archive import archive_opportunities
+from jobstract.facets import facet_counts
+from jobstract.models import Employer, Opportunity
+
+LOCATIONS = ['London', 'Leeds', 'Manchester', 'Bristol', 'Glasgow', 'Reading', 'Cardiff', 'Norwich']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Fill the opportunity table with N jobs posted over the last three years,
+    then time the listing's queries (a filtered first page, its facet counts
+    and a location search) before and after archiving everything older than
+    --days. Everything is rolled back.
+    """
+    help = 'Benchmark opportunity listing with and without archival'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--opportunities', type=int, default=200000)
+        parser.add_argument('--days', type=int, default=60, help='Archive opportunities posted before this')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the best is reported')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._fill(options['opportunities'])
+                self._run('before archival', options['repeat'])
+                started = time.perf_counter()
+                moved, _ = archive_opportunities(days=options['days'])
+                self.stdout.write(f'Archived {moved} opportunities in {time.perf_counter() - started:.1f} s')
+                self._analyze()
+                self._run('after archival', options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _fill(self, count):
+        rng = random.Random(0)
+        today = timezone.localdate()
+        employer = Employer.objects.create(employer_name='Benchmark Employer')
+        for start in range(0, count, 5000):
+            Opportunity.objects.bulk_create([
+                Opportunity(
+                    employer=employer, title=f'Job {i}', description='Benchmark job',
+                    location=rng.choice(LOCATIONS), mode=rng.choice(['on_site', 'remote', 'hybrid']),
+                    time_commitment='full_time', experience_level='entry_level', opportunity_type='job',
+                    date_posted=today - timedelta(days=rng.randrange(3 * 365)),
+                    application_url=f'https://example.com/{i}', source=f'https://example.com/{i}',
+                ) for i in range(start, min(start + 5000, count))
+            ])
+        self._analyze()
+
+    def _analyze(self):
+        if connection.vendor == 'sqlite':
+            connection.cursor().execute('ANALYZE')
+
+    def _run(self, label, repeat):
+        listed = Opportunity.objects.filter(archived=False, canonical__isnull=True)
+        page = lambda: list(listed.filter(mode='remote').order_by('-created_at', '-id')[:20])
+        facets = lambda: facet_counts(listed)
+        search = lambda: list(listed.filter(location__icontains='leeds').order_by('-created_at', '-id')[:20])
+        self.stdout.write(
+            f"{label:>16} ({listed.count()} rows): first page {self._best(page, repeat):7.1f} ms, "
+            f"facets {self._best(facets, repeat):7.1f} ms, location search {self._best(search, repeat):7.1f} ms"
+        )
+
+    def _best(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
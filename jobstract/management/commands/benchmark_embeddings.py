@@ -0,0 +1,79 @@
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from jobstract.embeddings import VectorStore
+
+
+class Command(BaseCommand):
+    """
+    Fill a throwaway vector store with N synthetic, clustered embeddings
+    (no model needed) and report the write time, size on disk, query
+    latency and recall@k of the IVF search against an exact scan.
+    """
+    help = 'Benchmark the semantic job matching vector index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--opportunities', type=int, default=100000)
+        parser.add_argument('--dim', type=int, default=384)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--probes', type=int, nargs='+', default=[4, 8, 16])
+        parser.add_argument('--k', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        count, dim, k = options['opportunities'], options['dim'], options['k']
+        # Jobs bunch into families (care, warehouse, IT...) rather than being uniform
+        topics = self._unit(rng.standard_normal((200, dim)))
+
+        def vectors(size):
+            noise = rng.standard_normal((size, dim)) / np.sqrt(dim)
+            return self._unit(topics[rng.integers(0, len(topics), size)] + 2.4 * noise)
+
+        with tempfile.TemporaryDirectory() as path:
+            store = VectorStore(path)
+            started = time.perf_counter()
+            for start in range(0, count, 5000):
+                size = min(5000, count - start)
+                store.upsert(np.arange(start, start + size) + 1, vectors(size))
+            write_s = time.perf_counter() - started
+            megabytes = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1024 ** 2
+            self.stdout.write(
+                f"write: {count} vectors in {write_s:.1f} s, {store.list_count} lists, {megabytes:.0f} MB on disk"
+            )
+
+            queries = vectors(options['queries']).astype(np.float32)
+            exact = [
+                {pk for pk, _ in store.search(query, k, probes=store.list_count)} for query in queries
+            ]
+            for probes in options['probes']:
+                self._report(store, queries, exact, k, probes)
+
+            started = time.perf_counter()
+            store.upsert(np.arange(count, count + 500) + 1, vectors(500))
+            store.upsert(rng.choice(count, 500, replace=False) + 1, vectors(500))
+            self.stdout.write(
+                f"incremental: 500 new and 500 changed vectors in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+
+    def _report(self, store, queries, exact, k, probes):
+        timings = []
+        recall = []
+        for query, truth in zip(queries, exact):
+            started = time.perf_counter()
+            found = store.search(query, k, probes=probes)
+            timings.append((time.perf_counter() - started) * 1000)
+            recall.append(len(truth & {pk for pk, _ in found}) / k)
+        timings.sort()
+        self.stdout.write(
+            f"{probes:>3} probes: p50 {statistics.median(timings):.1f} ms, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.1f} ms, recall@{k} {statistics.mean(recall):.3f}"
+        )
+
+    @staticmethod
+    def _unit(vectors):
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
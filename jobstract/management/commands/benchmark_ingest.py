@@ -0,0 +1,89 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jobstract.ingest import OpportunityWriter
+from jobstract.models import Employer, Opportunity
+
+EMPLOYERS = [f'Employer {i}' for i in range(200)]
+TITLES = ['Developer', 'Analyst', 'Engineer', 'Administrator', 'Designer', 'Manager', 'Nurse', 'Driver']
+SKILLS = ['Python', 'SQL', 'Excel', 'Django', 'Communication', 'Leadership', 'AWS', 'Customer Service']
+LOCATIONS = ['London', 'Leeds', 'Manchester', 'Bristol', 'Glasgow', 'Reading', 'Cardiff', 'Norwich']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Write N scraped-looking jobs the way the scrapers used to (get_or_create
+    the employer, update_or_create the opportunity, one job at a time) and
+    through OpportunityWriter, then write them all again as updates.
+    Everything is rolled back.
+    """
+    help = 'Benchmark per-job against batched opportunity upserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        jobs = self._jobs(options['jobs'])
+        for label, write in (('per job', self._per_job), ('batched', self._batched)):
+            try:
+                with transaction.atomic():
+                    insert = self._time(write, jobs)
+                    update = self._time(write, jobs)
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(
+                f"{label:>8}: inserts {len(jobs) / insert:8.0f} jobs/s, updates {len(jobs) / update:8.0f} jobs/s"
+            )
+
+    def _jobs(self, count):
+        rng = random.Random(0)
+        return [
+            {
+                'employer_name': rng.choice(EMPLOYERS),
+                'title': f'{rng.choice(SKILLS)} {rng.choice(TITLES)} {i}',
+                'description': f'Job {i}: ' + ' '.join(rng.choices(SKILLS + TITLES, k=60)),
+                'location': rng.choice(LOCATIONS),
+                'salary_range': 'Not specified',
+                'date_posted': date(2026, 1, 1) + timedelta(days=rng.randrange(60)),
+                'mode': 'on_site',
+                'time_commitment': 'full_time',
+                'source': f'https://example.com/jobs/{i}',
+                'application_url': f'https://example.com/jobs/{i}',
+                'opportunity_type': 'job',
+                'experience_level': 'entry_level',
+                'skills_required': ', '.join(rng.sample(SKILLS, 3)),
+                'skills_gained': '',
+                'expenses_paid': True,
+                'start_date': None,
+                'end_date': None,
+            }
+            for i in range(count)
+        ]
+
+    def _per_job(self, jobs):
+        for job in jobs:
+            fields = dict(job)
+            employer, _ = Employer.objects.get_or_create(employer_name=fields.pop('employer_name'))
+            fields['employer'] = employer
+            Opportunity.objects.update_or_create(
+                title=fields['title'], employer=employer, source=fields['source'], defaults=fields
+            )
+
+    def _batched(self, jobs):
+        with OpportunityWriter() as writer:
+            for job in jobs:
+                writer.add(job)
+
+    def _time(self, write, jobs):
+        started = time.perf_counter()
+        write(jobs)
+        return time.perf_counter() - started
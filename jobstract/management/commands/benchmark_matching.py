@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobstract.matching import MatchingEngine, document_terms
+
+SKILLS = [
+    'Python', 'SQL', 'Excel', 'Project Management', 'Customer Service', 'Java',
+    'JavaScript', 'React', 'Django', 'Communication', 'Leadership', 'Sales',
+    'Accounting', 'Sage', 'Forklift Licence', 'First Aid', 'Driving Licence',
+    'Data Analysis', 'Stakeholder Management', 'Microsoft Office', 'Teamwork',
+] + [f'Tool {i}' for i in range(2000)]
+TITLES = ['Engineer', 'Analyst', 'Manager', 'Assistant', 'Developer', 'Officer', 'Coordinator', 'Advisor']
+DESCRIPTION_WORDS = [f'word{i}' for i in range(20000)]
+LEVELS = ['entry_level', 'junior', 'mid', 'senior']
+
+
+class Command(BaseCommand):
+    """
+    Build the matching matrix from N synthetic opportunities, without the
+    database, and report the build time, matrix size, query latency and the
+    cost of an incremental update.
+    """
+    help = 'Benchmark the BM25 job matching engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--opportunities', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        count = options['opportunities']
+
+        def document(pk):
+            return {
+                'id': pk,
+                'title': f"{rng.choice(SKILLS)} {rng.choice(TITLES)}",
+                'description': ' '.join(rng.choices(DESCRIPTION_WORDS, k=120)),
+                'skills_required': ', '.join(rng.sample(SKILLS, 6)),
+                'skills_gained': '',
+                'updated_at': pk,
+                'opportunity_type': 'job',
+                'experience_level': rng.choice(LEVELS),
+                'canonical_id': None,
+                'archived': False,
+            }
+
+        documents = [document(pk) for pk in range(1, count + 1)]
+        engine = MatchingEngine()
+        started = time.perf_counter()
+        engine.build(documents)
+        build_s = time.perf_counter() - started
+        nnz = sum(segment.nnz for segment in engine.segments)
+        megabytes = sum(
+            segment.data.nbytes + segment.indices.nbytes + segment.indptr.nbytes for segment in engine.segments
+        ) / 1024 ** 2
+        self.stdout.write(
+            f"build: {count} opportunities in {build_s:.1f} s, {len(engine.vocabulary)} terms, "
+            f"{nnz} non-zeros, {megabytes:.0f} MB"
+        )
+
+        queries = [
+            document_terms(rng.choice(TITLES), ' '.join(rng.choices(DESCRIPTION_WORDS, k=60)),
+                           ', '.join(rng.sample(SKILLS, 8)))
+            for _ in range(options['queries'])
+        ]
+        self._report('top 20', engine, queries, experience_level='entry_level')
+
+        started = time.perf_counter()
+        engine.add_documents([document(pk) for pk in range(count + 1, count + 501)])
+        self.stdout.write(f"incremental: 500 new opportunities in {(time.perf_counter() - started) * 1000:.0f} ms")
+        started = time.perf_counter()
+        engine.add_documents([document(pk) for pk in rng.sample(range(1, count + 1), 500)])
+        self.stdout.write(f"incremental: 500 changed opportunities in {(time.perf_counter() - started) * 1000:.0f} ms")
+        self._report('top 20 after updates', engine, queries, experience_level='entry_level')
+
+    def _report(self, label, engine, queries, **filters):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            engine.top_k(query, 20, **filters)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f"{label}: p50 {statistics.median(timings):.1f} ms, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.1f} ms over {len(timings)} queries"
+        )
@@ -0,0 +1,91 @@
+import random
+import time
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from jobstract.models import Employer, Opportunity
+from jobstract.pagination import KeysetPagination, StandardResultsSetPagination
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Fill the opportunity table with N jobs, then time fetching page 1 and a
+    deep page of the listing with page numbers (COUNT plus OFFSET) and with
+    keyset cursors, for each indexed ordering. Everything is rolled back.
+    """
+    help = 'Benchmark page-number against keyset pagination of opportunities'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--opportunities', type=int, default=200000)
+        parser.add_argument('--page', type=int, default=500, help='The deep page to fetch')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the best is reported')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._fill(options['opportunities'])
+                for ordering in ('-created_at', '-date_posted'):
+                    self._run(ordering, options['page'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _fill(self, count):
+        rng = random.Random(0)
+        employer = Employer.objects.create(employer_name='Benchmark Employer')
+        for start in range(0, count, 5000):
+            Opportunity.objects.bulk_create([
+                Opportunity(
+                    employer=employer, title=f'Job {i}', description='Benchmark job',
+                    location='London', mode='on_site', time_commitment='full_time',
+                    experience_level='entry_level', opportunity_type='job',
+                    date_posted=date(2023, 1, 1) + timedelta(days=rng.randrange(730)),
+                    application_url=f'https://example.com/{i}', source=f'https://example.com/{i}',
+                ) for i in range(start, min(start + 5000, count))
+            ])
+        if connection.vendor == 'sqlite':
+            connection.cursor().execute('ANALYZE')
+
+    def _run(self, ordering, deep_page, repeat):
+        factory = APIRequestFactory()
+        queryset = Opportunity.objects.select_related('employer').order_by(ordering, '-id')
+
+        def page_number(page):
+            request = Request(factory.get('/', {'page': page}))
+            return lambda: StandardResultsSetPagination().paginate_queryset(queryset, request)
+
+        def keyset(cursor):
+            request = Request(factory.get('/', {'cursor': cursor} if cursor else {}))
+            return lambda: KeysetPagination().paginate_queryset(queryset, request)
+
+        # The cursor a client would hold after paging to the row before the deep page
+        paginator = KeysetPagination()
+        paginator.paginate_queryset(queryset, Request(factory.get('/')))
+        size = paginator.page_size
+        paginator.next_row = queryset[(deep_page - 1) * size - 1]
+        deep_cursor = parse_qs(urlparse(paginator.get_next_link()).query)['cursor'][0]
+
+        self.stdout.write(
+            f"{ordering:>13}: page numbers page 1 {self._best(page_number(1), repeat):7.1f} ms, "
+            f"page {deep_page} {self._best(page_number(deep_page), repeat):7.1f} ms | "
+            f"keyset page 1 {self._best(keyset(None), repeat):7.1f} ms, "
+            f"page {deep_page} {self._best(keyset(deep_cursor), repeat):7.1f} ms"
+        )
+
+    def _best(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,91 @@
+import random
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from jobstract.models import Employer, Opportunity
+from jobstract.skills import rank_by_skills, rebuild_skill_index
+
+SKILL_POOL = [
+    'Python', 'SQL', 'Excel', 'Project Management', 'Customer Service', 'Java',
+    'JavaScript', 'React', 'Django', 'Communication', 'Leadership', 'Sales',
+    'Accounting', 'Sage', 'Forklift Licence', 'First Aid', 'Driving Licence',
+    'Data Analysis', 'Stakeholder Management', 'Microsoft Office', 'Teamwork',
+    'Marketing', 'SEO', 'Photoshop', 'AutoCAD', 'Payroll', 'Bookkeeping',
+]
+# Real job boards list thousands of distinct skills; pad the pool so a
+# user's skills match a realistic share of jobs rather than most of them
+SKILL_POOL += [f'Tool {i}' for i in range(1000)]
+USER_SKILLS = ['python', 'sql', 'excel', 'data analysis', 'communication']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Fill the opportunity table with N jobs, then time the skill matching of
+    the recommendations view with the old OR of icontains terms and with
+    the skill index join. Everything is rolled back afterwards.
+    """
+    help = 'Benchmark skill matching for opportunity recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--opportunities', type=int, nargs='+', default=[1000, 10000, 50000])
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the best is reported')
+
+    def handle(self, *args, **options):
+        for count in options['opportunities']:
+            try:
+                with transaction.atomic():
+                    self._run(count, options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def _run(self, count, repeat):
+        rng = random.Random(count)
+        employer = Employer.objects.create(employer_name='Benchmark Employer')
+        Opportunity.objects.bulk_create([
+            Opportunity(
+                employer=employer, title=f'Job {i}', description='Benchmark job',
+                location='London', mode='on_site', time_commitment='full_time',
+                experience_level='entry_level', opportunity_type='job',
+                skills_required=', '.join(rng.sample(SKILL_POOL, 5)),
+                date_posted=date(2024, 1, 1), application_url=f'https://example.com/{i}',
+                source=f'https://example.com/{i}',
+            ) for i in range(count)
+        ], batch_size=1000)
+        # bulk_create skips save(), so index the rows by hand
+        rebuild_skill_index()
+
+        queryset = Opportunity.objects.filter(opportunity_type='job', experience_level__icontains='entry_level')
+
+        def legacy():
+            skill_query = models.Q()
+            for skill in USER_SKILLS:
+                skill_query |= models.Q(skills_required__icontains=skill) | \
+                               models.Q(skills_gained__icontains=skill)
+            return list(queryset.filter(skill_query)[:20])
+
+        def indexed():
+            return rank_by_skills(
+                USER_SKILLS, 20, opportunity_type='job', experience_level__icontains='entry_level'
+            )
+
+        self.stdout.write(
+            f"{count:>7} opportunities: icontains OR {self._best(legacy, repeat):8.1f} ms, "
+            f"skill index {self._best(indexed, repeat):8.1f} ms"
+        )
+
+    def _best(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
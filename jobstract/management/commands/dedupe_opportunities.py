@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from jobstract.dedupe import rebuild_duplicates
+from jobstract.models import Opportunity
+
+
+class Command(BaseCommand):
+    """
+    Re-sign every opportunity and relink near-duplicates to the oldest
+    listing of their vacancy. Saves check the saved opportunity, so this is
+    only needed for rows written before detection was added, by writes that
+    skip save(), or after the thresholds change.
+    """
+    help = 'Find near-duplicate opportunities across sources'
+
+    def handle(self, *args, **options):
+        duplicates = rebuild_duplicates()
+        total = Opportunity.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'Found {duplicates} duplicates among {total} opportunities'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from jobstract.embeddings import embeddings_available, reset_store, sync_embeddings
+
+
+class Command(BaseCommand):
+    """
+    Embed opportunities saved since the last run into the semantic matching
+    index. The scrapers run this after each ingest; --rebuild starts over.
+    """
+    help = 'Embed new and changed opportunities for semantic job matching'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Opportunities per batch')
+        parser.add_argument('--rebuild', action='store_true', help='Drop the stored vectors and embed everything')
+
+    def handle(self, *args, **options):
+        if not embeddings_available():
+            raise CommandError('Semantic matching needs sentence-transformers and JOB_EMBEDDINGS_ENABLED')
+        if options['rebuild']:
+            reset_store()
+        embedded = sync_embeddings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Embedded {embedded} opportunities'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from jobstract.geo import geocode
+from jobstract.models import Opportunity
+
+
+class Command(BaseCommand):
+    """
+    Set the coordinates of every opportunity from its location text. Saves
+    geocode new and edited opportunities, so this is only needed for rows
+    written before coordinates were added, by writes that skip save(), or
+    after the place data changes.
+    """
+    help = 'Geocode opportunities from their location text'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Opportunities per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch = []
+        located = total = 0
+        for opportunity in Opportunity.objects.only('pk', 'location').iterator(chunk_size=batch_size):
+            opportunity.latitude, opportunity.longitude = geocode(opportunity.location) or (None, None)
+            located += opportunity.latitude is not None
+            total += 1
+            batch.append(opportunity)
+            if len(batch) == batch_size:
+                Opportunity.objects.bulk_update(batch, ['latitude', 'longitude'])
+                batch = []
+        if batch:
+            Opportunity.objects.bulk_update(batch, ['latitude', 'longitude'])
+        self.stdout.write(self.style.SUCCESS(f'Located {located} of {total} opportunities'))
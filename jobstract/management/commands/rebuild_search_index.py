@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from jobstract.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    """
+    Re-index every opportunity for full-text search. Saves keep the index
+    in sync, so this is only needed after writes that skip save() and
+    don't call index_opportunities, or after the weighting changes.
+    """
+    help = 'Rebuild the opportunity full-text search index'
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} opportunities for search'))
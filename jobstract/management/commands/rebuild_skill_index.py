@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from jobstract.skills import rebuild_skill_index
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the OpportunitySkill index from the opportunities' skill text.
+    Saves keep the index in sync, so this is only needed after the index is
+    first added, after bulk writes that skip save(), or after the term
+    extraction changes.
+    """
+    help = 'Rebuild the opportunity skill index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Opportunities per batch')
+
+    def handle(self, *args, **options):
+        indexed = rebuild_skill_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed skills of {indexed} opportunities'))
@@ -1,9 +1,10 @@
 from django.core.management.base import BaseCommand
-from jobstract.models import Opportunity, Employer
+from jobstract import reed
+from jobstract.embeddings import embeddings_available, sync_embeddings
+from jobstract.ingest import OpportunityWriter
 import requests
 from datetime import datetime
 import time
-import random
 import logging
 import os
 import re
@@ -50,18 +51,48 @@ class Command(BaseCommand):
             type=str,
             help='Keywords to search for',
         )
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='use_async',
+            help='Fetch every page of results concurrently instead of the first 100',
+        )
+        parser.add_argument(
+            '--max-results',
+            type=int,
+            help='Stop after this many results (async mode only)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Connections to keep open to Reed (async mode only)',
+        )
 
     def handle(self, *args, **options):
         if options['debug']:
             logging.basicConfig(level=logging.DEBUG)
         
         self.stdout.write('Starting Reed job fetching...')
-        self.fetch_reed_jobs(
-            location=options['location'],
-            distance=options['distance'],
-            keywords=options['keywords']
-        )
-        self.stdout.write(self.style.SUCCESS('Job fetching completed'))
+        with OpportunityWriter() as self.writer:
+            if options['use_async']:
+                self.fetch_reed_jobs_async(
+                    location=options['location'],
+                    distance=options['distance'],
+                    keywords=options['keywords'],
+                    max_results=options['max_results'],
+                    concurrency=options['concurrency'],
+                )
+            else:
+                self.fetch_reed_jobs(
+                    location=options['location'],
+                    distance=options['distance'],
+                    keywords=options['keywords']
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Job fetching completed: {self.writer.created} created, {self.writer.updated} updated'
+        ))
+        if embeddings_available():
+            self.stdout.write(f'Embedded {sync_embeddings()} new or changed opportunities')
 
     def fetch_reed_jobs(self, location='', distance=10, keywords=None):
         """Fetch jobs from Reed API"""
@@ -73,7 +104,7 @@ class Command(BaseCommand):
             ))
             return
 
-        base_url = 'https://www.reed.co.uk/api/1.0/search'
+        base_url = settings.REED_API_URL
         
         # Build parameters
         params = {
@@ -131,140 +162,160 @@ class Command(BaseCommand):
             self.stdout.write(f'Found {total_results} total jobs, processing {len(results)} results')
             
             for job in results:
-                try:
-                    # Get or create employer
-                    employer_name = job.get('employerName', 'Unknown Employer')
-                    employer, _ = Employer.objects.get_or_create(
-                        employer_name=employer_name
-                    )
-                    
-                    # Format salary range
-                    min_salary = job.get('minimumSalary')
-                    max_salary = job.get('maximumSalary')
-                    currency_unit = job.get('currency', '£')
-                    if currency_unit == 'GBP':
-                        currency_unit = '£'
-                    
-                    # Detect if salary is per day
-                    description = job.get('jobDescription', '').lower()
-                    title = job.get('jobTitle', '').lower()
-                    combined_text = f"{description} {title}"
-                    
-                    is_daily_rate = any(phrase in combined_text for phrase in [
-                        'per day', '/day', 'daily rate', 'day rate',
-                        'per diem', 'a day', 'pd', 'p/d'
-                    ])
+                self.save_job(job)
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error fetching jobs from Reed: {str(e)}'))
+            logging.exception("Error in fetch_reed_jobs")
+
+    def fetch_reed_jobs_async(self, location='', distance=10, keywords=None, max_results=None, concurrency=None):
+        """Fetch every page of a Reed search concurrently, then save the jobs"""
+        api_key = os.getenv('REED_API_KEY')
+        if not api_key:
+            self.stdout.write(self.style.ERROR(
+                'REED_API_KEY not found in environment variables. '
+                'Please get an API key from https://www.reed.co.uk/developers/jobseeker'
+            ))
+            return
+
+        params = {}
+        if location:
+            params.update({
+                'locationName': location,
+                'distanceFromLocation': distance
+            })
+        if keywords:
+            params['keywords'] = keywords
+
+        try:
+            started = time.perf_counter()
+            total, results = reed.fetch_reed_jobs(
+                api_key, params, max_results=max_results, concurrency=concurrency
+            )
+            self.stdout.write(
+                f'Fetched {len(results)} of {total} jobs in {time.perf_counter() - started:.1f}s'
+            )
+        except reed.ReedAPIError as e:
+            self.stdout.write(self.style.ERROR(f'Error fetching jobs from Reed: {str(e)}'))
+            return
+
+        for job in results:
+            self.save_job(job)
+
+    def save_job(self, job):
+        """Create or update the opportunity of one Reed search result"""
+        try:
+            employer_name = job.get('employerName', 'Unknown Employer')
+            
+            # Format salary range
+            min_salary = job.get('minimumSalary')
+            max_salary = job.get('maximumSalary')
+            currency_unit = job.get('currency', '£')
+            if currency_unit == 'GBP':
+                currency_unit = '£'
+            
+            # Detect if salary is per day
+            description = job.get('jobDescription', '').lower()
+            title = job.get('jobTitle', '').lower()
+            combined_text = f"{description} {title}"
+            
+            is_daily_rate = any(phrase in combined_text for phrase in [
+                'per day', '/day', 'daily rate', 'day rate',
+                'per diem', 'a day', 'pd', 'p/d'
+            ])
 
-                    if min_salary and max_salary:
-                        salary_range = f'{currency_unit}{min_salary:,.2f} to {currency_unit}{max_salary:,.2f}'
-                    elif min_salary:
-                        salary_range = f'{currency_unit}{min_salary:,.2f}'
-                    elif max_salary:
-                        salary_range = f'{currency_unit}{max_salary:,.2f}'
-                    else:
-                        salary_range = 'Not specified'
-                    
-                    # Add the time period
-                    if salary_range != 'Not specified':
-                        salary_range += ' per day' if is_daily_rate else ' per year'
+            if min_salary and max_salary:
+                salary_range = f'{currency_unit}{min_salary:,.2f} to {currency_unit}{max_salary:,.2f}'
+            elif min_salary:
+                salary_range = f'{currency_unit}{min_salary:,.2f}'
+            elif max_salary:
+                salary_range = f'{currency_unit}{max_salary:,.2f}'
+            else:
+                salary_range = 'Not specified'
+            
+            # Add the time period
+            if salary_range != 'Not specified':
+                salary_range += ' per day' if is_daily_rate else ' per year'
 
-                    # Parse date with fallback
-                    date_posted = None
-                    date_str = job.get('datePosted')
-                    if date_str:
-                        try:
-                            date_posted = datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S")
-                        except ValueError:
-                            try:
-                                # Try alternative format
-                                date_posted = datetime.strptime(date_str, "%Y-%m-%d")
-                            except ValueError:
-                                self.stdout.write(self.style.WARNING(f'Could not parse date: {date_str}'))
-                                date_posted = datetime.now()  # Use current time as fallback
-                    else:
-                        date_posted = datetime.now()  # Use current time if no date provided
+            # Parse date with fallback
+            date_posted = None
+            date_str = job.get('datePosted')
+            if date_str:
+                try:
+                    date_posted = datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S")
+                except ValueError:
+                    try:
+                        # Try alternative format
+                        date_posted = datetime.strptime(date_str, "%Y-%m-%d")
+                    except ValueError:
+                        self.stdout.write(self.style.WARNING(f'Could not parse date: {date_str}'))
+                        date_posted = datetime.now()  # Use current time as fallback
+            else:
+                date_posted = datetime.now()  # Use current time if no date provided
+
+            # Determine time commitment
+            time_commitment = 'full_time'
+            if job.get('partTime', False):
+                time_commitment = 'part_time'
+            elif job.get('contractType', '').lower() == 'contract':
+                time_commitment = 'temporary'
+            elif 'temporary' in job.get('contractType', '').lower():
+                time_commitment = 'temporary'
+            elif 'occasional' in job.get('contractType', '').lower():
+                time_commitment = 'occasional'
 
-                    # Determine time commitment
-                    time_commitment = 'full_time'
-                    if job.get('partTime', False):
-                        time_commitment = 'part_time'
-                    elif job.get('contractType', '').lower() == 'contract':
-                        time_commitment = 'temporary'
-                    elif 'temporary' in job.get('contractType', '').lower():
-                        time_commitment = 'temporary'
-                    elif 'occasional' in job.get('contractType', '').lower():
-                        time_commitment = 'occasional'
+            # Clean and extract job details
+            description = self.cleaner.clean_text(job.get('jobDescription', '').strip())
+            
+            # Get location from town or locationName
+            location_name = job.get('locationName', '')
+            town = job.get('town', '')
+            job_location = self.cleaner.extract_location(location_name) if location_name else self.cleaner.extract_location(town)
+            
+            # Extract job details
+            job_details = self.cleaner.extract_job_details(description)
+            skills_required = job_details.get('skills_required', '')
+            
+            # Create job object
+            job_data = {
+                'employer_name': employer_name,
+                'title': job.get('jobTitle', '').strip(),
+                'description': description,
+                'location': job_location,
+                'salary_range': salary_range,
+                'date_posted': date_posted,
+                'mode': self.cleaner.determine_job_mode(
+                    job.get('jobTitle', ''),
+                    description
+                ),
+                'time_commitment': time_commitment,
+                'source': job.get('jobUrl', ''),
+                'application_url': job.get('jobUrl', ''),
+                'opportunity_type': 'job',
+                'experience_level': self.cleaner.determine_experience_level(
+                    job.get('jobTitle', ''),
+                    description
+                ),
+                'skills_required': skills_required,
+                'skills_gained': '',
+                'expenses_paid': True,
+                'start_date': None,
+                'end_date': None
+            }
+            
+            # Ensure required fields are not empty
+            if not job_data['title'] or not job_data['description']:
+                self.stdout.write(self.style.WARNING(
+                    f'Skipping job with missing required fields: {job_data["title"]}'
+                ))
+                return
 
-                    # Clean and extract job details
-                    description = self.cleaner.clean_text(job.get('jobDescription', '').strip())
-                    
-                    # Get location from town or locationName
-                    location_name = job.get('locationName', '')
-                    town = job.get('town', '')
-                    job_location = self.cleaner.extract_location(location_name) if location_name else self.cleaner.extract_location(town)
-                    
-                    # Extract job details
-                    job_details = self.cleaner.extract_job_details(description)
-                    skills_required = job_details.get('skills_required', '')
-                    
-                    # Create job object
-                    job_data = {
-                        'employer': employer,
-                        'title': job.get('jobTitle', '').strip(),
-                        'description': description,
-                        'location': job_location,
-                        'salary_range': salary_range,
-                        'date_posted': date_posted,
-                        'mode': self.cleaner.determine_job_mode(
-                            job.get('jobTitle', ''),
-                            description
-                        ),
-                        'time_commitment': time_commitment,
-                        'source': job.get('jobUrl', ''),
-                        'application_url': job.get('jobUrl', ''),
-                        'opportunity_type': 'job',
-                        'experience_level': self.cleaner.determine_experience_level(
-                            job.get('jobTitle', ''),
-                            description
-                        ),
-                        'skills_required': skills_required,
-                        'skills_gained': '',
-                        'expenses_paid': True,
-                        'start_date': None,
-                        'end_date': None
-                    }
-                    
-                    # Ensure required fields are not empty
-                    if not job_data['title'] or not job_data['description']:
-                        self.stdout.write(self.style.WARNING(
-                            f'Skipping job with missing required fields: {job_data["title"]}'
-                        ))
-                        continue
+            # Written in batches, see OpportunityWriter
+            self.writer.add(job_data)
+            self.stdout.write(
+                f'Queued job: {job_data["title"]} - {job_data["salary_range"]} ({job_data["experience_level"]})'
+            )
 
-                    job_obj, created = Opportunity.objects.update_or_create(
-                        title=job_data['title'],
-                        employer=employer,
-                        source=job_data['source'],
-                        defaults=job_data
-                    )
-                    
-                    if created:
-                        self.stdout.write(self.style.SUCCESS(
-                            f'Created new job: {job_data["title"]} - {job_data["salary_range"]} ({job_data["experience_level"]})'
-                        ))
-                    else:
-                        self.stdout.write(
-                            f'Updated existing job: {job_data["title"]} - {job_data["salary_range"]} ({job_data["experience_level"]})'
-                        )
-                    
-                    # Be nice to the API
-                    time.sleep(random.uniform(0.5, 1.0))
-                    
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'Error processing job: {str(e)}'))
-                    logging.exception("Error processing job")
-                    continue
-                    
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error fetching jobs from Reed: {str(e)}'))
-            logging.exception("Error in fetch_reed_jobs")
+            self.stdout.write(self.style.ERROR(f'Error processing job: {str(e)}'))
+            logging.exception("Error processing job")
@@ -0,0 +1,438 @@
+"""
+Ranked CV-to-opportunity matching.
+
+Every opportunity is a row of a sparse BM25 matrix over the terms of its
+skills (phrases and n-grams, see ``skills.py``), title and description. The
+matrix stores each term's length-normalized BM25 term frequency, so scoring
+a user is one sparse matrix-vector product with their CV's query vector,
+whose weights are the terms' current IDF.
+
+Rows live in memory, per process, in a few CSR segments. Opportunities
+saved since the last sync (tracked by ``updated_at``) are appended as a new
+segment and any row they replace is masked out. Segments are merged, and
+masked rows dropped, once there are ``MAX_SEGMENTS`` of them. Scrapers and
+other processes therefore show up within ``JOB_MATCHING_SYNC_SECONDS``
+without a rebuild. Deleted opportunities are masked by a signal in this
+process; in others they are only skipped when the winners are loaded.
+
+Near-duplicates (see ``dedupe.py``) and opportunities flagged archived (see
+``archive.py``) are kept out of the matrix.
+
+``recommend`` blends these scores with semantic similarity from
+``embeddings.py`` when a sentence-embedding model is installed.
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from .embeddings import semantic_matches
+from .models import Opportunity
+from .skills import STOP_WORDS, extract_skill_terms, normalize_skill
+
+logger = logging.getLogger(__name__)
+
+K1 = 1.2
+B = 0.75
+MAX_SEGMENTS = 8
+
+# How much more a term counts in the skills and title than in the description
+SKILL_WEIGHT = 3
+TITLE_WEIGHT = 2
+
+# Columns kept per row so recommendations can be filtered without the database
+CATEGORY_FIELDS = ('opportunity_type', 'experience_level')
+
+ENGLISH_STOP_WORDS = {
+    'about', 'after', 'all', 'also', 'am', 'any', 'but', 'do', 'does', 'each',
+    'etc', 'has', 'he', 'her', 'his', 'how', 'if', 'into', 'it', 'its', 'may',
+    'more', 'most', 'no', 'not', 'other', 'per', 'role', 'she', 'so', 'some',
+    'such', 'than', 'that', 'their', 'them', 'then', 'there', 'these', 'they',
+    'this', 'those', 'up', 'us', 'was', 'were', 'what', 'when', 'where',
+    'which', 'who', 'work', 'working', 'would', 'within', 'job',
+}
+
+DOCUMENT_FIELDS = (
+    'id', 'title', 'description', 'skills_required', 'skills_gained', 'updated_at', 'canonical_id', 'archived',
+) + CATEGORY_FIELDS
+
+
+def is_listed(values):
+    """Whether an opportunity belongs in the matrix: not a near-duplicate, not archived."""
+    return values['canonical_id'] is None and not values['archived']
+
+
+def tokenize(text):
+    return [
+        word for word in normalize_skill(text).split()
+        if len(word) > 1 and word not in STOP_WORDS and word not in ENGLISH_STOP_WORDS
+    ]
+
+
+def document_terms(title, description, skills_text):
+    """Weighted term counts of one opportunity."""
+    counts = Counter()
+    for term in extract_skill_terms(skills_text):
+        counts[term] += SKILL_WEIGHT
+    for word in tokenize(title):
+        counts[word] += TITLE_WEIGHT
+    counts.update(tokenize(description))
+    return counts
+
+
+def opportunity_terms(values):
+    return document_terms(
+        values['title'],
+        values['description'],
+        '\n'.join(filter(None, (values['skills_required'], values['skills_gained']))),
+    )
+
+
+def user_query_terms(user):
+    """
+    Weighted terms of a user's primary CV: its skills, and the titles and
+    descriptions of its experience.
+    """
+    from cv_writer.sections import primary_cv, section_buckets, section_rows
+
+    cv = primary_cv(user)
+    if cv is None:
+        return Counter()
+    # Only the version's rows, not other versions' copies of the sections
+    buckets = section_buckets(cv)
+    skill_names = section_rows(cv, 'skills', buckets).exclude(skill_name='').values_list('skill_name', flat=True)
+    counts = document_terms('', '', '\n'.join(name for name in skill_names if name))
+    experiences = section_rows(cv, 'experiences', buckets).values_list('job_title', 'job_description')
+    for title, description in experiences:
+        counts.update({word: TITLE_WEIGHT for word in tokenize(title)})
+        counts.update(tokenize(description))
+    return counts
+
+
+class MatchingEngine:
+    """In-memory BM25 matrix of opportunities, see the module docstring."""
+
+    def __init__(self, k1=K1, b=B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.vocabulary = {}
+        self.doc_freq = np.zeros(1024, dtype=np.int64)
+        self.segments = []
+        self.offsets = []
+        self.row_ids = np.zeros(0, dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.float64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.categories = {field: np.zeros(0, dtype=np.int32) for field in CATEGORY_FIELDS}
+        self.category_codes = {field: {} for field in CATEGORY_FIELDS}
+        self.row_of = {}
+        self.updated_at = {}
+        self.live_docs = 0
+        self.total_length = 0
+        self.watermark = None
+        self.last_sync = None
+        self.built = False
+
+    @property
+    def row_count(self):
+        return len(self.row_ids)
+
+    @property
+    def avgdl(self):
+        return self.total_length / self.live_docs if self.live_docs else 1.0
+
+    # Building and updating
+
+    def build(self, documents=None):
+        """
+        (Re)build the matrix from ``documents`` (dicts with the
+        ``DOCUMENT_FIELDS``), or from every opportunity in the database.
+        """
+        with self._lock:
+            self._reset()
+            if documents is None:
+                documents = Opportunity.objects.filter(
+                    canonical__isnull=True, archived=False
+                ).order_by().values(*DOCUMENT_FIELDS).iterator(chunk_size=2000)
+            documents = [(values, opportunity_terms(values)) for values in documents if is_listed(values)]
+            # Normalize with the final average length rather than a running one
+            self.total_length = sum(sum(terms.values()) for _, terms in documents)
+            self.live_docs = len(documents)
+            self._append(documents, count_lengths=False)
+            self.built = True
+            self.last_sync = time.monotonic()
+            logger.info(f"Built matching matrix: {self.row_count} opportunities, {len(self.vocabulary)} terms")
+
+    def add_documents(self, documents):
+        """
+        Add or replace opportunities given as dicts with the ``DOCUMENT_FIELDS``;
+        near-duplicates and archived opportunities are removed instead.
+        """
+        with self._lock:
+            for values in documents:
+                self._remove_row(values['id'])
+                if not is_listed(values):
+                    # Remembered so the next sync does not fetch it again
+                    self.updated_at[values['id']] = values['updated_at']
+                    if self.watermark is None or values['updated_at'] > self.watermark:
+                        self.watermark = values['updated_at']
+            self._append([(values, opportunity_terms(values)) for values in documents if is_listed(values)])
+            if len(self.segments) > MAX_SEGMENTS:
+                self._compact()
+
+    def remove(self, opportunity_id):
+        with self._lock:
+            self._remove_row(opportunity_id)
+
+    def sync(self, force=False):
+        """
+        Pull opportunities saved since the last sync, at most once every
+        ``JOB_MATCHING_SYNC_SECONDS`` unless ``force`` is set.
+        """
+        with self._lock:
+            if not self.built:
+                self.build()
+                return
+            if not force and self.last_sync is not None \
+                    and time.monotonic() - self.last_sync < settings.JOB_MATCHING_SYNC_SECONDS:
+                return
+            self.last_sync = time.monotonic()
+
+            changed = Opportunity.objects.order_by()
+            if self.watermark is not None:
+                # >= because rows can share the watermark's timestamp
+                changed = changed.filter(updated_at__gte=self.watermark)
+            documents = [
+                values for values in changed.values(*DOCUMENT_FIELDS)
+                if self.updated_at.get(values['id']) != values['updated_at']
+            ]
+            if documents:
+                self.add_documents(documents)
+                logger.info(f"Synced {len(documents)} opportunities into the matching matrix")
+
+    def invalidate(self):
+        """Make the next ``sync`` query the database whatever the interval."""
+        self.last_sync = None
+
+    def _term_columns(self, terms):
+        vocabulary = self.vocabulary
+        columns = [vocabulary.setdefault(term, len(vocabulary)) for term in terms]
+        if len(vocabulary) > len(self.doc_freq):
+            grown = np.zeros(max(len(vocabulary), 2 * len(self.doc_freq)), dtype=np.int64)
+            grown[:len(self.doc_freq)] = self.doc_freq
+            self.doc_freq = grown
+        return columns
+
+    def _category_code(self, field, value):
+        codes = self.category_codes[field]
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    def _append(self, documents, count_lengths=True):
+        if not documents:
+            return
+        if count_lengths:
+            self.live_docs += len(documents)
+            self.total_length += sum(sum(terms.values()) for _, terms in documents)
+        avgdl = self.avgdl
+
+        indptr = [0]
+        indices = []
+        frequencies = []
+        for values, terms in documents:
+            indices.extend(self._term_columns(terms.keys()))
+            frequencies.extend(terms.values())
+            indptr.append(len(indices))
+
+        indices = np.asarray(indices, dtype=np.int32)
+        indptr = np.asarray(indptr, dtype=np.int64)
+        frequencies = np.asarray(frequencies, dtype=np.float32)
+        terms_per_row = np.diff(indptr)
+        lengths = np.bincount(
+            np.repeat(np.arange(len(documents)), terms_per_row), weights=frequencies, minlength=len(documents)
+        )
+        # BM25 term frequency: tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+        norms = np.repeat(self.k1 * (1 - self.b + self.b * lengths / avgdl), terms_per_row)
+        data = (frequencies * (self.k1 + 1) / (frequencies + norms)).astype(np.float32)
+        np.add.at(self.doc_freq, indices, 1)
+
+        segment = sparse.csr_matrix((data, indices, indptr), shape=(len(documents), len(self.vocabulary)))
+        start = self.row_count
+        self.offsets.append(start)
+        self.segments.append(segment)
+
+        ids = np.fromiter((values['id'] for values, _ in documents), dtype=np.int64, count=len(documents))
+        self.row_ids = np.concatenate([self.row_ids, ids])
+        self.lengths = np.concatenate([self.lengths, lengths.astype(np.float64)])
+        self.alive = np.concatenate([self.alive, np.ones(len(documents), dtype=bool)])
+        for field in CATEGORY_FIELDS:
+            codes = np.fromiter(
+                (self._category_code(field, values[field]) for values, _ in documents),
+                dtype=np.int32, count=len(documents),
+            )
+            self.categories[field] = np.concatenate([self.categories[field], codes])
+        for offset, (values, terms) in enumerate(documents):
+            self.row_of[values['id']] = start + offset
+            self.updated_at[values['id']] = values['updated_at']
+            if self.watermark is None or values['updated_at'] > self.watermark:
+                self.watermark = values['updated_at']
+
+    def _row_terms(self, row):
+        index = bisect.bisect_right(self.offsets, row) - 1
+        segment = self.segments[index]
+        local = row - self.offsets[index]
+        start, end = segment.indptr[local], segment.indptr[local + 1]
+        return segment.indices[start:end], segment.data[start:end]
+
+    def _remove_row(self, opportunity_id):
+        row = self.row_of.pop(opportunity_id, None)
+        self.updated_at.pop(opportunity_id, None)
+        if row is None or not self.alive[row]:
+            return
+        self.alive[row] = False
+        columns, _ = self._row_terms(row)
+        self.doc_freq[columns] -= 1
+        self.live_docs -= 1
+        self.total_length -= self.lengths[row]
+
+    def _compact(self):
+        # Older segments are narrower: they predate terms added since
+        matrix = sparse.vstack(
+            [
+                sparse.csr_matrix(
+                    (segment.data, segment.indices, segment.indptr),
+                    shape=(segment.shape[0], len(self.vocabulary)),
+                )
+                for segment in self.segments
+            ],
+            format='csr',
+        )
+        keep = np.flatnonzero(self.alive)
+        self.segments = [matrix[keep]]
+        self.offsets = [0]
+        self.row_ids = self.row_ids[keep]
+        self.lengths = self.lengths[keep]
+        self.alive = np.ones(len(keep), dtype=bool)
+        for field in CATEGORY_FIELDS:
+            self.categories[field] = self.categories[field][keep]
+        self.row_of = {int(opportunity_id): row for row, opportunity_id in enumerate(self.row_ids)}
+
+    # Scoring
+
+    def idf(self):
+        df = self.doc_freq[:len(self.vocabulary)].astype(np.float32)
+        return np.log1p((self.live_docs - df + 0.5) / (df + 0.5))
+
+    def top_k(self, query_terms, k, **filters):
+        """
+        The ``k`` best matching opportunities for ``query_terms`` among those
+        whose ``CATEGORY_FIELDS`` equal ``filters``.
+
+        :return: (opportunity id, score) pairs, best first; scores are
+            between 0 and 1, the share of the best possible score
+        """
+        with self._lock:
+            columns = []
+            weights = []
+            for term, weight in query_terms.items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    columns.append(column)
+                    weights.append(weight)
+            if not columns or not self.row_count:
+                return []
+
+            query = np.zeros(len(self.vocabulary), dtype=np.float32)
+            idf = self.idf()
+            query[columns] = idf[columns] * np.asarray(weights, dtype=np.float32)
+            best_possible = float(query.sum()) * (self.k1 + 1)
+            if best_possible <= 0:
+                return []
+
+            scores = np.concatenate([
+                segment @ query[:segment.shape[1]] for segment in self.segments
+            ])
+            mask = self.alive.copy()
+            for field, value in filters.items():
+                code = self.category_codes[field].get(value)
+                if code is None:
+                    return []
+                mask &= self.categories[field] == code
+            scores[~mask] = 0
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            # Best score first, newer rows (higher ids) first among equals
+            candidates = candidates[np.lexsort((-self.row_ids[candidates], -scores[candidates]))]
+            return [
+                (int(self.row_ids[row]), min(1.0, float(scores[row]) / best_possible))
+                for row in candidates
+            ]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = MatchingEngine()
+        return _engine
+
+
+def recommend(user, k, **filters):
+    """
+    The ``k`` opportunities matching ``filters`` that best match ``user``'s
+    CV, loaded with their employer and ``matching_score`` set.
+
+    When semantic matching is available the score blends BM25 relevance
+    with the cosine similarity of the CV and opportunity embeddings, over
+    the union of both searches' candidates. Near-duplicates of another
+    opportunity and archived opportunities are never recommended.
+    """
+    engine = get_engine()
+    engine.sync()
+    # Ask for a few extra in case some were deleted by another process
+    ranked = engine.top_k(user_query_terms(user), k + 5, **filters)
+
+    try:
+        # The vector index knows nothing of the filters, so over-fetch
+        semantic = semantic_matches(user, 10 * k)
+    except Exception as e:
+        logger.error(f"Semantic job matching failed: {e}")
+        semantic = []
+    if semantic:
+        weight = settings.JOB_EMBEDDING_WEIGHT
+        similarity = dict(semantic)
+        allowed = set(
+            Opportunity.objects.filter(pk__in=similarity, canonical__isnull=True, archived=False, **filters)
+            .values_list('pk', flat=True)
+        )
+        scores = {pk: (1 - weight) * score for pk, score in ranked}
+        for pk in allowed:
+            scores[pk] = scores.get(pk, 0) + weight * max(similarity[pk], 0)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:k + 5]
+
+    opportunities = Opportunity.objects.select_related('employer').in_bulk([pk for pk, _ in ranked])
+    results = []
+    for pk, score in ranked:
+        opportunity = opportunities.get(pk)
+        if opportunity is None:
+            continue
+        opportunity.matching_score = round(score, 4)
+        results.append(opportunity)
+        if len(results) == k:
+            break
+    return results
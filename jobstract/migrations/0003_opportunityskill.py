@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobstract', '0002_jobapplication_applicationevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpportunitySkill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_skill', models.CharField(max_length=100)),
+                ('opportunity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skill_terms', to='jobstract.opportunity')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['normalized_skill', 'opportunity'], name='opportunity_skill_term_idx')],
+                'unique_together': {('opportunity', 'normalized_skill')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobstract', '0003_opportunityskill'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['updated_at'], name='opportunity_updated_at_idx'),
+        ),
+    ]
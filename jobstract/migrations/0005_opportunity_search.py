@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:16
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+FTS_TABLE = 'jobstract_opportunity_fts'
+
+
+def create_search_index(apps, schema_editor):
+    """Fill the new tsvector column on PostgreSQL, or create and fill the FTS5 table elsewhere."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE jobstract_opportunity SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(skills_required, '') || ' ' || coalesce(skills_gained, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+        )
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, skills, description, tokenize='porter unicode61')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, skills, description) "
+        f"SELECT id, title, skills_required || ' ' || skills_gained, description FROM jobstract_opportunity"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobstract', '0004_opportunity_opportunity_updated_at_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='opportunity',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='opportunity_search_vector_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobstract', '0005_opportunity_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='opportunity',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='opportunity',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['latitude', 'longitude'], name='opportunity_lat_lon_idx'),
+        ),
+    ]
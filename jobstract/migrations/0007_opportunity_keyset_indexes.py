@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobstract', '0006_opportunity_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['created_at', 'id'], name='opportunity_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['date_posted', 'id'], name='opportunity_posted_id_idx'),
+        ),
+    ]
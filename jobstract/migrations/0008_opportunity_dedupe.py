@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobstract', '0007_opportunity_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='opportunity',
+            name='canonical',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='jobstract.opportunity'),
+        ),
+        migrations.AddField(
+            model_name='opportunity',
+            name='minhash',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.CreateModel(
+            name='OpportunityBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band_key', models.BigIntegerField()),
+                ('opportunity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='jobstract.opportunity')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band_key', 'opportunity'], name='opportunity_band_key_idx')],
+            },
+        ),
+    ]
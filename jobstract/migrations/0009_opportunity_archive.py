@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobstract', '0008_opportunity_dedupe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='opportunity',
+            name='archived',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOpportunity',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('location', models.CharField(max_length=255)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('opportunity_type', models.CharField(choices=[('internship', 'Internship'), ('job', 'Job'), ('volunteer', 'Volunteer')], max_length=20)),
+                ('mode', models.CharField(choices=[('on_site', 'On Site'), ('remote', 'Remote'), ('hybrid', 'Hybrid')], max_length=20)),
+                ('time_commitment', models.CharField(choices=[('full_time', 'Full Time'), ('part_time', 'Part Time'), ('flexible', 'Flexible'), ('one_off', 'One Off'), ('occasional', 'Occasional')], max_length=20)),
+                ('experience_level', models.CharField(choices=[('entry_level', 'Entry Level'), ('junior', 'Junior'), ('mid', 'Mid Level'), ('senior', 'Senior'), ('lead', 'Lead'), ('manager', 'Manager'), ('director', 'Director'), ('executive', 'Executive'), ('no_experience', 'No Experience Required')], max_length=20)),
+                ('salary_range', models.CharField(blank=True, max_length=100, null=True)),
+                ('expenses_paid', models.BooleanField(default=False)),
+                ('skills_required', models.TextField(blank=True)),
+                ('skills_gained', models.TextField(blank=True)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('date_posted', models.DateField()),
+                ('application_url', models.URLField()),
+                ('source', models.URLField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('employer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_opportunities', to='jobstract.employer')),
+            ],
+            options={
+                'verbose_name_plural': 'Archived opportunities',
+                'ordering': ['-date_posted'],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:37
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def disambiguate_sources(apps, schema_editor):
+    """
+    Give all but the newest opportunity of a shared source a unique one.
+    Nothing is deleted, as applications may refer to any of them.
+    """
+    Opportunity = apps.get_model('jobstract', 'Opportunity')
+    shared = (
+        Opportunity.objects.values('source').annotate(rows=Count('pk')).filter(rows__gt=1)
+        .values_list('source', flat=True)
+    )
+    for source in list(shared):
+        older = Opportunity.objects.filter(source=source).order_by('-pk')[1:]
+        for opportunity in older:
+            opportunity.source = f'{source[:180]}#duplicate-{opportunity.pk}'
+            opportunity.save(update_fields=['source'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobstract', '0009_opportunity_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(disambiguate_sources, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='opportunity',
+            constraint=models.UniqueConstraint(fields=('source',), name='opportunity_unique_source'),
+        ),
+    ]
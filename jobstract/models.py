@@ -1,7 +1,11 @@
 from tabnanny import verbose
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import User
 
+from .geo import geocode
+
 # Create your models here.
 class Employer(models.Model):
     employer_name = models.CharField(max_length=255)
@@ -50,6 +54,9 @@ class Opportunity(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     location = models.CharField(max_length=255)
+    # Centroid of the location's town or postcode area, see geo.py
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
     opportunity_type = models.CharField(max_length=20, choices=OPPORTUNITY_TYPES, default='job')
     mode = models.CharField(max_length=20, choices=JOB_MODE)
     time_commitment = models.CharField(max_length=20, choices=TIME_COMMITMENT)
@@ -71,13 +78,112 @@ class Opportunity(models.Model):
     # metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Weighted title/skills/description lexemes for full-text search on
+    # PostgreSQL, maintained by search.py; SQLite uses an FTS5 table instead
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Near-duplicate detection, see dedupe.py: the MinHash signature of the
+    # listing and, on a duplicate, the opportunity it repeats
+    minhash = models.BinaryField(null=True, editable=False)
+    canonical = models.ForeignKey(
+        'self', null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='duplicates'
+    )
+    # Expired, but kept in this table because applications refer to it, see archive.py
+    archived = models.BooleanField(default=False, editable=False)
 
     def __str__(self):
         return f"{self.title} ({self.get_opportunity_type_display()}) at {self.employer.employer_name}"
 
+    def save(self, *args, **kwargs):
+        # Geocode offline from the location text whenever it may have changed
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'location' in update_fields:
+            self.latitude, self.longitude = geocode(self.location) or (None, None)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'latitude', 'longitude'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name_plural = 'Opportunities'
         ordering = ['-date_posted']
+        indexes = [
+            # The job matching engine pulls rows saved since its last sync
+            models.Index(fields=['updated_at'], name='opportunity_updated_at_idx'),
+            GinIndex(fields=['search_vector'], name='opportunity_search_vector_idx'),
+            # Bounding-box prefilter of radius searches
+            models.Index(fields=['latitude', 'longitude'], name='opportunity_lat_lon_idx'),
+            # Keyset pagination of the listing, see pagination.py
+            models.Index(fields=['created_at', 'id'], name='opportunity_created_id_idx'),
+            models.Index(fields=['date_posted', 'id'], name='opportunity_posted_id_idx'),
+        ]
+        constraints = [
+            # Scrapers upsert on the listing URL, see ingest.py
+            models.UniqueConstraint(fields=['source'], name='opportunity_unique_source'),
+        ]
+
+class ArchivedOpportunity(models.Model):
+    """
+    An expired opportunity moved out of the ``Opportunity`` table, under the
+    id it had there, see ``archive.py``.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    employer = models.ForeignKey(Employer, on_delete=models.CASCADE, related_name='archived_opportunities')
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    location = models.CharField(max_length=255)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    opportunity_type = models.CharField(max_length=20, choices=Opportunity.OPPORTUNITY_TYPES)
+    mode = models.CharField(max_length=20, choices=Opportunity.JOB_MODE)
+    time_commitment = models.CharField(max_length=20, choices=Opportunity.TIME_COMMITMENT)
+    experience_level = models.CharField(max_length=20, choices=Opportunity.EXPERIENCE_LEVEL)
+    salary_range = models.CharField(max_length=100, null=True, blank=True)
+    expenses_paid = models.BooleanField(default=False)
+    skills_required = models.TextField(blank=True)
+    skills_gained = models.TextField(blank=True)
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    date_posted = models.DateField()
+    application_url = models.URLField()
+    source = models.URLField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'Archived opportunities'
+        ordering = ['-date_posted']
+
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+class OpportunityBand(models.Model):
+    """One LSH band of an opportunity's MinHash signature, see ``dedupe.py``."""
+    opportunity = models.ForeignKey(Opportunity, on_delete=models.CASCADE, related_name='bands')
+    band_key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            # Candidate duplicates are the opportunities sharing a band key
+            models.Index(fields=['band_key', 'opportunity'], name='opportunity_band_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.band_key} ({self.opportunity_id})"
+
+class OpportunitySkill(models.Model):
+    """One normalized skill term of an opportunity, see ``skills.py``."""
+    opportunity = models.ForeignKey(Opportunity, on_delete=models.CASCADE, related_name='skill_terms')
+    normalized_skill = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ['opportunity', 'normalized_skill']
+        indexes = [
+            # Looking up opportunities by term is the recommendation join
+            models.Index(fields=['normalized_skill', 'opportunity'], name='opportunity_skill_term_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.normalized_skill} ({self.opportunity_id})"
 
 class JobApplication(models.Model):
     STATUS_CHOICES = (
@@ -0,0 +1,137 @@
+"""
+Pagination for the opportunity listing.
+
+Page numbers make every page cost a ``COUNT(*)`` and an ``OFFSET`` that
+grows with the page, so opportunities are paged by keyset instead: the
+cursor holds the sort value and id of the last row shown, and the next page
+is the rows after it in (value, id) order. With an index on the same pair
+each page is a short index range scan, however deep it is.
+
+Only orderings with such an index can be used (see ``KEYSET_ORDERINGS``);
+``OpportunityOrderingFilter`` limits the ``ordering`` parameter to them and
+adds the id tiebreaker. Requests that send ``page``, and querysets in any
+other order (search rank, distance), are paged by number as before.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import filters
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Orderings clients may ask for, each with the index-backed keyset it pages by
+KEYSET_ORDERINGS = {
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+    '-date_posted': ('-date_posted', '-id'),
+    'date_posted': ('date_posted', 'id'),
+}
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class OpportunityOrderingFilter(filters.OrderingFilter):
+    """
+    Order by one of ``KEYSET_ORDERINGS``, or by ``distance`` on a radius
+    search, with ``id`` breaking ties. Anything else gets the view's default.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        for field in super().get_ordering(request, queryset, view) or ():
+            if field in KEYSET_ORDERINGS:
+                return list(KEYSET_ORDERINGS[field])
+            if field.lstrip('-') == 'distance' and 'distance' in queryset.query.annotations:
+                return [field, '-id' if field.startswith('-') else 'id']
+        return self.get_default_ordering(view)
+
+
+class KeysetPagination(StandardResultsSetPagination):
+    """Keyset pages with next/previous cursor links, see the module docstring."""
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        ordering = tuple(queryset.query.order_by)
+        if self.page_query_param in request.query_params or ordering not in KEYSET_ORDERINGS.values():
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.keyset = ordering
+        self.field = ordering[0].lstrip('-')
+        self.descending = ordering[0].startswith('-')
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model)
+
+        backwards = False
+        if cursor is not None:
+            value, pk, backwards = cursor
+            # Rows after the cursor in page order, or before it going back
+            after = self.descending != backwards
+            lookup = 'lt' if after else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}e': value}),
+                Q(**{f'{self.field}__{lookup}': value}) | Q(**{f'id__{lookup}': pk}),
+            )
+            if backwards:
+                queryset = queryset.reverse()
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+
+        self.next_row = rows[-1] if rows and (has_more or backwards) else None
+        self.previous_row = rows[0] if rows and cursor is not None and (has_more or not backwards) else None
+        return rows
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if data['o'] != self.keyset[0]:
+                raise ValueError('cursor is for another ordering')
+            value = model._meta.get_field(self.field).to_python(data['v'])
+            return value, int(data['id']), bool(data.get('b'))
+        except (TypeError, ValueError, KeyError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, backwards):
+        value = getattr(row, self.field)
+        data = {'o': self.keyset[0], 'v': value.isoformat(), 'id': row.pk}
+        if backwards:
+            data['b'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode('ascii')
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.keyset is None:
+            return super().get_next_link()
+        return self.encode_cursor(self.next_row, False) if self.next_row is not None else None
+
+    def get_previous_link(self):
+        if self.keyset is None:
+            return super().get_previous_link()
+        return self.encode_cursor(self.previous_row, True) if self.previous_row is not None else None
+
+    def get_paginated_response(self, data):
+        if self.keyset is None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,73 @@
+"""
+Per-user cache of computed job recommendations.
+
+A user's list is cached under two versions, both read from the database
+so writes made by any process count: their CV snapshot version, bumped
+whenever any of their CV rows change (see ``cv_writer.snapshot``), and the
+opportunity ingest watermark (see ``ingest.py``), which moves with every
+opportunity a scraper or the archive command writes or deletes. Either
+change makes the next request a miss that recomputes the list; nothing is
+recomputed eagerly, so a scraper run costs each user one miss at most.
+
+Entries also expire after ``JOB_RECOMMENDATION_CACHE_SECONDS``, which keeps
+the experience level, computed from today's date, current.
+
+Hits, misses and the time spent on misses are counted in the cache for
+``recommendation_stats``.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from cv_writer.snapshot import get_snapshot_version
+from .ingest import get_ingest_version
+from .matching import get_engine
+
+HITS_KEY = 'job_recommendations_hits'
+MISSES_KEY = 'job_recommendations_misses'
+MISS_MS_KEY = 'job_recommendations_miss_ms'
+
+
+def _count(key, delta=1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def get_recommendations(user, compute):
+    """
+    ``user``'s cached recommendations, calling ``compute()`` to build and
+    store them on a miss.
+
+    :return: (recommendations, whether they came from the cache)
+    """
+    key = f'job_recommendations:{user.pk}:{get_snapshot_version(user.pk)}:{get_ingest_version()}'
+    entry = cache.get(key)
+    if entry is not None:
+        _count(HITS_KEY)
+        return entry['data'], True
+
+    started = time.perf_counter()
+    # A miss usually follows an ingest; don't rank from a matrix that predates it
+    get_engine().invalidate()
+    data = compute()
+    cache.set(key, {'data': data}, settings.JOB_RECOMMENDATION_CACHE_SECONDS)
+    _count(MISSES_KEY)
+    _count(MISS_MS_KEY, round((time.perf_counter() - started) * 1000))
+    return data, False
+
+
+def recommendation_stats():
+    values = cache.get_many([HITS_KEY, MISSES_KEY, MISS_MS_KEY])
+    hits = values.get(HITS_KEY, 0)
+    misses = values.get(MISSES_KEY, 0)
+    miss_ms = values.get(MISS_MS_KEY, 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        'average_miss_ms': round(miss_ms / misses, 1) if misses else None,
+    }
@@ -0,0 +1,134 @@
+"""
+Concurrent client for the Reed job search API.
+
+The search endpoint returns at most ``PAGE_SIZE`` results per request and
+pages with ``resultsToSkip``. ``fetch_reed_jobs`` asks for the first page,
+learns ``totalResults`` from it and then requests every other page at once
+over one pooled session, so a full search takes about as long as its
+slowest page rather than the sum of them.
+
+All requests draw from one ``TokenBucket``: ``REED_REQUESTS_PER_SECOND`` on
+average with bursts of ``REED_BURST``, which keeps a run inside Reed's
+request allowance however many pages are in flight. 5xx responses, 429s
+and connection errors are retried up to ``MAX_RETRIES`` times with
+exponential backoff and full jitter (a 429's ``Retry-After`` wins), so
+concurrent retries do not arrive in lockstep.
+
+``REED_API_URL`` points the client at a stub server in tests.
+"""
+import asyncio
+import logging
+import random
+
+import aiohttp
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 10
+REQUEST_TIMEOUT_SECONDS = 30
+
+
+class ReedAPIError(Exception):
+    """A search page failed for good: a 4xx, or a 5xx after every retry."""
+
+
+class TokenBucket:
+    """
+    ``rate`` requests per second on average, ``capacity`` at once after a
+    quiet spell. Shared by every coroutine of one event loop.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # Holding the lock keeps waiters in arrival order
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def backoff(attempt):
+    """Full jitter: anywhere up to the exponential backoff of ``attempt``."""
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt))
+
+
+async def fetch_page(session, bucket, url, params):
+    """One page of search results as decoded JSON."""
+    for attempt in range(MAX_RETRIES + 1):
+        await bucket.acquire()
+        delay = backoff(attempt)
+        try:
+            async with session.get(url, params=params) as response:
+                if response.status < 400:
+                    return await response.json(content_type=None)
+                if response.status == 429 and response.headers.get('Retry-After', '').isdigit():
+                    delay = int(response.headers['Retry-After'])
+                elif response.status != 429 and response.status < 500:
+                    raise ReedAPIError(f'Reed API returned {response.status} for {params}')
+                error = f'status {response.status}'
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            error = repr(e)
+        if attempt == MAX_RETRIES:
+            raise ReedAPIError(f'Reed API failed {MAX_RETRIES + 1} times for {params}: {error}')
+        logger.warning(f"Reed API {error} for {params}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+async def _fetch_all(api_key, params, max_results, url, concurrency):
+    bucket = TokenBucket(settings.REED_REQUESTS_PER_SECOND, settings.REED_BURST)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS)
+    # Reed expects Basic Auth with the API key as username and no password
+    auth = aiohttp.BasicAuth(api_key, '')
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, auth=auth) as session:
+        first = await fetch_page(session, bucket, url, {**params, 'resultsToTake': PAGE_SIZE, 'resultsToSkip': 0})
+        total = first.get('totalResults', 0)
+        if max_results is not None:
+            total = min(total, max_results)
+        pages = await asyncio.gather(*(
+            fetch_page(session, bucket, url, {**params, 'resultsToTake': PAGE_SIZE, 'resultsToSkip': skip})
+            for skip in range(PAGE_SIZE, total, PAGE_SIZE)
+        ), return_exceptions=True)
+    results = list(first.get('results', []))
+    for page in pages:
+        # One lost page should not cost the run the others
+        if isinstance(page, ReedAPIError):
+            logger.error(f"Skipping a page of Reed results: {page}")
+        elif isinstance(page, BaseException):
+            raise page
+        else:
+            results.extend(page.get('results', []))
+    return total, results[:total]
+
+
+def fetch_reed_jobs(api_key, params, max_results=None, url=None, concurrency=None):
+    """
+    Every result of a Reed search, in Reed's order, fetching the pages
+    concurrently.
+
+    :param params: search parameters (keywords, locationName, ...), without paging
+    :param max_results: stop after this many results
+    :return: (total results, list of result dicts); pages that failed for
+        good are logged and left out
+    :raises ReedAPIError: when the first page cannot be fetched
+    """
+    return asyncio.run(_fetch_all(
+        api_key, params, max_results, url or settings.REED_API_URL, concurrency or settings.REED_CONCURRENCY,
+    ))
@@ -0,0 +1,184 @@
+"""
+Full-text search over opportunities.
+
+On PostgreSQL ``Opportunity.search_vector`` holds each row's lexemes,
+weighted A for the title, B for the skills and C for the description,
+behind a GIN index. Queries take web search syntax ("quoted phrases", or,
+-exclusions), are ranked with ``ts_rank`` and highlighted with
+``ts_headline``.
+
+On SQLite (development and tests) the same three columns live in the FTS5
+table ``jobstract_opportunity_fts``, whose rowid is the opportunity id.
+Rows are ranked with ``bm25()``, its column weights in the same order, and
+highlighted with ``highlight()`` and ``snippet()``. Queries are reduced to
+their words, all of which must match.
+
+Highlights are HTML: the scraped text is escaped and the matches wrapped in
+``<mark>``. Both backends mark matches with private-use characters, which
+are swapped for the tags after escaping, so markup in a listing is never
+passed through.
+
+The index is maintained row by row: saves re-index the saved opportunity
+(see ``signals.py``), bulk writers call ``index_opportunities`` with the
+ids they wrote and deletes drop the FTS row. ``rebuild_search_index`` is
+only needed for a backfill.
+"""
+import re
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import Opportunity
+
+FTS_TABLE = 'jobstract_opportunity_fts'
+# bm25() weights of the title, skills and description columns
+FTS_WEIGHTS = '10.0, 4.0, 1.0'
+SEARCH_CONFIG = 'english'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+# What the database marks matches with, before the text is escaped
+MATCH_START = '\ue000'
+MATCH_STOP = '\ue001'
+SNIPPET_WORDS = 24
+# Stay well below SQLite's limit on query parameters
+BATCH_SIZE = 500
+
+# Fields a change to which needs the row re-indexed
+SEARCH_FIELDS = {'title', 'skills_required', 'skills_gained', 'description'}
+
+
+def _uses_fts():
+    return connection.vendor != 'postgresql'
+
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def search_vector():
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('skills_required', 'skills_gained', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def index_opportunities(ids):
+    """(Re-)index the opportunities with primary keys ``ids``."""
+    table = Opportunity._meta.db_table
+    for batch in _batches(ids):
+        if not _uses_fts():
+            Opportunity.objects.filter(pk__in=batch).update(search_vector=search_vector())
+            continue
+        placeholders = ', '.join(['%s'] * len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, skills, description) "
+                f"SELECT id, title, skills_required || ' ' || skills_gained, description "
+                f"FROM {table} WHERE id IN ({placeholders})",
+                batch,
+            )
+
+
+def unindex_opportunities(ids):
+    """Drop deleted opportunities from the FTS table; tsvectors go with their rows."""
+    if not _uses_fts():
+        return
+    for batch in _batches(ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(batch))})", batch)
+
+
+def rebuild_search_index():
+    """
+    Index every opportunity from scratch.
+
+    :return: the number of opportunities indexed
+    """
+    if _uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    ids = list(Opportunity.objects.order_by('pk').values_list('pk', flat=True))
+    index_opportunities(ids)
+    return len(ids)
+
+
+def _fts_query(query):
+    # Quote every word so FTS5 operators and punctuation in user input are literal
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query.lower()))
+
+
+def search_opportunities(queryset, query):
+    """
+    Narrow ``queryset`` to the opportunities matching ``query``, best match
+    first, annotated with ``search_rank`` (higher is better).
+    """
+    if not _uses_fts():
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-date_posted')
+
+    fts_query = _fts_query(query)
+    if not fts_query:
+        return queryset.none()
+    table = Opportunity._meta.db_table
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (fts_query,))
+    ).annotate(
+        # bm25() is lower for better matches
+        search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (fts_query,),
+        )
+    ).order_by('-search_rank', '-date_posted')
+
+
+def add_highlights(opportunities, query):
+    """
+    Set ``highlights`` on each of ``opportunities`` (a page of search
+    results): the title and a description snippet, HTML-escaped, with the
+    matched words wrapped in ``<mark>``.
+    """
+    by_id = {opportunity.pk: opportunity for opportunity in opportunities}
+    if not by_id:
+        return opportunities
+    if not _uses_fts():
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        options = {'config': SEARCH_CONFIG, 'start_sel': MATCH_START, 'stop_sel': MATCH_STOP}
+        rows = Opportunity.objects.filter(pk__in=by_id).annotate(
+            title_highlight=SearchHeadline('title', search_query, highlight_all=True, **options),
+            description_highlight=SearchHeadline(
+                'description', search_query, max_words=SNIPPET_WORDS, min_words=SNIPPET_WORDS // 2,
+                max_fragments=2, fragment_delimiter=' … ', **options
+            ),
+        ).values_list('pk', 'title_highlight', 'description_highlight')
+    else:
+        placeholders = ', '.join(['%s'] * len(by_id))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, highlight({FTS_TABLE}, 0, %s, %s), "
+                f"snippet({FTS_TABLE}, 2, %s, %s, ' … ', {SNIPPET_WORDS}) "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+                [MATCH_START, MATCH_STOP, MATCH_START, MATCH_STOP, _fts_query(query), *by_id],
+            )
+            rows = cursor.fetchall()
+    for pk, title, description in rows:
+        by_id[pk].highlights = {'title': _marked(title), 'description': _marked(description)}
+    return opportunities
+
+
+def _marked(text):
+    """Escape highlighted text, then turn the match markers into tags."""
+    if text is None:
+        return None
+    # A marker character in the scraped text itself can only become a stray
+    # <mark>, never other markup
+    return escape(text).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_STOP, HIGHLIGHT_STOP)
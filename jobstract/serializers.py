@@ -9,11 +9,14 @@ class EmployerSerializer(serializers.ModelSerializer):
 
 class OpportunitySerializer(serializers.ModelSerializer):
     employer = EmployerSerializer(read_only=True)
-    matching_score = serializers.FloatField(required=False)
+    matching_score = serializers.FloatField(read_only=True)
+    search_rank = serializers.FloatField(read_only=True)
+    distance = serializers.FloatField(read_only=True)
+    highlights = serializers.DictField(child=serializers.CharField(allow_null=True), read_only=True)
     
     class Meta:
         model = Opportunity
-        fields = '__all__'
+        exclude = ['search_vector', 'minhash']
 
 class ApplicationEventSerializer(serializers.ModelSerializer):
     class Meta:
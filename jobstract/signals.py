@@ -0,0 +1,53 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Opportunity
+from .matching import get_engine
+from .dedupe import DEDUPE_FIELDS, deduplicate_opportunities
+from .search import SEARCH_FIELDS, index_opportunities, unindex_opportunities
+from .skills import sync_opportunity_skills
+
+
+@receiver(post_save, sender=Opportunity)
+def index_opportunity_skills(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Fixture loading saves raw rows; the index is rebuilt separately then
+    if raw:
+        return
+    if update_fields is not None and not {'skills_required', 'skills_gained'} & set(update_fields):
+        return
+    sync_opportunity_skills(instance)
+
+
+@receiver(post_save, sender=Opportunity)
+def sync_matching_engine(sender, instance, raw=False, **kwargs):
+    # Other processes catch up through the engine's periodic sync
+    if not raw:
+        get_engine().invalidate()
+
+
+@receiver(post_delete, sender=Opportunity)
+def remove_from_matching_engine(sender, instance, **kwargs):
+    get_engine().remove(instance.pk)
+
+
+@receiver(post_save, sender=Opportunity)
+def index_opportunity_search(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    index_opportunities([instance.pk])
+
+
+@receiver(post_delete, sender=Opportunity)
+def unindex_opportunity_search(sender, instance, **kwargs):
+    unindex_opportunities([instance.pk])
+
+
+@receiver(post_save, sender=Opportunity)
+def deduplicate_opportunity(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not DEDUPE_FIELDS & set(update_fields):
+        return
+    deduplicate_opportunities([instance.pk])
@@ -0,0 +1,143 @@
+"""
+Inverted skill index for opportunities.
+
+``skills_required`` and ``skills_gained`` are free text, and matching a
+user's skills against them with ``icontains`` scans every row. Instead, each
+opportunity's skill text is broken into normalized terms when it is saved
+(see ``signals.py``) and stored as ``OpportunitySkill`` rows indexed by
+term. Recommendations then join the user's normalized skills against that
+index and rank opportunities by how many terms they share.
+
+Terms are the delimited phrases of the text plus every run of up to
+``MAX_TERM_WORDS`` words that neither starts nor ends with a stop word, so a
+skill matches on whole words ("sql" matches "SQL Server" but not "MySQL").
+"""
+import re
+
+from django.db.models import Count
+
+from .models import Opportunity, OpportunitySkill
+
+MAX_TERM_WORDS = 3
+MAX_TERM_LENGTH = 100
+
+# Phrases in skills text are separated by punctuation, bullets and "and"/"or"
+PHRASE_SPLIT_PATTERN = re.compile(r'[,;:\n\r\t•|/()\[\]]+|\s+(?:and|or|&)\s+', re.IGNORECASE)
+# Keep the characters skill names are made of (c++, c#, node.js)
+NON_SKILL_CHARS_PATTERN = re.compile(r'[^a-z0-9+#.]+')
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'for', 'from',
+    'good', 'have', 'in', 'is', 'of', 'on', 'or', 'our', 'strong', 'the',
+    'to', 'we', 'will', 'with', 'you', 'your', 'must', 'should', 'ability',
+    'excellent', 'experience', 'skills', 'knowledge', 'able', 'including',
+}
+
+
+def normalize_skill(text):
+    """Lower-case ``text`` and reduce it to words of skill characters."""
+    words = NON_SKILL_CHARS_PATTERN.sub(' ', (text or '').lower()).split()
+    return ' '.join(filter(None, (word.strip('.') for word in words)))
+
+
+def extract_skill_terms(*texts):
+    """The set of normalized skill terms in ``texts``."""
+    terms = set()
+    for text in texts:
+        for phrase in PHRASE_SPLIT_PATTERN.split(text or ''):
+            phrase = normalize_skill(phrase)
+            if not phrase:
+                continue
+            if len(phrase) <= MAX_TERM_LENGTH and phrase not in STOP_WORDS:
+                terms.add(phrase)
+            words = phrase.split()
+            for size in range(1, MAX_TERM_WORDS + 1):
+                for start in range(len(words) - size + 1):
+                    gram = words[start:start + size]
+                    if gram[0] in STOP_WORDS or gram[-1] in STOP_WORDS:
+                        continue
+                    term = ' '.join(gram)
+                    if len(term) <= MAX_TERM_LENGTH:
+                        terms.add(term)
+    return terms
+
+
+def opportunity_skill_terms(opportunity):
+    return extract_skill_terms(opportunity.skills_required, opportunity.skills_gained)
+
+
+def sync_opportunity_skills(opportunity):
+    """
+    Bring the index rows of one opportunity in line with its skill text,
+    touching only the terms that changed.
+    """
+    terms = opportunity_skill_terms(opportunity)
+    existing = set(
+        OpportunitySkill.objects.filter(opportunity=opportunity).values_list('normalized_skill', flat=True)
+    )
+    stale = existing - terms
+    if stale:
+        OpportunitySkill.objects.filter(opportunity=opportunity, normalized_skill__in=stale).delete()
+    OpportunitySkill.objects.bulk_create([
+        OpportunitySkill(opportunity=opportunity, normalized_skill=term)
+        for term in terms - existing
+    ])
+
+
+def rebuild_skill_index(queryset=None, batch_size=500):
+    """
+    Re-extract the terms of every opportunity in ``queryset``, replacing
+    their index rows a batch at a time.
+
+    :return: the number of opportunities indexed
+    """
+    if queryset is None:
+        queryset = Opportunity.objects.all()
+    queryset = queryset.order_by('pk').only('pk', 'skills_required', 'skills_gained')
+
+    indexed = 0
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return indexed
+        OpportunitySkill.objects.filter(opportunity__in=batch).delete()
+        OpportunitySkill.objects.bulk_create([
+            OpportunitySkill(opportunity=opportunity, normalized_skill=term)
+            for opportunity in batch
+            for term in opportunity_skill_terms(opportunity)
+        ], batch_size=1000)
+        indexed += len(batch)
+        last_pk = batch[-1].pk
+
+
+def rank_by_skills(skills, limit, **opportunity_filters):
+    """
+    Up to ``limit`` opportunities matching ``opportunity_filters`` that share
+    at least one term with ``skills``, best overlap first and then newest
+    first. Each has the number of shared terms as ``skill_overlap``.
+
+    The query is driven by the term index: the overlap is counted on the
+    index rows of the user's terms, grouped by opportunity id, and only the
+    winning opportunities are then loaded.
+    """
+    terms = {term for term in (normalize_skill(skill) for skill in skills) if term}
+    if not terms:
+        return []
+    ranked = list(
+        OpportunitySkill.objects.filter(
+            normalized_skill__in=terms,
+            **{f'opportunity__{lookup}': value for lookup, value in opportunity_filters.items()}
+        ).values('opportunity_id').annotate(
+            skill_overlap=Count('pk')
+        ).order_by('-skill_overlap', '-opportunity__date_posted', '-opportunity_id')[:limit]
+    )
+    opportunities = Opportunity.objects.select_related('employer').in_bulk(
+        [row['opportunity_id'] for row in ranked]
+    )
+    results = []
+    for row in ranked:
+        opportunity = opportunities[row['opportunity_id']]
+        opportunity.skill_overlap = row['skill_overlap']
+        results.append(opportunity)
+    return results
@@ -1,3 +1,755 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from cv_writer.models import CvWriter, Skill
+from cv_writer.sections import writable_bucket
+from . import reed
+from .archive import archive_opportunities
+from .dedupe import rebuild_duplicates
+from .embeddings import MIN_INDEXED_ROWS, VectorStore
+from .facets import get_facets
+from .geo import geocode, load_postcode_areas
+from .ingest import OpportunityWriter
+from .matching import MAX_SEGMENTS, MatchingEngine, document_terms, get_engine, user_query_terms
+from .models import ArchivedOpportunity, Employer, JobApplication, Opportunity, OpportunitySkill
+from .recommendations import recommendation_stats
+from .search import search_opportunities
+from .skills import extract_skill_terms, normalize_skill, rebuild_skill_index
+from .utils.cleaner import Cleaner
+
+User = get_user_model()
+
+
+def create_opportunity(employer, title, skills_required='', **kwargs):
+    fields = {
+        'employer': employer,
+        'title': title,
+        'description': f'{title} role',
+        'location': 'London',
+        'mode': 'on_site',
+        'time_commitment': 'full_time',
+        'experience_level': 'entry_level',
+        'skills_required': skills_required,
+        'date_posted': date(2024, 1, 1),
+        'application_url': f'https://example.com/{title.lower().replace(" ", "-")}',
+        'source': f'https://example.com/{title.lower().replace(" ", "-")}',
+    }
+    fields.update(kwargs)
+    return Opportunity.objects.create(**fields)
+
+
+class SkillIndexTestCase(TestCase):
+    def setUp(self):
+        self.employer = Employer.objects.create(employer_name='Acme')
+
+    def test_extracts_whole_word_terms(self):
+        """
+        Test that terms are whole words and phrases, not substrings
+        """
+        terms = extract_skill_terms('Strong SQL Server and C++ skills; Project Management, MySQL')
+        self.assertIn('sql server', terms)
+        self.assertIn('sql', terms)
+        self.assertIn('c++', terms)
+        self.assertIn('project management', terms)
+        self.assertIn('mysql', terms)
+        self.assertNotIn('strong', terms)
+        self.assertEqual(normalize_skill('  Node.js '), 'node.js')
+
+    def test_index_follows_saves(self):
+        """
+        Test that saving an opportunity replaces its stale terms
+        """
+        opportunity = create_opportunity(self.employer, 'Analyst', 'Excel, Python')
+        self.assertEqual(
+            set(opportunity.skill_terms.values_list('normalized_skill', flat=True)), {'excel', 'python'}
+        )
+
+        opportunity.skills_required = 'Excel, Tableau'
+        opportunity.save()
+        self.assertEqual(
+            set(opportunity.skill_terms.values_list('normalized_skill', flat=True)), {'excel', 'tableau'}
+        )
+
+        OpportunitySkill.objects.all().delete()
+        self.assertEqual(rebuild_skill_index(batch_size=1), 1)
+        self.assertEqual(opportunity.skill_terms.count(), 2)
+
+
+class RecommendedOpportunitiesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='jobseeker', password='testpassword')
+        CvWriter.objects.create(user=self.user, first_name='Job', last_name='Seeker')
+        Skill.objects.create(user=self.user, skill_name='Python', skill_level='Advanced')
+        Skill.objects.create(user=self.user, skill_name='SQL', skill_level='Advanced')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        employer = Employer.objects.create(employer_name='Acme')
+        self.both = create_opportunity(employer, 'Data Engineer', 'Python, SQL, Airflow')
+        self.one = create_opportunity(employer, 'Web Developer', 'Python and Django', date_posted=date(2024, 2, 1))
+        create_opportunity(employer, 'DBA', 'MySQL administration')
+        create_opportunity(employer, 'Senior Data Engineer', 'Python, SQL', experience_level='senior')
+        # The engine is per process; start it from this test's rows
+        get_engine().build()
+
+    def test_ranks_by_match_with_score(self):
+        """
+        Test that recommendations are ranked and carry their matching score
+        """
+        response = self.client.get('/api/jobstract/opportunities/recommended/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([job['id'] for job in response.data], [self.both.id, self.one.id])
+        scores = [job['matching_score'] for job in response.data]
+        self.assertGreater(scores[0], scores[1])
+        self.assertTrue(all(0 < score <= 1 for score in scores))
+
+    def test_cached_until_cv_or_jobs_change(self):
+        """
+        Test that repeat requests are cache reads until the CV or the jobs change
+        """
+        url = '/api/jobstract/opportunities/recommended/'
+        self.assertEqual(self.client.get(url)['X-Recommendations-Cache'], 'miss')
+        # Only the CV snapshot version and the ingest watermark are read
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Recommendations-Cache'], 'hit')
+        self.assertEqual([job['id'] for job in response.data], [self.both.id, self.one.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Skill.objects.create(user=self.user, skill_name='Django', skill_level='Intermediate')
+        self.assertEqual(self.client.get(url)['X-Recommendations-Cache'], 'miss')
+
+        airflow = create_opportunity(self.both.employer, 'Airflow Developer', 'Python, SQL, Django')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Recommendations-Cache'], 'miss')
+        self.assertEqual(response.data[0]['id'], airflow.id)
+
+        # A scraper process's write reaches this process through the database
+        Opportunity.objects.filter(pk=airflow.pk).update(title='Airflow Engineer', updated_at=timezone.now())
+        response = self.client.get(url)
+        self.assertEqual(response['X-Recommendations-Cache'], 'miss')
+        self.assertEqual(response.data[0]['title'], 'Airflow Engineer')
+
+        stats = recommendation_stats()
+        self.assertGreaterEqual(stats['hits'], 1)
+        self.assertGreaterEqual(stats['misses'], 4)
+
+    def test_reads_primary_version_sections(self):
+        """
+        Test that another version's copy of a section is not matched against
+        """
+        clone = CvWriter.objects.get(user=self.user).clone()
+        bucket_id = writable_bucket(clone, 'skills')
+        Skill.objects.create(user=self.user, bucket_id=bucket_id, skill_name='Cobol', skill_level='Advanced')
+
+        terms = user_query_terms(self.user)
+        self.assertIn('python', terms)
+        self.assertNotIn('cobol', terms)
+        self.assertEqual(terms['python'], document_terms('', '', 'Python')['python'])
+
+
+class OpportunitySearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        employer = Employer.objects.create(employer_name='Acme')
+        self.in_description = create_opportunity(
+            employer, 'Office Manager', 'Excel', description='Some Python scripting would help'
+        )
+        self.in_skills = create_opportunity(employer, 'Data Analyst', 'Python, SQL')
+        self.in_title = create_opportunity(employer, 'Python Developer', 'Django')
+
+    def search(self, query):
+        return self.client.get('/api/jobstract/opportunities/search/', {'q': query})
+
+    def test_ranked_with_highlights(self):
+        """
+        Test that title matches outrank skill matches, which outrank description matches
+        """
+        response = self.search('python')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual(
+            [job['id'] for job in results], [self.in_title.id, self.in_skills.id, self.in_description.id]
+        )
+        self.assertEqual(results[0]['highlights']['title'], '<mark>Python</mark> Developer')
+        self.assertIn('<mark>Python</mark> scripting', results[2]['highlights']['description'])
+        self.assertGreater(results[0]['search_rank'], results[1]['search_rank'])
+
+        self.assertEqual(self.search('').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search('"python" OR (').status_code, status.HTTP_200_OK)
+
+    def test_highlights_escape_markup(self):
+        """
+        Test that markup in scraped text comes back escaped around the highlight tags
+        """
+        Opportunity.objects.all().delete()
+        create_opportunity(
+            Employer.objects.get(), 'Python <b>Lead</b>', 'Django',
+            description='<script>alert(1)</script> Python <img src=x onerror=alert(1)>',
+        )
+
+        highlights = self.search('python').data['results'][0]['highlights']
+
+        self.assertEqual(highlights['title'], '<mark>Python</mark> &lt;b&gt;Lead&lt;/b&gt;')
+        self.assertNotIn('<script', highlights['description'])
+        self.assertNotIn('<img', highlights['description'])
+        self.assertIn('&lt;script&gt;', highlights['description'])
+        self.assertIn('<mark>Python</mark>', highlights['description'])
+
+    def test_index_follows_saves_and_deletes(self):
+        """
+        Test that edits and deletes are searchable straight away
+        """
+        self.in_title.title = 'Rust Developer'
+        self.in_title.description = 'Rust Developer role'
+        self.in_title.save()
+        self.in_skills.delete()
+        self.assertEqual([job['id'] for job in self.search('python').data['results']], [self.in_description.id])
+        self.assertEqual([job['id'] for job in self.search('rust').data['results']], [self.in_title.id])
+
+
+class RadiusSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='commuter', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        employer = Employer.objects.create(employer_name='Acme')
+        self.reading = create_opportunity(employer, 'Reading Job', location='Reading, Berkshire')
+        self.newbury = create_opportunity(employer, 'Newbury Job', location='Newbury RG14 5AA')
+        self.london = create_opportunity(employer, 'London Job', location='London EC1A 1BB')
+        self.remote = create_opportunity(employer, 'Remote Job', location='Remote')
+
+    def near(self, **params):
+        response = self.client.get('/api/jobstract/opportunities/', params)
+        return response.status_code, [job['id'] for job in response.data.get('results', [])]
+
+    def test_geocodes_offline(self):
+        """
+        Test that towns beat postcodes, which beat counties
+        """
+        self.assertAlmostEqual(self.reading.latitude, 51.4543, places=2)
+        self.assertIsNone(self.remote.latitude)
+        self.assertAlmostEqual(geocode('RG1 1AA')[0], 51.4543, places=2)
+        self.assertAlmostEqual(geocode('Office in Leeds, LS1')[0], 53.8008, places=2)
+        self.assertEqual(geocode('Somewhere in Berkshire'), (51.45, -1.0))
+        # Every area the cleaner knows about has coordinates
+        self.assertEqual(set(load_postcode_areas()), set(Cleaner().POSTCODE_AREAS))
+
+    def test_near_filters_by_distance(self):
+        """
+        Test that near/radius keeps only opportunities inside the radius, nearest first
+        """
+        # Newbury is about 15 miles from Reading, London about 36
+        self.assertEqual(self.near(near='Reading', radius=20), (200, [self.reading.id, self.newbury.id]))
+        self.assertEqual(self.near(near='Reading', radius=5), (200, [self.reading.id]))
+        self.assertEqual(
+            self.near(near='RG1', radius=50), (200, [self.reading.id, self.newbury.id, self.london.id])
+        )
+        self.assertEqual(self.near(near='Atlantis')[0], 400)
+        self.assertEqual(self.near(near='Reading', radius='far')[0], 400)
+
+
+class FacetsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='browser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.employer = Employer.objects.create(employer_name='Acme')
+        create_opportunity(self.employer, 'On Site Job', location='Leeds')
+        create_opportunity(self.employer, 'Remote Job', mode='remote', location='Leeds')
+        create_opportunity(self.employer, 'Part Time Job', mode='remote', time_commitment='part_time')
+
+    def facets(self, **params):
+        return self.client.get('/api/jobstract/opportunities/facets/', params).data
+
+    @staticmethod
+    def counts(facet):
+        return {choice['value']: choice['count'] for choice in facet if choice['count']}
+
+    def test_counts_follow_filters(self):
+        """
+        Test that every choice is counted within the current filters
+        """
+        facets = self.facets()
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual(self.counts(facets['mode']), {'on_site': 1, 'remote': 2})
+        self.assertEqual(facets['locations'], [{'value': 'Leeds', 'count': 2}, {'value': 'London', 'count': 1}])
+
+        facets = self.facets(mode='remote')
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual(self.counts(facets['time_commitment']), {'full_time': 1, 'part_time': 1})
+        self.assertIn({'value': 'hybrid', 'label': 'Hybrid', 'count': 0}, facets['mode'])
+
+    def test_cached_until_ingest(self):
+        """
+        Test that counts are cached per filter set and recomputed after a save
+        """
+        remote = Opportunity.objects.filter(mode='remote')
+        # 2 for the ingest watermark, 2 for the counts
+        with self.assertNumQueries(4):
+            get_facets(remote, {'mode': 'remote'})
+        with self.assertNumQueries(2):
+            get_facets(remote, {'mode': ' remote '})
+
+        create_opportunity(self.employer, 'Another Remote Job', mode='remote')
+        self.assertEqual(self.facets(mode='remote')['total'], 3)
+
+        # The scrapers and the archive command write from other processes,
+        # with no signal reaching this one
+        Opportunity.objects.filter(title='Remote Job').update(mode='hybrid', updated_at=timezone.now())
+        self.assertEqual(self.facets(mode='remote')['total'], 2)
+        Opportunity.objects.filter(title='Part Time Job').delete()
+        self.assertEqual(self.facets(mode='remote')['total'], 1)
+
+
+class DuplicateDetectionTestCase(TestCase):
+    DESCRIPTION = (
+        'We are looking for a warehouse operative to join our busy distribution centre in Leeds. '
+        'You will pick and pack orders, load vehicles and keep the warehouse clean and safe. '
+        'Forklift experience is an advantage but full training is given.'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='deduper', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.reed = create_opportunity(
+            Employer.objects.create(employer_name='Northern Logistics Ltd'), 'Warehouse Operative',
+            description=self.DESCRIPTION, location='Leeds', source='https://www.reed.co.uk/jobs/1',
+        )
+        self.dwp = create_opportunity(
+            Employer.objects.create(employer_name='NORTHERN LOGISTICS LIMITED'), 'Warehouse Operative - Days',
+            description=self.DESCRIPTION.replace('busy ', '') + ' Apply today.',
+            location='Leeds', source='https://findajob.dwp.gov.uk/details/2',
+        )
+        self.other = create_opportunity(
+            self.reed.employer, 'Transport Planner',
+            description=self.DESCRIPTION.replace('warehouse operative', 'transport planner'), location='Leeds',
+        )
+
+    def listed(self, **params):
+        response = self.client.get('/api/jobstract/opportunities/', params)
+        return [job['id'] for job in response.data['results']]
+
+    def test_links_duplicates_across_sources(self):
+        """
+        Test that a reworded repeat links to the first listing and is hidden from listings
+        """
+        self.dwp.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.dwp.canonical_id, self.reed.id)
+        # Same employer and description, different vacancy
+        self.assertIsNone(self.other.canonical_id)
+        self.assertEqual(self.listed(), [self.other.id, self.reed.id])
+        self.assertEqual(len(self.listed(include_duplicates='true')), 3)
+        response = self.client.get(f'/api/jobstract/opportunities/{self.dwp.id}/')
+        self.assertEqual(response.data['canonical'], self.reed.id)
+
+    def test_unlinks_when_no_longer_duplicate(self):
+        """
+        Test that an edit away from the canonical listing and a rebuild relink correctly
+        """
+        self.dwp.title = 'Delivery Driver'
+        self.dwp.description = 'Drive our vans around West Yorkshire.'
+        self.dwp.save()
+        self.dwp.refresh_from_db()
+        self.assertIsNone(self.dwp.canonical_id)
+
+        Opportunity.objects.filter(pk=self.dwp.pk).update(title=self.reed.title, description=self.reed.description)
+        self.assertEqual(rebuild_duplicates(), 1)
+        self.dwp.refresh_from_db()
+        self.assertEqual(self.dwp.canonical_id, self.reed.id)
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='archivist', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        employer = Employer.objects.create(employer_name='Acme')
+        today = date.today()
+        self.live = create_opportunity(employer, 'Live Job', date_posted=today)
+        self.old = create_opportunity(employer, 'Old Job', 'Python', date_posted=today - timedelta(days=400))
+        self.ended = create_opportunity(
+            employer, 'Ended Job', date_posted=today, end_date=today - timedelta(days=1)
+        )
+        self.applied = create_opportunity(employer, 'Applied Job', date_posted=today - timedelta(days=400))
+        self.application = JobApplication.objects.create(user=self.user, opportunity=self.applied)
+
+    def test_moves_expired_and_keeps_applications(self):
+        """
+        Test that expired opportunities move to the archive unless applications refer to them
+        """
+        self.assertEqual(archive_opportunities(days=60, batch_size=1), (2, 1))
+        self.assertEqual(
+            set(ArchivedOpportunity.objects.values_list('id', flat=True)), {self.old.id, self.ended.id}
+        )
+        self.assertEqual(ArchivedOpportunity.objects.get(pk=self.old.id).skills_required, 'Python')
+        self.assertFalse(OpportunitySkill.objects.filter(opportunity_id=self.old.id).exists())
+
+        self.applied.refresh_from_db()
+        self.assertTrue(self.applied.archived)
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.opportunity_id, self.applied.id)
+
+        response = self.client.get('/api/jobstract/opportunities/')
+        self.assertEqual([job['id'] for job in response.data['results']], [self.live.id])
+        response = self.client.get(f'/api/jobstract/opportunities/{self.applied.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_oldest_duplicate_replaces_archived_listing(self):
+        """
+        Test that archiving a listing promotes one of its duplicates and relinks the rest
+        """
+        employer = Employer.objects.create(employer_name='Northern Logistics Ltd')
+        description = DuplicateDetectionTestCase.DESCRIPTION
+        today = date.today()
+        listing, first, second = [
+            create_opportunity(
+                employer, 'Warehouse Operative', description=description, location='Leeds',
+                date_posted=today - timedelta(days=400 if i == 0 else 1), source=f'https://example.com/warehouse/{i}',
+            )
+            for i in range(3)
+        ]
+        self.assertEqual(
+            list(Opportunity.objects.filter(pk__in=[first.pk, second.pk]).values_list('canonical_id', flat=True)),
+            [listing.pk, listing.pk]
+        )
+
+        archive_opportunities(days=60)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertIsNone(first.canonical_id)
+        self.assertEqual(second.canonical_id, first.pk)
+
+
+class StubReedHandler(BaseHTTPRequestHandler):
+    """The Reed search API over ``TOTAL`` numbered jobs, failing each page's first request."""
+    TOTAL = 250
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        skip, take = int(query['resultsToSkip'][0]), int(query['resultsToTake'][0])
+        self.server.requests.append(skip)
+        if self.server.requests.count(skip) == 1 and skip:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps({
+            'totalResults': self.TOTAL,
+            'results': [{'jobId': i} for i in range(skip, min(skip + take, self.TOTAL))],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ReedClientTestCase(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubReedHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/search'
+
+    @override_settings(REED_REQUESTS_PER_SECOND=1000, REED_BURST=10)
+    def test_pages_concurrently_with_retries(self):
+        """
+        Test that every page is fetched, in order, with 5xx responses retried
+        """
+        total, results = reed.fetch_reed_jobs('key', {'keywords': 'python'}, url=self.url)
+        self.assertEqual(total, 250)
+        self.assertEqual([job['jobId'] for job in results], list(range(250)))
+        self.assertEqual(sorted(self.server.requests), [0, 100, 100, 200, 200])
+
+        total, results = reed.fetch_reed_jobs('key', {}, max_results=150, url=self.url)
+        self.assertEqual((total, len(results)), (150, 150))
+
+    def test_token_bucket_limits_rate(self):
+        """
+        Test that requests beyond the burst wait for tokens
+        """
+        async def acquire_all():
+            bucket = reed.TokenBucket(rate=20, capacity=2)
+            started = time.perf_counter()
+            for _ in range(6):
+                await bucket.acquire()
+            return time.perf_counter() - started
+
+        # Two at once, then four at 20 per second
+        self.assertGreaterEqual(asyncio.run(acquire_all()), 0.19)
+
+
+def scraped_job(i, employer_name='Acme', **fields):
+    job = {
+        'employer_name': employer_name, 'title': f'Developer {i}', 'description': f'Python job number {i}',
+        'location': 'Leeds', 'mode': 'on_site', 'time_commitment': 'full_time', 'opportunity_type': 'job',
+        'experience_level': 'entry_level', 'skills_required': 'Python, SQL', 'date_posted': date(2026, 1, 1),
+        'source': f'https://example.com/jobs/{i}', 'application_url': f'https://example.com/jobs/{i}',
+    }
+    job.update(fields)
+    return job
+
+
+class OpportunityWriterTestCase(TestCase):
+    def test_upserts_in_batches(self):
+        """
+        Test that jobs are upserted on their source with employers resolved in bulk
+        """
+        acme = Employer.objects.create(employer_name='Acme')
+        existing = create_opportunity(acme, 'Old Title', source='https://example.com/jobs/0')
+        with OpportunityWriter(batch_size=2) as writer:
+            writer.add(scraped_job(0))
+            writer.add(scraped_job(1, employer_name='Initech'))
+            writer.add(scraped_job(2, employer_name='Initech'))
+        self.assertEqual((writer.created, writer.updated), (2, 1))
+        self.assertEqual(Employer.objects.filter(employer_name='Initech').count(), 1)
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.title, 'Developer 0')
+        self.assertAlmostEqual(existing.latitude, 53.8008, places=2)
+        # The indexes the post_save signals would have kept
+        self.assertEqual(
+            set(OpportunitySkill.objects.filter(opportunity=existing).values_list('normalized_skill', flat=True)),
+            {'python', 'sql'},
+        )
+        self.assertEqual(search_opportunities(Opportunity.objects.all(), 'developer').count(), 3)
+        self.assertEqual(Opportunity.objects.filter(canonical__isnull=False).count(), 0)
+
+    def test_batch_queries_do_not_grow_per_job(self):
+        """
+        Test that a batch costs a few dozen queries rather than a few per job
+        """
+        writer = OpportunityWriter()
+        for i in range(100):
+            writer.add(scraped_job(i))
+        with CaptureQueriesContext(connection) as context:
+            writer.flush()
+        # Only SQLite's limit on query parameters splits statements
+        self.assertLess(len(context), 40)
+        self.assertEqual(Opportunity.objects.count(), 100)
+
+
+class StubDWPHandler(BaseHTTPRequestHandler):
+    """DWP Find a Job: one search page of three results, one listing without a location."""
+    SEARCH = '''
+        <div class="search-result"><h3><a class="govuk-link" href="/details/1">Welder</a></h3>
+          <ul class="govuk-list"><li>Location: Leeds, LS1 4AP</li><li><strong>Acme Ltd</strong></li></ul></div>
+        <div class="search-result"><h3><a class="govuk-link" href="/details/2">Chef</a></h3>
+          <ul class="govuk-list"><li><strong>Initech</strong></li></ul></div>
+        <div class="search-result"><h3><a class="govuk-link" href="/details/3">Driver</a></h3>
+          <ul class="govuk-list"><li>Location: Leeds, LS2 7HY</li></ul></div>
+    '''
+    DETAIL = '''
+        <ul><li class="job-profile__location">Manchester M1 1AA</li></ul>
+        <div id="job-profile"><p>Job number {0}, cooking and cleaning.</p></div>
+    '''
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        self.server.requests.append(path)
+        body = (self.SEARCH if path == '/search' else self.DETAIL.format(path.rsplit('/', 1)[-1])).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DWPScraperTestCase(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubDWPHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/search'
+
+    def test_fetches_each_detail_page_once(self):
+        """
+        Test that location and description come from a single fetch of each detail page
+        """
+        with self.settings(DWP_SEARCH_URL=self.url, DWP_REQUESTS_PER_SECOND=1000, JOB_EMBEDDINGS_ENABLED=False):
+            call_command('dwp_scraper', workers=3, stdout=StringIO())
+        self.assertEqual(self.server.requests[0], '/search')
+        self.assertEqual(sorted(self.server.requests[1:]), ['/details/1', '/details/2', '/details/3'])
+
+        chef = Opportunity.objects.get(source=f'http://127.0.0.1:{self.server.server_port}/details/2')
+        self.assertEqual((chef.location, chef.employer.employer_name), ('Manchester', 'Initech'))
+        self.assertIn('Job number 2', chef.description)
+        self.assertEqual(Opportunity.objects.get(title='Welder').location, 'Leeds')
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='browser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        employer = Employer.objects.create(employer_name='Acme')
+        # Pairs of opportunities share a date, so the id has to break ties
+        self.opportunities = [
+            create_opportunity(employer, f'Job {i}', date_posted=date(2024, 1, 1 + i // 2)) for i in range(7)
+        ]
+
+    def pages(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append(response.data)
+            url = response.data['next']
+        return pages
+
+    def test_walks_forwards_and_back(self):
+        """
+        Test that cursors visit every row once, in order, both ways
+        """
+        pages = self.pages('/api/jobstract/opportunities/?ordering=date_posted&page_size=3')
+        ids = [[job['id'] for job in page['results']] for page in pages]
+        expected = [opportunity.id for opportunity in self.opportunities]
+        self.assertEqual(ids, [expected[0:3], expected[3:6], expected[6:7]])
+
+        previous = self.client.get(pages[-1]['previous']).data
+        self.assertEqual([job['id'] for job in previous['results']], expected[3:6])
+        first = self.client.get(previous['previous']).data
+        self.assertEqual([job['id'] for job in first['results']], expected[0:3])
+        self.assertIsNone(first['previous'])
+
+        newest = self.pages('/api/jobstract/opportunities/?page_size=4')
+        self.assertEqual([job['id'] for job in newest[0]['results']], expected[::-1][:4])
+
+    def test_ordering_allowlist_and_fallbacks(self):
+        """
+        Test that unindexed orderings are ignored and page numbers still work
+        """
+        response = self.client.get('/api/jobstract/opportunities/', {'ordering': 'description', 'page_size': 2})
+        self.assertEqual([job['id'] for job in response.data['results']], [o.id for o in self.opportunities[:-3:-1]])
+
+        response = self.client.get('/api/jobstract/opportunities/', {'page': 2, 'page_size': 5})
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 2)
+
+        response = self.client.get('/api/jobstract/opportunities/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+def document(pk, title, skills='', description='', experience_level='entry_level', updated_at=1):
+    return {
+        'id': pk, 'title': title, 'description': description, 'skills_required': skills,
+        'skills_gained': '', 'updated_at': updated_at, 'opportunity_type': 'job',
+        'experience_level': experience_level, 'canonical_id': None, 'archived': False,
+    }
+
+
+class MatchingEngineTestCase(TestCase):
+    def setUp(self):
+        self.engine = MatchingEngine()
+        self.engine.build([
+            document(1, 'Data Engineer', 'Python, SQL, Airflow'),
+            document(2, 'Web Developer', 'Python, Django', 'Build Django sites'),
+            document(3, 'Accountant', 'Sage, Excel'),
+            document(4, 'Senior Data Engineer', 'Python, SQL', experience_level='senior'),
+        ])
+        self.query = {'python': 3, 'sql': 3}
+
+    def ids(self, **filters):
+        return [pk for pk, _ in self.engine.top_k(self.query, 10, **filters)]
+
+    def test_top_k_filters_and_ranks(self):
+        """
+        Test that scoring ranks by match and applies the category filters
+        """
+        self.assertEqual(self.ids(experience_level='entry_level'), [1, 2])
+        self.assertEqual(self.ids(experience_level='senior'), [4])
+        self.assertEqual(self.ids(experience_level='lead'), [])
+        self.assertEqual(self.engine.top_k({'cobol': 1}, 10), [])
+
+    def test_incremental_updates(self):
+        """
+        Test that added, replaced and removed rows are scored without a rebuild
+        """
+        self.engine.add_documents([document(5, 'SQL Analyst', 'SQL, Python, Tableau')])
+        self.assertIn(5, self.ids(experience_level='entry_level'))
+
+        self.engine.add_documents([document(1, 'Data Engineer', 'Scala, Spark', updated_at=2)])
+        self.assertNotIn(1, self.ids(experience_level='entry_level'))
+
+        self.engine.remove(2)
+        for pk in range(10, 20):
+            self.engine.add_documents([document(pk, 'Barista', 'Coffee')])
+        # Segments have been merged, dropping the two replaced/removed rows
+        self.assertLessEqual(len(self.engine.segments), MAX_SEGMENTS)
+        self.assertEqual(self.engine.row_count, 14)
+        self.assertEqual(self.ids(experience_level='entry_level'), [5])
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class VectorStoreTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.store = VectorStore(self.path)
+        self.vectors = unit(np.random.default_rng(0).standard_normal((200, 16)))
+        self.store.upsert(range(1, 201), self.vectors)
+
+    def test_search_and_updates(self):
+        """
+        Test that searches see replaced and deleted rows, also from another store
+        """
+        self.assertEqual(self.store.search(self.vectors[9], 1)[0][0], 10)
+
+        self.store.upsert([10], -self.vectors[9:10])
+        self.store.delete([11])
+        other = VectorStore(self.path)
+        for store in (self.store, other):
+            found = [pk for pk, _ in store.search(self.vectors[9], 200)]
+            self.assertEqual(found[-1], 10)
+            self.assertNotIn(11, found)
+            self.assertEqual(len(found), 199)
+
+    def test_index_keeps_nearest(self):
+        """
+        Test that once trained the index still finds each row's own vector
+        """
+        more = unit(np.random.default_rng(1).standard_normal((MIN_INDEXED_ROWS, 16)))
+        self.store.upsert(range(1000, 1000 + len(more)), more)
+        self.assertGreater(self.store.list_count, 1)
+        for row in (0, 500, MIN_INDEXED_ROWS - 1):
+            self.assertEqual(self.store.search(more[row], 1, probes=4)[0][0], 1000 + row)
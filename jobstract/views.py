@@ -1,10 +1,10 @@
 from django.shortcuts import render
 from rest_framework import viewsets, status, filters
-from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.db.models import Q
 import logging
 from datetime import datetime
@@ -13,24 +13,33 @@ from .serializers import (
     OpportunitySerializer, EmployerSerializer,
     JobApplicationSerializer, ApplicationEventSerializer
 )
-from cv_writer.models import CvWriter, Skill, Experience, Education
+from .matching import recommend
+from .recommendations import get_recommendations, recommendation_stats
+from .facets import get_facets
+from .geo import geocode, within_radius
+from .pagination import KeysetPagination, OpportunityOrderingFilter
+from .search import add_highlights, search_opportunities
+from .skills import rank_by_skills
+from cv_writer.models import CvWriter
+from cv_writer.sections import primary_cv, section_buckets, section_rows
 from django.db import models
 
 logger = logging.getLogger(__name__)
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 20
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+DEFAULT_RADIUS_MILES = 10
+MAX_RADIUS_MILES = 200
+# Actions that hide near-duplicates and archived opportunities, see dedupe.py
+# and archive.py
+BROWSE_ACTIONS = ('list', 'search', 'facets')
 
 class OpportunityViewSet(viewsets.ModelViewSet):
     queryset = Opportunity.objects.all().select_related('employer')
     serializer_class = OpportunitySerializer
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, OpportunityOrderingFilter]
     filterset_fields = ['mode', 'time_commitment', 'experience_level', 'opportunity_type', 'location']
-    ordering_fields = ['created_at', 'date_posted']
-    ordering = ['-created_at']
+    ordering_fields = ['created_at', 'date_posted', 'distance']
+    ordering = ['-created_at', '-id']
 
     def get_queryset(self):
         """
@@ -45,7 +54,16 @@ class OpportunityViewSet(viewsets.ModelViewSet):
         time_commitment = self.request.query_params.get('time_commitment', None)
         experience_level = self.request.query_params.get('experience_level', None)
         location = self.request.query_params.get('location', None)
-        ordering = self.request.query_params.get('ordering', None)
+        near = self.request.query_params.get('near', None)
+        include_duplicates = self.request.query_params.get('include_duplicates', '').lower() in ('1', 'true')
+
+        # Expired opportunities kept for their applications never show up
+        # when browsing, near-duplicates of another listing only when asked
+        # for; both stay reachable by id
+        if self.action in BROWSE_ACTIONS:
+            queryset = queryset.filter(archived=False)
+            if not include_duplicates:
+                queryset = queryset.filter(canonical__isnull=True)
 
         # Apply filters
         if opportunity_type:
@@ -58,138 +76,73 @@ class OpportunityViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(experience_level=experience_level)
         if location:
             queryset = queryset.filter(location__icontains=location)
-        if ordering:
-            queryset = queryset.order_by(ordering)
+        if near:
+            queryset = self._filter_near(queryset, near)
         
         return queryset 
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        # Nearest first, unless another order was asked for
+        if self.request.query_params.get('near') and not self.request.query_params.get('ordering'):
+            queryset = queryset.order_by('distance', 'id')
+        return queryset
+
+    def _filter_near(self, queryset, near):
+        """Opportunities within ``radius`` miles (default 10) of the place ``near``."""
+        coordinates = geocode(near)
+        if coordinates is None:
+            raise ValidationError({"near": f"Unknown location: {near}"})
+        try:
+            radius = float(self.request.query_params.get('radius', DEFAULT_RADIUS_MILES))
+        except ValueError:
+            raise ValidationError({"radius": "Radius must be a number of miles."})
+        if not 0 < radius <= MAX_RADIUS_MILES:
+            raise ValidationError({"radius": f"Radius must be between 0 and {MAX_RADIUS_MILES} miles."})
+        return within_radius(queryset, *coordinates, radius)
+
+    @action(detail=False, methods=['GET'])
+    def facets(self, request):
+        """Counts per filter choice and top locations for the current filters."""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(get_facets(queryset, request.query_params))
+
+    @action(detail=False, methods=['GET'])
+    def search(self, request):
+        """Full-text search over title, skills and description, best match first."""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {"detail": "Please provide a search query (q)."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = search_opportunities(self.get_queryset(), query)
+        page = self.paginate_queryset(queryset)
+        results = add_highlights(page if page is not None else list(queryset), query)
+        serializer = self.get_serializer(results, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
     @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated])
     def recommended(self, request):
         """Get job recommendations based on user's CV and preferences."""
         import traceback
-        
+
         try:
-            # Detailed logging of user and request context
             logger.info(f"Recommendation Request - User: {request.user.username}")
-            logger.info(f"User ID: {request.user.id}")
-
-            # Get user's primary CV or the most recent CV
-            try:
-                # First try to get the primary CV
-                cv_queryset = CvWriter.objects.filter(user=request.user)
-                logger.info(f"Total CVs found for user: {cv_queryset.count()}")
-                
-                cv = cv_queryset.filter(is_primary=True).first()
-                
-                # If no primary CV, get the most recent CV
-                if not cv:
-                    cv = cv_queryset.order_by('-created_at').first()
-                
-                if not cv:
-                    logger.warning(f"No CV found for user {request.user.username}")
-                    return Response(
-                        {"detail": "Please create a CV to get personalized job recommendations."},
-                        status=status.HTTP_404_NOT_FOUND
-                    )
-                
-                logger.info(f"Using CV: {cv} for recommendations")
-            except Exception as cv_error:
-                logger.error(f"CV Retrieval Error: {cv_error}")
-                logger.error(traceback.format_exc())
-                return Response(
-                    {"detail": "Error retrieving your CV. Please try again."},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-            # Get user's skills with detailed logging
-            try:
-                user_skills = set(
-                    skill.skill_name.lower() 
-                    for skill in Skill.objects.filter(user=request.user)
-                )
-                logger.info(f"Found {len(user_skills)} skills for user: {user_skills}")
-            except Exception as skill_error:
-                logger.error(f"Skill Retrieval Error: {skill_error}")
-                logger.error(traceback.format_exc())
-                user_skills = set()
-
-            # Get user's experience level from most recent experience
-            try:
-                latest_experience = (
-                    Experience.objects
-                    .filter(user=request.user)
-                    .order_by('-end_date', '-start_date')
-                    .first()
-                )
-                experience_level = 'entry_level'  # Default
-                
-                if latest_experience:
-                    logger.info(f"Latest experience: {latest_experience.job_title}")
-                    # Calculate years of experience
-                    years_of_experience = 0
-                    if latest_experience.start_date:
-                        from datetime import date
-                        years_of_experience = (date.today() - latest_experience.start_date).days / 365.25
-                    
-                    if years_of_experience > 5:
-                        experience_level = 'senior'
-                    elif years_of_experience > 2:
-                        experience_level = 'mid'
-                    else:
-                        experience_level = 'entry_level'
-                    
-                    logger.info(f"Calculated Experience Level: {experience_level} (Years: {years_of_experience:.2f})")
-                else:
-                    logger.warning("No experience found for user")
-            except Exception as exp_error:
-                logger.error(f"Experience Retrieval Error: {exp_error}")
-                logger.error(traceback.format_exc())
-                experience_level = 'entry_level'
-
-            # Base queryset with skill and experience matching
-            try:
-                queryset = Opportunity.objects.filter(
-                    opportunity_type='job'
-                ).select_related('employer')
-                
-                logger.info(f"Total job opportunities before filtering: {queryset.count()}")
-                
-                # Skill-based filtering
-                if user_skills:
-                    # Create a Q object to check for each skill
-                    skill_query = models.Q()
-                    for skill in user_skills:
-                        skill_query |= models.Q(skills_required__icontains=skill) | \
-                                       models.Q(skills_gained__icontains=skill)
-                    
-                    skill_matched_jobs = queryset.filter(skill_query)
-                    
-                    if skill_matched_jobs.exists():
-                        queryset = skill_matched_jobs
-                        logger.info(f"Skill-matched jobs: {queryset.count()}")
-                
-                # Experience level filtering
-                queryset = queryset.filter(
-                    experience_level__icontains=experience_level
-                )
-                
-                logger.info(f"Jobs after experience level filtering: {queryset.count()}")
-
-                # Limit recommendations
-                queryset = queryset[:20]  # Limit to 20 recommendations
-                logger.info(f"Final recommendations count: {queryset.count()}")
-                
-                # Serialize and return
-                serializer = self.get_serializer(queryset, many=True)
-                return Response(serializer.data)
-            
-            except Exception as query_error:
-                logger.error(f"Query Processing Error: {query_error}")
-                logger.error(traceback.format_exc())
+            recommendations, hit = get_recommendations(
+                request.user, lambda: self._build_recommendations(request)
+            )
+            if recommendations is None:
                 return Response(
-                    {"detail": "Error processing job recommendations."},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                    {"detail": "Please create a CV to get personalized job recommendations."},
+                    status=status.HTTP_404_NOT_FOUND
                 )
+            response = Response(recommendations)
+            response['X-Recommendations-Cache'] = 'hit' if hit else 'miss'
+            return response
 
         except Exception as e:
             logger.error(f"Unexpected error in recommendations: {e}")
@@ -199,6 +152,113 @@ class OpportunityViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['GET'], permission_classes=[IsAdminUser], url_path='recommended/stats')
+    def recommended_stats(self, request):
+        """Hit rate and miss cost of the recommendations cache."""
+        return Response(recommendation_stats())
+
+    def _build_recommendations(self, request):
+        """
+        Serialized recommendations for the request's user, or None if they
+        have no CV yet. Only runs on a recommendations cache miss.
+        """
+        import traceback
+
+        # Get user's primary CV or the most recent CV
+        cv = primary_cv(request.user)
+
+        if not cv:
+            logger.warning(f"No CV found for user {request.user.username}")
+            return None
+
+        logger.info(f"Using CV: {cv} for recommendations")
+        # Other versions' copies of a section belong to those versions
+        buckets = section_buckets(cv)
+
+        # Get user's skills with detailed logging
+        try:
+            user_skills = set(
+                skill_name.lower()
+                for skill_name in section_rows(cv, 'skills', buckets).values_list('skill_name', flat=True)
+                if skill_name
+            )
+            logger.info(f"Found {len(user_skills)} skills for user: {user_skills}")
+        except Exception as skill_error:
+            logger.error(f"Skill Retrieval Error: {skill_error}")
+            logger.error(traceback.format_exc())
+            user_skills = set()
+
+        # Get user's experience level from most recent experience
+        try:
+            latest_experience = (
+                section_rows(cv, 'experiences', buckets)
+                .order_by('-end_date', '-start_date')
+                .first()
+            )
+            experience_level = 'entry_level'  # Default
+
+            if latest_experience:
+                logger.info(f"Latest experience: {latest_experience.job_title}")
+                # Calculate years of experience
+                years_of_experience = 0
+                if latest_experience.start_date:
+                    from datetime import date
+                    years_of_experience = (date.today() - latest_experience.start_date).days / 365.25
+
+                if years_of_experience > 5:
+                    experience_level = 'senior'
+                elif years_of_experience > 2:
+                    experience_level = 'mid'
+                else:
+                    experience_level = 'entry_level'
+
+                logger.info(f"Calculated Experience Level: {experience_level} (Years: {years_of_experience:.2f})")
+            else:
+                logger.warning("No experience found for user")
+        except Exception as exp_error:
+            logger.error(f"Experience Retrieval Error: {exp_error}")
+            logger.error(traceback.format_exc())
+            experience_level = 'entry_level'
+
+        # Base queryset with skill and experience matching
+        queryset = Opportunity.objects.filter(
+            opportunity_type='job', canonical__isnull=True, archived=False
+        ).select_related('employer')
+
+        # Experience level filtering
+        queryset = queryset.filter(
+            experience_level__icontains=experience_level
+        )
+
+        # Rank by how well the whole CV matches, with matching_score set
+        try:
+            recommendations = recommend(
+                request.user, 20,  # Limit to 20 recommendations
+                opportunity_type='job',
+                experience_level=experience_level,
+            )
+        except Exception as match_error:
+            logger.error(f"Matching Engine Error: {match_error}")
+            logger.error(traceback.format_exc())
+            # Skill-based ranking through the skill index, best overlap first
+            recommendations = rank_by_skills(
+                user_skills, 20,
+                opportunity_type='job',
+                experience_level__icontains=experience_level,
+                canonical__isnull=True,
+                archived=False,
+            )
+        logger.info(f"Matched recommendations: {len(recommendations)}")
+
+        # Without any skill match, fall back to the latest jobs
+        if not recommendations:
+            recommendations = list(queryset[:20])
+        logger.info(f"Final recommendations count: {len(recommendations)}")
+
+        # Serialize and return
+        serializer = self.get_serializer(recommendations, many=True)
+        return serializer.data
+
     @action(detail=True, methods=['POST'], permission_classes=[IsAuthenticated])
     def apply(self, request, pk=None):
         """Apply to a job opportunity."""